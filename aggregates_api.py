@@ -0,0 +1,401 @@
+"""Local JSON aggregates API for reporting scripts and downstream dashboards.
+
+Runs separately from the Streamlit app and reuses the same loaders and
+MetricsCalculator aggregation rules:
+
+    python aggregates_api.py --port 8502
+
+    GET /api/levels
+    GET /api/aggregates?level=districts&metric=all cases&entity=Bugesera&start=2023-01&end=2023-12&by=entity_period
+    GET /api/export?level=sectors&format=parquet&start=2023-01&end=2023-12&geometry=1
+
+With --backend duckdb the rows stay in Parquet: every aggregate runs inside DuckDB and
+exports read only the rows they need through it.
+With --sqlite (or DASHBOARD_SQLITE) aggregates and exports read only the periods,
+districts and columns they need from the database instead of whole tables.
+
+Exports stream the raw rows chunk by chunk as CSV, Parquet or Excel instead of JSON.
+
+Responses carry an ETag derived from the dataset version and the query, honour
+If-None-Match with 304 Not Modified and are gzip-compressed when the client
+accepts it, so repeated polling costs a dictionary lookup.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from data_export import ViewExporter
+from data_loader import MalariaDataLoader, SectorDataLoader, load_levels
+from entity_registry import get_registry
+from metrics_calculator import MetricsCalculator
+from sqlite_source import get_sqlite_source
+
+class ApiError(Exception):
+    """Client error reported as a JSON body with an HTTP status"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class AggregatesService:
+    """Serve aggregates by level, entity, period range and metric from the dashboard datasets"""
+
+    LEVELS = {'districts': 'Districts', 'sectors': 'Sectors'}
+    GROUPINGS = ['entity_period', 'entity', 'period', 'total']
+    RESPONSE_CACHE_SIZE = 256
+    MIN_GZIP_BYTES = 512
+
+    def __init__(self, backend: str = 'memory', sqlite_path: Optional[str] = None):
+        self.loaders = {'Districts': MalariaDataLoader(), 'Sectors': SectorDataLoader()}
+        if sqlite_path:
+            for loader in self.loaders.values():
+                loader.attach_source(get_sqlite_source(sqlite_path))
+        # 'duckdb' answers from Parquet without loading the rows into pandas, and views and exports read through it
+        self.query_backends = {name: loader.get_query_backend() for name, loader in self.loaders.items()} \
+            if backend == 'duckdb' else {}
+        for name, query_backend in self.query_backends.items():
+            if self.loaders[name].source is None:
+                self.loaders[name].attach_source(query_backend)
+        self._datasets: Dict[str, Tuple[pd.DataFrame, list]] = {}
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._responses: OrderedDict = OrderedDict()
+
+    def get_dataset_version(self) -> str:
+        """Version of both levels - part of every ETag"""
+        return '-'.join(loader.get_dataset_version() for loader in self.loaders.values())
+
+    def get_data(self, dashboard_type: str) -> pd.DataFrame:
+        """Current data for a level, reloading both levels when a source file changed"""
+        version = self.get_dataset_version()
+        with self._lock:
+            if version != self._version:
+                self._datasets = load_levels(self.loaders)
+                self._version = version
+                self._responses.clear()
+            data, _ = self._datasets[dashboard_type]
+        if data is None:
+            raise ApiError(503, f"{dashboard_type} data failed to load")
+        return data
+
+    def get_view(self, dashboard_type: str, start: Optional[Tuple[int, int]], end: Optional[Tuple[int, int]],
+                 entity_ids: Optional[set], columns: Optional[list]) -> pd.DataFrame:
+        """Rows of one query read from the attached source, with the period, district and column filters run there
+
+        Without geometry: an export reads the boundaries once per entity through its ViewExporter.
+        """
+        loader = self.loaders[dashboard_type]
+        districts = None if entity_ids is None else loader.get_entity_districts(entity_ids)
+        data = loader.load_view(start, end, districts, columns, include_geometry=False)
+        if entity_ids is not None:
+            data = data[data[loader.get_id_column()].isin(entity_ids)].reset_index(drop=True)
+        return data
+
+    def get_columns(self, dashboard_type: str) -> list:
+        """Stored columns of a level, without loading it when a backend or source can say"""
+        loader = self.loaders[dashboard_type]
+        if loader.source is not None:
+            return loader.source.get_columns(loader.get_source_table())
+        return list(self.get_data(dashboard_type).columns)
+
+    def handle(self, path: str, query: Dict[str, list]) -> Tuple[str, bytes, bytes]:
+        """Return (etag, json body, gzipped body) for a request, memoised per dataset version"""
+        version = self.get_dataset_version()
+        canonical_query = json.dumps({key: sorted(values) for key, values in sorted(query.items())})
+        cache_key = (version, path, canonical_query)
+        with self._lock:
+            if cache_key in self._responses:
+                self._responses.move_to_end(cache_key)
+                return self._responses[cache_key]
+
+        payload = self._route(path, query)
+        body = json.dumps(payload, default=self._json_default, separators=(',', ':')).encode()
+        etag = '"' + hashlib.sha1(f"{version}|{path}|{canonical_query}".encode()).hexdigest()[:20] + '"'
+        response = (etag, body, gzip.compress(body, compresslevel=6))
+
+        with self._lock:
+            self._responses[cache_key] = response
+            while len(self._responses) > self.RESPONSE_CACHE_SIZE:
+                self._responses.popitem(last=False)
+        return response
+
+    def _route(self, path: str, query: Dict[str, list]) -> dict:
+        if path in ('/api', '/api/levels'):
+            return self.describe_levels()
+        if path == '/api/aggregates':
+            return self.get_aggregates(query)
+        if path == '/health':
+            return {'status': 'ok', 'dataset_version': self.get_dataset_version()}
+        raise ApiError(404, f"Unknown endpoint {path}")
+
+    def describe_levels(self) -> dict:
+        """Available levels, metrics and period range"""
+        levels = {}
+        for level, dashboard_type in self.LEVELS.items():
+            id_col = self.loaders[dashboard_type].get_id_column()
+            if self.query_backends:
+                query_backend = self.query_backends[dashboard_type]
+                columns = query_backend.get_columns()
+                periods = query_backend.get_periods()
+                periods = periods['year'] * 100 + periods['month']
+                entities = query_backend.query(f"SELECT COUNT(DISTINCT {id_col}) AS n FROM source")['n'].iloc[0]
+            else:
+                data = self.get_data(dashboard_type)
+                columns = data.columns
+                periods = data['year'] * 100 + data['month']
+                entities = data[id_col].nunique()
+            levels[level] = {
+                'metrics': list(MetricsCalculator(dashboard_type).get_available_metrics(columns).values()),
+                'first_period': self._format_period(int(periods.min())),
+                'last_period': self._format_period(int(periods.max())),
+                'entities': int(entities)
+            }
+        return {'dataset_version': self.get_dataset_version(), 'levels': levels, 'groupings': self.GROUPINGS}
+
+    def get_aggregates(self, query: Dict[str, list]) -> dict:
+        """Aggregate one metric for a level, optional entities and an optional period range"""
+        level = self._param(query, 'level', 'districts').lower()
+        if level not in self.LEVELS:
+            raise ApiError(400, f"level must be one of {list(self.LEVELS)}")
+        dashboard_type = self.LEVELS[level]
+        calculator = MetricsCalculator(dashboard_type)
+        id_col = calculator.get_id_column()
+        label_col = calculator.get_display_column()
+
+        query_backend = self.query_backends.get(dashboard_type)
+        source = self.loaders[dashboard_type].source
+        available = calculator.get_available_metrics(self.get_columns(dashboard_type))
+        metrics = list(available.values())
+        metric = self._param(query, 'metric', metrics[0])
+        metric = available.get(metric, metric)
+        if metric not in metrics:
+            raise ApiError(400, f"metric must be one of {metrics}")
+
+        by = self._param(query, 'by', 'entity_period')
+        if by not in self.GROUPINGS:
+            raise ApiError(400, f"by must be one of {self.GROUPINGS}")
+
+        start = self._parse_period(self._param(query, 'start'))
+        end = self._parse_period(self._param(query, 'end'))
+        entity_ids = self._parse_entities(query, id_col, level)
+
+        group_columns = {
+            'entity_period': [id_col, label_col, 'year', 'month'],
+            'entity': [id_col, label_col],
+            'period': ['year', 'month'],
+            'total': []
+        }[by]
+
+        as_pair = lambda period: None if period is None else divmod(period, 100)
+        if query_backend:
+            result = query_backend.aggregate(metric, group_columns, as_pair(start), as_pair(end), entity_ids)
+        elif source is not None:
+            # Only this query's rows and columns leave the database
+            data = self.get_view(dashboard_type, as_pair(start), as_pair(end), entity_ids,
+                                 calculator.get_metric_columns(metric))
+            data = calculator.ensure_metric(data, metric)
+            result = calculator.aggregate_metric(data, metric, group_columns)
+        else:
+            data = self.get_data(dashboard_type)
+            data = calculator.ensure_metric(data, metric)
+            periods = data['year'] * 100 + data['month']
+            mask = np.ones(len(data), dtype=bool)
+            if start is not None:
+                mask &= (periods >= start).values
+            if end is not None:
+                mask &= (periods <= end).values
+            if entity_ids is not None:
+                mask &= data[id_col].isin(entity_ids).values
+            result = calculator.aggregate_metric(data.loc[mask], metric, group_columns)
+        result = result.rename(columns={id_col: 'entity_id', label_col: 'entity'})
+
+        return {
+            'dataset_version': self.get_dataset_version(),
+            'level': level, 'metric': metric, 'by': by,
+            'start': self._format_period(start), 'end': self._format_period(end),
+            'columns': list(result.columns),
+            'rows': result.to_dict(orient='records')
+        }
+
+    def export(self, query: Dict[str, list]) -> Tuple[str, str, Iterator[bytes]]:
+        """File name, content type and streamed body of a level's rows for an optional period range and entities"""
+        level = self._param(query, 'level', 'districts').lower()
+        if level not in self.LEVELS:
+            raise ApiError(400, f"level must be one of {list(self.LEVELS)}")
+        file_format = self._param(query, 'format', 'csv').lower()
+        if file_format not in ViewExporter.get_formats():
+            raise ApiError(400, f"format must be one of {list(ViewExporter.get_formats())}")
+        dashboard_type = self.LEVELS[level]
+        loader = self.loaders[dashboard_type]
+
+        metrics = query.get('metric', [])
+        derived = MetricsCalculator(dashboard_type).get_derived_metrics()
+        columns = self.get_columns(dashboard_type)
+        unknown = [metric for metric in metrics if metric not in derived and metric not in columns]
+        if unknown:
+            raise ApiError(400, f"Unknown metrics {unknown}")
+        start, end = self._parse_period(self._param(query, 'start')), self._parse_period(self._param(query, 'end'))
+        as_pair = lambda period: None if period is None else divmod(period, 100)
+        entity_ids = self._parse_entities(query, loader.get_id_column(), level)
+        include_geometry = self._param(query, 'geometry', '0') in ('1', 'true')
+        if loader.source is not None:
+            # The view is already filtered, and unversioned so its row order is not cached
+            data = self.get_view(dashboard_type, as_pair(start), as_pair(end), entity_ids, None)
+            exporter = ViewExporter(dashboard_type, MetricsCalculator(dashboard_type), loader)
+            chunks = exporter.iter_chunks(data, metrics=metrics, include_geometry=include_geometry)
+        else:
+            exporter = ViewExporter(dashboard_type, MetricsCalculator(dashboard_type, loader.get_dataset_version()), loader)
+            chunks = exporter.iter_chunks(self.get_data(dashboard_type), as_pair(start), as_pair(end), entity_ids,
+                                          metrics, include_geometry=include_geometry)
+        span = f"{self._format_period(start) or 'start'}_{self._format_period(end) or 'latest'}"
+        return f"{level}_{span}.{file_format}", ViewExporter.FORMATS[file_format][1], exporter.stream(file_format, chunks)
+
+    @staticmethod
+    def _parse_entities(query: Dict[str, list], id_col: str, level: str) -> Optional[set]:
+        """Ids from comma-separated names or ids in the entity parameters, None when there are none"""
+        entities = [name for value in query.get('entity', []) for name in value.split(',') if name.strip()]
+        if not entities:
+            return None
+        entity_ids = set()
+        for name in entities:
+            matches = [int(name)] if name.strip().isdigit() else get_registry().find_ids(id_col, name)
+            if not matches:
+                raise ApiError(404, f"Unknown {level[:-1]} '{name}'")
+            entity_ids.update(matches)
+        return entity_ids
+
+    @staticmethod
+    def _param(query: Dict[str, list], name: str, default: Optional[str] = None) -> Optional[str]:
+        values = query.get(name)
+        return values[-1] if values else default
+
+    @staticmethod
+    def _parse_period(value: Optional[str]) -> Optional[int]:
+        """'2023-04' -> 202304"""
+        if value is None:
+            return None
+        try:
+            year, month = value.split('-')[:2]
+            return int(year) * 100 + int(month)
+        except ValueError:
+            raise ApiError(400, f"Periods are written YYYY-MM, got '{value}'")
+
+    @staticmethod
+    def _format_period(period: Optional[int]) -> Optional[str]:
+        return None if period is None else f"{period // 100}-{period % 100:02d}"
+
+    @staticmethod
+    def _json_default(value):
+        if isinstance(value, np.integer):
+            return int(value)
+        if isinstance(value, np.floating):
+            return None if np.isnan(value) else float(value)
+        return str(value)
+
+class AggregatesRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end with ETag revalidation and gzip"""
+
+    service: AggregatesService = None
+    max_age = 60
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.rstrip('/') == '/api/export':
+            self._send_export(parse_qs(url.query))
+            return
+        try:
+            etag, body, gzipped = self.service.handle(url.path.rstrip('/') or '/api', parse_qs(url.query))
+        except ApiError as e:
+            self._send_error_json(e.status, str(e))
+            return
+        except Exception as e:
+            self._send_error_json(500, f"Aggregation failed: {e}")
+            return
+
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self._send_cache_headers(etag)
+            self.end_headers()
+            return
+
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '') and len(body) >= self.service.MIN_GZIP_BYTES
+        payload = gzipped if use_gzip else body
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self._send_cache_headers(etag)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_export(self, query: Dict[str, list]):
+        """Stream an export without a Content-Length - the body ends when the connection closes"""
+        try:
+            file_name, content_type, body = self.service.export(query)
+            first = next(body)
+        except ApiError as e:
+            self._send_error_json(e.status, str(e))
+            return
+        except Exception as e:
+            self._send_error_json(500, f"Export failed: {e}")
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Disposition', f'attachment; filename="{file_name}"')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(first)
+        for data in body:
+            self.wfile.write(data)
+        self.close_connection = True
+
+    def _send_cache_headers(self, etag: str):
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', f'max-age={self.max_age}, must-revalidate')
+        self.send_header('Vary', 'Accept-Encoding')
+
+    def _send_error_json(self, status: int, message: str):
+        body = json.dumps({'error': message}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def create_server(host: str = '127.0.0.1', port: int = 8502, backend: str = 'memory',
+                  sqlite_path: Optional[str] = None) -> ThreadingHTTPServer:
+    """Build the HTTP server around a fresh service"""
+    handler = type('Handler', (AggregatesRequestHandler,), {'service': AggregatesService(backend, sqlite_path)})
+    return ThreadingHTTPServer((host, port), handler)
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve malaria aggregates as JSON')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--backend', choices=['memory', 'duckdb'], default='memory',
+                        help="'duckdb' queries Parquet copies of the CSVs instead of loading them into pandas")
+    parser.add_argument('--sqlite', default=os.environ.get('DASHBOARD_SQLITE'),
+                        help='SQLite export to query per request instead of the CSV and GeoJSON files')
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.backend, args.sqlite)
+    print(f"Serving aggregates on http://{args.host}:{args.port}/api/levels")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
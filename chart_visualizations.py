@@ -1,9 +1,11 @@
-import plotly.express as px
-import plotly.graph_objects as go
+from __future__ import annotations
+
 import numpy as np
 import pandas as pd
-import geopandas as gpd
-from typing import List, Optional, Tuple, Any
+from typing import TYPE_CHECKING, List, Optional, Tuple, Any
+
+if TYPE_CHECKING:
+    import geopandas as gpd
 
 class ChartVisualizations:
     """Handle all chart visualizations including bar charts, trends, and scatterplots"""
@@ -45,27 +47,62 @@ class ChartVisualizations:
         self.dashboard_type = dashboard_type
         self.metrics_calculator = metrics_calculator
     
-    def create_top_entities_chart(self, data: gpd.GeoDataFrame, year: int, month: int, metric: str, top_n: int = 10) -> Any:
-        """Create top entities bar chart with pink-purple color scheme"""
-        filtered_data = data[(data['year'] == year) & (data['month'] == month)].copy()
-        sorted_data = filtered_data.nlargest(top_n, metric)
+    def create_top_entities_chart(self, data: gpd.GeoDataFrame, year: int, month: int, metric: str, top_n: int = 10,
+                                  bottom: bool = False) -> Any:
+        """Create top (or bottom) entities bar chart with pink-purple color scheme and rank changes"""
+        import plotly.express as px
+        sorted_data = self.metrics_calculator.get_top_entities(data, metric, year, month, top_n, bottom)
+        sorted_data['Rank change'] = sorted_data['rank_change'].map(self._format_rank_change)
         
         # Get configuration using helper
-        y_title, title, y_column = self._get_chart_config('bar', year, month, metric, top_n)
+        y_title, title, y_column = self._get_chart_config('bar', year, month, metric, top_n, bottom)
         
         fig = px.bar(
             sorted_data, x=metric, y=y_column, orientation='h', color=metric,
-            color_continuous_scale=self.PINK_PURPLE_SCALE, title=title,
-            labels={metric: y_title, y_column: self._get_entity_label()},
-            hover_data=self._get_hover_data('bar')
+            color_continuous_scale=self.PINK_PURPLE_SCALE, title=title, text='Rank change',
+            labels={metric: y_title, y_column: self._get_entity_label(), 'rank': 'Rank'},
+            hover_data={**self._get_hover_data('bar'), 'rank': True, 'Rank change': True}
         )
+        fig.update_traces(textposition='inside', insidetextanchor='start', textfont=dict(color='white', size=11))
         
         # Apply common dark theme styling
         self._apply_dark_theme(fig, height=520, title_size=14)
         return fig
     
-    def create_trend_chart(self, data: gpd.GeoDataFrame, selected_entities: List[str], metric: str) -> Optional[Any]:
-        """Create trend line chart for selected entities showing monthly trends"""
+    def create_range_chart(self, range_values: pd.DataFrame, metric: str, period_label: str, top_n: int = 10,
+                           bottom: bool = False) -> Any:
+        """Top (or bottom) entities bar chart of a metric aggregated over a range of months"""
+        import plotly.express as px
+        display_col = self.metrics_calculator.get_display_column()
+        sorted_data = range_values.sort_values(metric, ascending=bottom).head(top_n)
+        
+        y_title = self.metrics_calculator.get_metric_label(metric)
+        entity_label = "Districts" if self.dashboard_type == "Districts" else "Sectors"
+        fig = px.bar(
+            sorted_data, x=metric, y=display_col, orientation='h', color=metric,
+            color_continuous_scale=self.PINK_PURPLE_SCALE,
+            title=f"{'Bottom' if bottom else 'Top'} {top_n} {entity_label}: {y_title} ({period_label})",
+            labels={metric: y_title, display_col: self._get_entity_label(), 'months': 'Months reported'},
+            hover_data={'months': True}
+        )
+        self._apply_dark_theme(fig, height=520, title_size=14)
+        return fig
+    
+    @staticmethod
+    def _format_rank_change(change: float) -> str:
+        """▲ moved up, ▼ moved down since last month, 'new' when unranked last month"""
+        if pd.isna(change):
+            return 'new'
+        if change > 0:
+            return f'▲{int(change)}'
+        if change < 0:
+            return f'▼{int(-change)}'
+        return '='
+    
+    def create_trend_chart(self, data: gpd.GeoDataFrame, selected_entities: List[int], metric: str,
+                           forecasts: Optional[pd.DataFrame] = None) -> Optional[Any]:
+        """Create trend line chart for selected entity ids showing monthly trends, with optional dashed forecasts"""
+        import plotly.express as px
         if not selected_entities:
             return None
         
@@ -83,9 +120,11 @@ class ChartVisualizations:
         y_column, y_title, title = self._get_chart_config('trend', metric=metric)
         color_column = 'sector_display' if self.dashboard_type == "Sectors" else self.metrics_calculator.get_display_column()
         
-        # Create color mapping
-        color_map = {entity: self.HARMONIZED_COLORS[i % len(self.HARMONIZED_COLORS)] 
-                     for i, entity in enumerate(selected_entities)}
+        # Create color mapping in selection order, keyed by the display label of each id
+        labels = filtered_data.drop_duplicates(self.metrics_calculator.get_id_column()).set_index(
+            self.metrics_calculator.get_id_column())[color_column]
+        color_map = {labels[entity]: self.HARMONIZED_COLORS[i % len(self.HARMONIZED_COLORS)] 
+                     for i, entity in enumerate(selected_entities) if entity in labels.index}
         
         fig = px.line(
             filtered_data, x='date', y=y_column, color=color_column, title=title,
@@ -95,11 +134,32 @@ class ChartVisualizations:
         
         # Apply styling with spline smoothing
         fig.update_traces(line=dict(width=3, shape='spline', smoothing=0.3), marker=dict(size=6), mode='lines+markers')
+        if forecasts is not None:
+            self._add_forecast_traces(fig, filtered_data, forecasts, labels, color_map, y_column)
         fig.update_layout(xaxis=dict(tickformat='%b %Y'))
         self._apply_dark_theme(fig, height=450, title_size=16)
         
         return fig
     
+    def _add_forecast_traces(self, fig, history: pd.DataFrame, forecasts: pd.DataFrame, labels: pd.Series,
+                             color_map: dict, y_column: str):
+        """Extend each entity's line with a dashed forecast starting from its last observed month"""
+        import plotly.graph_objects as go
+        id_col = self.metrics_calculator.get_id_column()
+        forecasts = forecasts[forecasts[id_col].isin(labels.index)].copy()
+        forecasts['date'] = pd.to_datetime(forecasts[['year', 'month']].assign(day=1))
+        last_observed = history.groupby(id_col).tail(1).set_index(id_col)
+        
+        for entity, entity_forecast in forecasts.groupby(id_col, sort=False):
+            label = labels[entity]
+            dates = [last_observed.at[entity, 'date']] + entity_forecast['date'].tolist()
+            values = [last_observed.at[entity, y_column]] + entity_forecast['forecast'].tolist()
+            fig.add_trace(go.Scatter(
+                x=dates, y=values, mode='lines+markers', name=f"{label} (forecast)", legendgroup=label,
+                line=dict(width=2, dash='dash', color=color_map.get(label)), marker=dict(size=5, symbol='circle-open'),
+                hovertemplate=f'<b>{label}</b> forecast<br>%{{x|%b %Y}}: %{{y:,.1f}}<extra></extra>'
+            ))
+    
     def create_scatterplot(self, data: gpd.GeoDataFrame, year: int, month: int) -> Tuple[Optional[Any], Optional[float], Optional[float]]:
         """Create scatterplot with quadrant analysis and star/triangle highlights for selected month/year"""
         filtered_data = data[(data['year'] == year) & (data['month'] == month)].copy()
@@ -112,9 +172,76 @@ class ChartVisualizations:
         else:
             return self._create_sector_scatterplot(filtered_data, year, month)
     
+    def create_morans_i_chart(self, global_stats: pd.DataFrame, metric: str, year: int = None, month: int = None) -> Optional[Any]:
+        """Create line chart of global Moran's I over time, marking significant months"""
+        import plotly.express as px
+        import plotly.graph_objects as go
+        if global_stats is None or global_stats.empty:
+            return None
+        
+        stats = global_stats.copy()
+        stats['date'] = pd.to_datetime(stats[['year', 'month']].assign(day=1))
+        _, y_title, _ = self._get_chart_config('trend', metric=metric)
+        
+        fig = px.line(
+            stats, x='date', y='morans_i', title=f"Spatial Clustering of {y_title} (Global Moran's I)",
+            labels={'morans_i': "Moran's I", 'date': 'Time Period'},
+            hover_data={'p_value': ':.3f', 'z_score': ':.2f'}
+        )
+        fig.update_traces(line=dict(width=3, color='#e91e63'))
+        fig.add_trace(go.Scatter(
+            x=stats.loc[stats['p_value'] <= 0.05, 'date'], y=stats.loc[stats['p_value'] <= 0.05, 'morans_i'],
+            mode='markers', marker=dict(size=7, color='#4a148c', line=dict(width=1, color='white')),
+            name='Significant (p ≤ 0.05)', hoverinfo='skip'
+        ))
+        fig.add_hline(y=stats['expected_i'].iloc[0], line=dict(color='white', width=1, dash='dot'))
+        if year is not None and month is not None:
+            fig.add_vline(x=pd.Timestamp(year=year, month=month, day=1), line=dict(color='#60a5fa', width=1.5))
+        
+        self._apply_dark_theme(fig, height=350, title_size=14)
+        fig.update_layout(xaxis=dict(tickformat='%b %Y'))
+        return fig
+    
+    def create_province_trend_chart(self, province_data: pd.DataFrame, metric: str, y_title: str) -> Optional[Any]:
+        """Create province trend line chart from the rolled-up cube"""
+        import plotly.express as px
+        if province_data is None or province_data.empty:
+            return None
+        
+        trend_data = province_data.copy()
+        trend_data['date'] = pd.to_datetime(trend_data[['year', 'month']].assign(day=1))
+        
+        fig = px.line(
+            trend_data, x='date', y=metric, color='Province', title=f'{y_title} by Province Over Time',
+            labels={metric: y_title, 'date': 'Time Period'},
+            color_discrete_map=self.PROVINCE_COLORS
+        )
+        fig.update_traces(line=dict(width=3, shape='spline', smoothing=0.3))
+        fig.update_layout(xaxis=dict(tickformat='%b %Y'))
+        self._apply_dark_theme(fig, height=450, title_size=16)
+        return fig
+    
+    def create_province_bar_chart(self, province_data: pd.DataFrame, year: int, month: int, metric: str, y_title: str) -> Optional[Any]:
+        """Create province bar chart for the selected period"""
+        import plotly.express as px
+        period_data = province_data[(province_data['year'] == year) & (province_data['month'] == month)]
+        if period_data.empty:
+            return None
+        
+        month_name = self.MONTH_NAMES.get(month, str(month))
+        fig = px.bar(
+            period_data.sort_values(metric), x=metric, y='Province', orientation='h', color='Province',
+            color_discrete_map=self.PROVINCE_COLORS, title=f'{y_title} by Province ({month_name} {year})',
+            labels={metric: y_title}, hover_data={'Population': ':,.0f', 'Province': False}
+        )
+        self._apply_dark_theme(fig, height=450, title_size=14)
+        fig.update_layout(showlegend=False)
+        return fig
+    
     # === PRIVATE HELPER METHODS ===
     
-    def _get_chart_config(self, chart_type: str, year: int = None, month: int = None, metric: str = None, top_n: int = 10) -> Tuple[str, str, str]:
+    def _get_chart_config(self, chart_type: str, year: int = None, month: int = None, metric: str = None, top_n: int = 10,
+                          bottom: bool = False) -> Tuple[str, str, str]:
         """Universal configuration method for all chart types"""
         dashboard_key = 'districts' if self.dashboard_type == "Districts" else 'sectors'
         
@@ -123,11 +250,13 @@ class ChartVisualizations:
             entity_label = "Districts" if self.dashboard_type == "Districts" else "Sectors"
             y_column = 'District' if self.dashboard_type == "Districts" else 'Sector'
             
+            position = 'Bottom' if bottom else 'Top'
             if metric in self.CHART_CONFIGS[dashboard_key]:
                 y_title = self.CHART_CONFIGS[dashboard_key][metric][0]
-                title = f'Top {top_n} {entity_label}: {y_title} ({month_name} {year})'
+                title = f'{position} {top_n} {entity_label}: {y_title} ({month_name} {year})'
             else:
-                y_title, title = 'Value', f'Top {top_n} {entity_label} ({month_name} {year})'
+                y_title = self.metrics_calculator.get_metric_label(metric)
+                title = f'{position} {top_n} {entity_label}: {y_title} ({month_name} {year})'
             
             return y_title, title, y_column
         
@@ -136,7 +265,8 @@ class ChartVisualizations:
                 y_title, title = self.CHART_CONFIGS[dashboard_key][metric]
                 return metric, y_title, title
             else:
-                return metric, 'Value', 'Trends Over Time'
+                label = self.metrics_calculator.get_metric_label(metric)
+                return metric, label, f'{label} Trends Over Time'
     
     def _get_hover_data(self, chart_type: str) -> dict:
         """Get hover data configuration based on dashboard type and chart type"""
@@ -154,15 +284,9 @@ class ChartVisualizations:
         
         return {**base_data, **specific_data} if chart_type == 'bar' else specific_data
     
-    def _filter_trend_data(self, data: gpd.GeoDataFrame, selected_entities: List[str]) -> gpd.GeoDataFrame:
-        """Filter data for trend charts based on dashboard type"""
-        if self.dashboard_type == "Districts":
-            return data[data[self.metrics_calculator.get_display_column()].isin(selected_entities)]
-        else:
-            if 'sector_display' in data.columns:
-                return data[data['sector_display'].isin(selected_entities)]
-            else:
-                return data[data['Sector'].isin(selected_entities)]
+    def _filter_trend_data(self, data: gpd.GeoDataFrame, selected_entities: List[int]) -> gpd.GeoDataFrame:
+        """Filter data for trend charts on the entity id column"""
+        return data[data[self.metrics_calculator.get_id_column()].isin(selected_entities)]
     
     def _apply_dark_theme(self, fig, height: int = 450, title_size: int = 16):
         """Apply consistent dark theme styling to all charts"""
@@ -179,6 +303,7 @@ class ChartVisualizations:
     
     def _create_district_scatterplot(self, filtered_data: gpd.GeoDataFrame, year: int, month: int) -> Tuple[Optional[Any], Optional[float], Optional[float]]:
         """Create district scatterplot: Total vs Severe Cases"""
+        import plotly.express as px
         # Prepare data
         filtered_data['Total Malaria Cases'] = filtered_data['all cases']
         filtered_data['Severe Cases & Deaths'] = filtered_data['Severe cases/Deaths']
@@ -210,8 +335,8 @@ class ChartVisualizations:
     
     def _create_sector_scatterplot(self, filtered_data: gpd.GeoDataFrame, year: int, month: int) -> Tuple[Optional[Any], Optional[float], Optional[float]]:
         """Create sector scatterplot: Population vs Incidence"""
-        # Clean province names and filter data
-        filtered_data['Province'] = filtered_data['Province'].replace('Iburengerazuba', 'Western Province')
+        import plotly.express as px
+        # Province names are already canonical from the entity registry
         filtered_data = filtered_data[(filtered_data['Population'] >= 0) & (filtered_data['incidence'] >= 0)].copy()
         
         if filtered_data.empty:
@@ -332,6 +457,7 @@ class ChartVisualizations:
     
     def _add_highlight_marker(self, fig, row, x_col: str, y_col: str, name_col: str, color_col: str, symbol: str, name: str):
         """Add a single highlight marker"""
+        import plotly.graph_objects as go
         fig.add_trace(go.Scatter(
             x=[row[x_col]], y=[row[y_col]], mode='markers+text',
             marker=dict(symbol=symbol, size=16, 
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import io
+import os
+import tempfile
+import importlib.util
+import numpy as np
+import pandas as pd
+import streamlit as st
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+from entity_registry import get_registry
+
+class ViewExporter:
+    """Stream a level's rows for a period range as CSV, Parquet or Excel, one chunk at a time
+
+    Rows are read through a period-ordered index of the loaded frame, so an export never copies more
+    than one chunk and its memory stays flat however much history it covers.
+    """
+
+    FORMATS = {
+        'csv': ('CSV', 'text/csv'),
+        'parquet': ('Parquet', 'application/vnd.apache.parquet'),
+        'xlsx': ('Excel', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    }
+    CHUNK_ROWS = 50_000
+    STREAM_BYTES = 1024 * 1024  # per yielded block of a file that is only complete once written
+    EXCEL_MAX_ROWS = 1_048_575  # per sheet, after the header row
+    # Registry ids and display helpers are internal to the dashboard
+    INTERNAL_COLUMNS = ['month_name', 'district_id', 'province_id', 'sector_id', 'sector_display', 'sector_key', 'geometry']
+
+    @classmethod
+    def get_formats(cls) -> dict:
+        """FORMATS this install can write - Excel only when openpyxl is importable"""
+        if importlib.util.find_spec('openpyxl') is None:
+            return {key: value for key, value in cls.FORMATS.items() if key != 'xlsx'}
+        return cls.FORMATS
+
+    def __init__(self, dashboard_type: str, metrics_calculator, loader=None):
+        self.dashboard_type = dashboard_type
+        self.metrics_calculator = metrics_calculator
+        # With a loader, boundaries are read for only the exported entities' districts, not taken from the frame
+        self.loader = loader
+
+    # === ROW SELECTION ===
+
+    def get_period_order(self, data: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """Row positions sorted by period and the sorted period keys - built once per dataset version when it is known"""
+        dataset_version = self.metrics_calculator.dataset_version
+        if dataset_version is None:
+            return self._sort_periods(data)
+        return self._cached_period_order(data, self.dashboard_type, dataset_version)
+
+    @st.cache_resource(max_entries=4)  # both levels, current and previous version
+    def _cached_period_order(_self, _data, dashboard_type: str, dataset_version: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Cached per (level, dataset version)"""
+        return _self._sort_periods(_data)
+
+    @staticmethod
+    def _sort_periods(data: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        keys = data['year'].to_numpy(dtype='int64') * 100 + data['month'].to_numpy(dtype='int64')
+        order = np.argsort(keys, kind='stable')
+        return order, keys[order]
+
+    def get_columns(self, data: pd.DataFrame, metrics: Iterable[str] = ()) -> List[str]:
+        """Stored columns plus any requested derived metrics the frame carries, without the dashboard's internal columns"""
+        derived = self.metrics_calculator.get_derived_metrics()
+        stored = self.metrics_calculator.get_value_columns()
+        columns = [col for col in data.columns if col not in self.INTERNAL_COLUMNS and (col in stored or col not in derived)]
+        return columns + [metric for metric in metrics if metric in derived and metric in data.columns and metric not in columns]
+
+    def iter_chunks(self, data: pd.DataFrame, start: Optional[Tuple[int, int]] = None, end: Optional[Tuple[int, int]] = None,
+                    entity_ids: Optional[Iterable[int]] = None, metrics: Iterable[str] = (),
+                    include_geometry: bool = False) -> Iterator[pd.DataFrame]:
+        """Rows of an inclusive (year, month) range in period order, CHUNK_ROWS at a time"""
+        for metric in metrics:
+            data = self.metrics_calculator.ensure_metric(data, metric)
+        order, keys = self.get_period_order(data)
+        lo = 0 if start is None else np.searchsorted(keys, start[0] * 100 + start[1], side='left')
+        hi = len(keys) if end is None else np.searchsorted(keys, end[0] * 100 + end[1], side='right')
+        columns = self.get_columns(data, metrics)
+        id_col = self.metrics_calculator.get_id_column()
+        entity_ids = None if entity_ids is None else np.asarray(list(entity_ids))
+        include_geometry = include_geometry and (self.loader is not None or 'geometry' in data.columns)
+        if include_geometry:
+            columns = columns + ['geometry']
+            wkt = self.get_entity_wkt(data, order[lo:hi], entity_ids) if self.loader is not None else None
+
+        empty = True
+        for offset in range(lo, hi, self.CHUNK_ROWS):
+            positions = order[offset:min(offset + self.CHUNK_ROWS, hi)]
+            if entity_ids is not None:
+                positions = positions[np.isin(data[id_col].to_numpy()[positions], entity_ids)]
+                if len(positions) == 0:
+                    continue
+            # Column by column, so only the chunk's rows are ever copied; geometry is written as WKT
+            chunk = pd.DataFrame({col: data[col].to_numpy()[positions] for col in columns if col != 'geometry'})
+            if include_geometry:
+                chunk['geometry'] = (wkt.reindex(data[id_col].to_numpy()[positions]).values if wkt is not None
+                                     else data.geometry.iloc[positions].to_wkt().values)
+            empty = False
+            yield chunk
+        if empty:
+            # Still a valid file with a header row
+            yield pd.DataFrame(columns=columns)
+
+    def get_entity_wkt(self, data: pd.DataFrame, positions: np.ndarray, entity_ids: Optional[np.ndarray] = None) -> pd.Series:
+        """WKT boundary of every entity in the given rows, read for only their districts and written once each"""
+        id_col = self.metrics_calculator.get_id_column()
+        ids = np.unique(data[id_col].to_numpy()[positions])
+        if entity_ids is not None:
+            ids = ids[np.isin(ids, entity_ids)]
+        if len(ids) == 0:
+            return pd.Series(dtype=object)
+        gdf = self.loader.read_geometry(districts=self.loader.get_entity_districts(ids))
+        gdf = get_registry().apply(gdf[self.loader.get_join_columns() + ['geometry']])
+        gdf = gdf[gdf[id_col].isin(ids)].drop_duplicates(subset=id_col)
+        return pd.Series(gdf.geometry.to_wkt().values, index=gdf[id_col].values)
+
+    # === WRITERS ===
+
+    def write(self, file_format: str, chunks: Iterable[pd.DataFrame], output: BinaryIO):
+        """Write chunks to a binary file object in one of FORMATS"""
+        if file_format == 'xlsx':
+            self._write_xlsx(chunks, output)
+            return
+        for data in self.stream(file_format, chunks):
+            output.write(data)
+
+    def stream(self, file_format: str, chunks: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+        """Yield the encoded file as it is written - CSV and Parquet after every chunk, Excel once complete
+        
+        A workbook is a zip that is only valid once saved, so it is saved to a spooled temporary file and read
+        back in blocks rather than held whole in memory.
+        """
+        if file_format == 'xlsx':
+            with self.export_file(file_format, chunks) as output:
+                yield from iter(lambda: output.read(self.STREAM_BYTES), b'')
+            return
+        yield from self._write_chunks(file_format, chunks, _DrainableBuffer())
+
+    def export_file(self, file_format: str, chunks: Iterable[pd.DataFrame]) -> BinaryIO:
+        """The whole export in a temporary file that spills to disk past a few megabytes"""
+        output = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        self.write(file_format, chunks, output)
+        output.seek(0)
+        return output
+
+    def export_reader(self, file_format: str, chunks: Iterable[pd.DataFrame]) -> BinaryIO:
+        """The whole export written to an unnamed file on disk, returned as a reader for st.download_button
+
+        download_button takes bytes or a file object, not a generator, and reads it once into its media store;
+        encoding to disk first keeps the writer's buffers out of memory alongside that copy.
+        """
+        with tempfile.TemporaryFile() as output:
+            self.write(file_format, chunks, output)
+            # The duplicated descriptor keeps the unlinked file readable after this one closes
+            return os.fdopen(os.dup(output.fileno()), 'rb')
+
+    def _write_chunks(self, file_format: str, chunks: Iterable[pd.DataFrame], buffer: _DrainableBuffer) -> Iterator[bytes]:
+        if file_format == 'csv':
+            for i, chunk in enumerate(chunks):
+                self._write_csv_chunk(chunk, buffer, header=i == 0)
+                yield buffer.drain()
+            return
+        if file_format != 'parquet':
+            raise ValueError(f"format must be one of {list(self.FORMATS)}")
+        writer = None
+        try:
+            for chunk in chunks:
+                writer = self._write_parquet_chunk(chunk, buffer, writer)
+                yield buffer.drain()
+        finally:
+            if writer is not None:
+                writer.close()
+        yield buffer.drain()
+
+    @staticmethod
+    def _write_csv_chunk(chunk: pd.DataFrame, output: BinaryIO, header: bool):
+        output.write(chunk.to_csv(index=False, header=header).encode('utf-8'))
+
+    @staticmethod
+    def _write_parquet_chunk(chunk: pd.DataFrame, output: BinaryIO, writer):
+        """One row group per chunk; the schema is fixed by the first chunk"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if writer is None:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            writer = pq.ParquetWriter(output, table.schema)
+        else:
+            table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+        writer.write_table(table)
+        return writer
+
+    def _write_xlsx(self, chunks: Iterable[pd.DataFrame], output: BinaryIO):
+        """openpyxl's write-only workbook streams rows to disk; a new sheet starts at Excel's row limit"""
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise RuntimeError("Excel export needs openpyxl (pip install openpyxl)")
+
+        workbook = Workbook(write_only=True)
+        sheet, sheet_rows = None, 0
+        for chunk in chunks:
+            values = chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+            for row in values:
+                if sheet is None or sheet_rows >= self.EXCEL_MAX_ROWS:
+                    sheet = workbook.create_sheet(f"{self.dashboard_type} {len(workbook.worksheets) + 1}")
+                    sheet.append(list(chunk.columns))
+                    sheet_rows = 0
+                sheet.append(list(row))
+                sheet_rows += 1
+        if sheet is None:
+            workbook.create_sheet(self.dashboard_type)
+        workbook.save(output)
+
+class _DrainableBuffer(io.RawIOBase):
+    """Write-only file object whose contents are handed out and cleared after every chunk"""
+
+    def __init__(self):
+        super().__init__()
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._parts = b''.join(self._parts), []
+        return data
@@ -1,53 +1,380 @@
+from __future__ import annotations
+
+import os
+import json
+import logging
+import calendar
+import hashlib
+import numpy as np
 import pandas as pd
-import geopandas as gpd
 import streamlit as st
 from abc import ABC, abstractmethod
-from typing import Tuple
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from entity_registry import get_registry
+from geometry_store import GeometryStore
+from topology import TopologyStore, decode_topology, encode_topology
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+    from query_backend import ParquetQueryBackend
+    from sqlite_source import SQLiteSource
+
+logger = logging.getLogger(__name__)
 
 class BaseDataLoader(ABC):
+    # Columns every view keeps besides its metrics - what process_data and the joins rely on
+    VIEW_COLUMNS = ['Date', 'Province', 'District', 'Sector', 'Population']
+    
     def __init__(self, data_file: str, geometry_file: str):
         self.data_file = data_file
         self.geometry_file = geometry_file
+        self.pinned_sources: Optional[Tuple[str, str]] = None
+        self.source: Optional[Union[SQLiteSource, ParquetQueryBackend]] = None
     
     @abstractmethod
     def get_join_column(self) -> str:
         pass
     
+    @abstractmethod
+    def get_id_column(self) -> str:
+        pass
+    
     @abstractmethod
     def process_data(self, data: pd.DataFrame) -> pd.DataFrame:
         pass
     
+    def get_join_columns(self) -> List[str]:
+        """Get the join column(s) as a list, whatever form get_join_column returns"""
+        join_col = self.get_join_column()
+        return list(join_col) if isinstance(join_col, list) else [join_col]
+    
+    @staticmethod
+    def get_file_signature(*paths: str) -> str:
+        """Short fingerprint of source files built from their size and modification time"""
+        digest = hashlib.sha1()
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+            except OSError:
+                digest.update(f"{path}:missing;".encode())
+        return digest.hexdigest()[:16]
+    
+    def get_dataset_version(self) -> str:
+        """Version of the loaded dataset - changes whenever the CSV or geometry file changes, unless pinned"""
+        if self.pinned_sources is not None:
+            return self.pinned_sources[0]
+        return self.get_source_signatures()[0]
+    
+    def get_geometry_signature(self) -> str:
+        """Signature of the geometry file alone, or the pinned one"""
+        if self.pinned_sources is not None:
+            return self.pinned_sources[1]
+        return self.get_source_signatures()[1]
+    
+    def get_source_signatures(self) -> Tuple[str, str]:
+        """Current dataset version and geometry signature, read from the files - or the source holding both"""
+        if self.source is not None:
+            # A database can hold every level, so the table name keeps their versions apart
+            signature = self.get_file_signature(*self.source.get_signature_files())
+            table = self.get_source_table()
+            return f"{table}:{signature}", f"{table}_geometry:{signature}"
+        return self.get_file_signature(self.data_file, self.geometry_file), self.get_file_signature(self.geometry_file)
+    
+    def pin_sources(self, signatures: Optional[Tuple[str, str]]):
+        """Report these versions instead of the files' current ones, so caches stay keyed to the data being served"""
+        self.pinned_sources = signatures
+    
+    # === SOURCE BACKENDS ===
+    
+    def attach_source(self, source: Optional[Union[SQLiteSource, ParquetQueryBackend]]):
+        """Read rows and geometry from a SQLite database or the Parquet backend instead of the CSV and GeoJSON files"""
+        self.source = source
+    
+    def get_source_table(self) -> str:
+        """Table holding this level in a source database, named after the CSV it replaces"""
+        return os.path.splitext(os.path.basename(self.data_file))[0]
+    
+    def read_csv(self) -> pd.DataFrame:
+        """Read the raw attribute CSV"""
+        return pd.read_csv(self.data_file)
+    
+    def read_records(self) -> pd.DataFrame:
+        """Read every raw attribute row from the attached source, or the CSV"""
+        if self.source is not None:
+            return self.source.read_records(self.get_source_table())
+        return self.read_csv()
+    
+    def load_view(self, start: Optional[Tuple[int, int]] = None, end: Optional[Tuple[int, int]] = None,
+                  districts: Optional[Sequence[str]] = None, metrics: Optional[Sequence[str]] = None,
+                  include_geometry: bool = True) -> gpd.GeoDataFrame:
+        """Only the periods, districts and metric columns a view needs, merged with those districts' geometry
+        
+        With a source the filters run inside its queries; with CSV files they are applied after reading.
+        """
+        if self.source is not None:
+            columns = None
+            if metrics is not None:
+                keep = set(self.VIEW_COLUMNS) | set(self.get_join_columns()) | set(metrics)
+                columns = [col for col in self.source.get_columns(self.get_source_table()) if col in keep]
+            df = self.source.read_records(self.get_source_table(), start, end, districts, columns)
+        else:
+            df = self.read_csv()
+            periods = pd.to_datetime(df['Date']).dt.to_period('M')
+            mask = pd.Series(True, index=df.index)
+            if start is not None:
+                mask &= periods >= pd.Period(year=start[0], month=start[1], freq='M')
+            if end is not None:
+                mask &= periods <= pd.Period(year=end[0], month=end[1], freq='M')
+            if districts is not None:
+                mask &= df['District'].isin(list(districts))
+            df = df[mask]
+            if metrics is not None:
+                keep = set(self.VIEW_COLUMNS) | set(self.get_join_columns()) | set(metrics)
+                df = df[[col for col in df.columns if col in keep]]
+        gdf = self.read_geometry(districts=districts) if include_geometry else None
+        return self.build_data(df.reset_index(drop=True), gdf)
+    
+    def get_entity_districts(self, entity_ids: Iterable[int]) -> List[str]:
+        """Names of the districts holding some entities - the district filter that narrows a view to them"""
+        registry = get_registry()
+        ids = np.asarray(list(entity_ids), dtype=int)
+        if self.get_id_column() == 'sector_id':
+            ids = np.asarray(registry.sector_district, dtype=int)[ids]
+        return sorted(set(registry.district_labels(ids)))
+    
+    def get_geometry_store(self) -> GeometryStore:
+        """GeoParquet copy of the geometry file, keyed on its signature"""
+        return GeometryStore(self.geometry_file, self.get_file_signature(self.geometry_file))
+    
+    def read_geometry(self, districts: Optional[Sequence[str]] = None,
+                      bbox: Optional[Tuple[float, float, float, float]] = None) -> gpd.GeoDataFrame:
+        """Read the geometry, optionally only some districts or a bounding box - from the GeoParquet store once built"""
+        if self.source is not None:
+            return self.source.read_geometry(self.get_source_table(), districts, bbox)
+        return self.read_geometry_files(districts, bbox)
+    
+    def read_geometry_files(self, districts: Optional[Sequence[str]] = None,
+                            bbox: Optional[Tuple[float, float, float, float]] = None) -> gpd.GeoDataFrame:
+        """Read the geometry file through its GeoParquet store, whatever source the rows come from"""
+        store = self.get_geometry_store()
+        if not store.is_current():
+            try:
+                store.build()
+            except OSError:
+                import geopandas as gpd
+                return gpd.read_file(self.geometry_file, bbox=bbox)
+        return store.read_geodataframe(districts, bbox)
+    
+    def get_topology_store(self) -> TopologyStore:
+        """Shared-boundary topology of the geometry file, keyed on its signature"""
+        return TopologyStore(self.geometry_file, self.get_file_signature(self.geometry_file), self.get_join_columns())
+    
+    def get_feature_collection(self) -> dict:
+        """Boundaries as a GeoJSON FeatureCollection decoded from the topology, one feature per entity id
+        
+        Feature ids are the entity ids as strings, so maps pass the id column as locations.
+        """
+        if self.source is not None:
+            # Encoded in memory - a database source has no geometry file to keep a topology beside
+            gdf = self.read_geometry()
+            topology = encode_topology(list(gdf.geometry.values), list(range(len(gdf))),
+                                       gdf[self.get_join_columns()].to_dict(orient='records'))
+        else:
+            store = self.get_topology_store()
+            try:
+                topology = store.read() if store.is_current() else store.build(self.read_geometry())
+            except OSError:
+                # Read-only deployments encode in memory on every start
+                gdf = self.read_geometry()
+                topology = encode_topology(list(gdf.geometry.values), list(range(len(gdf))),
+                                           gdf[self.get_join_columns()].to_dict(orient='records'))
+        
+        collection = decode_topology(topology)
+        names = pd.DataFrame([feature['properties'] for feature in collection['features']], columns=self.get_join_columns())
+        entity_ids = get_registry().apply(names)[self.get_id_column()].values
+        features, seen = [], set()
+        for feature, entity_id in zip(collection['features'], entity_ids):
+            if entity_id < 0 or entity_id in seen or feature['geometry'] is None:
+                continue
+            seen.add(entity_id)
+            features.append({**feature, 'id': str(entity_id)})
+        return {'type': 'FeatureCollection', 'features': features}
+    
+    def submit_reads(self, executor: Executor) -> Tuple[Future, ...]:
+        """Submit the source reads - one artifact read when a current artifact exists, else CSV and geometry"""
+        if self.artifact_is_current():
+            return (executor.submit(self.read_artifact),)
+        return executor.submit(self.read_records), executor.submit(self.read_geometry)
+    
+    def get_query_backend(self) -> ParquetQueryBackend:
+        """Out-of-core alternative: the same CSV as Parquet, queried with DuckDB instead of loaded whole"""
+        from query_backend import get_parquet_backend
+        return get_parquet_backend(self)
+    
     def load_data(self) -> Tuple[gpd.GeoDataFrame, list]:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            return self.load_from_futures(*self.submit_reads(executor))
+    
+    def load_from_futures(self, *futures: Future) -> Tuple[gpd.GeoDataFrame, list]:
+        """Join the source reads and build the merged dataset, writing the shared artifact once"""
         try:
-            df = pd.read_csv(self.data_file)
-            gdf = gpd.read_file(self.geometry_file)
-            df = self.process_data(df)
-            join_col = self.get_join_column()
-            
-            if isinstance(join_col, list):
-                for col in join_col:
-                    df[col] = df[col].str.strip().str.title()
-                    gdf[col] = gdf[col].str.strip().str.title()
-                gdf = gdf[join_col + ['geometry']].drop_duplicates()
-                merged = df.merge(gdf, on=join_col, how='left')
-                
-                # Create sector display names for selection
-                if 'Sector' in merged.columns and 'District' in merged.columns:
-                    merged['sector_display'] = merged['Sector'] + ' (' + merged['District'] + ')'
-                    merged['sector_key'] = merged['Sector'] + '_' + merged['District']
-                    options = sorted(merged['sector_display'].unique())
-                else:
-                    options = []
+            if len(futures) == 1:
+                merged = futures[0].result()
             else:
-                gdf = gdf[[join_col, 'geometry']].drop_duplicates()
-                merged = df.merge(gdf, on=join_col, how='left')
-                options = sorted(merged[join_col].unique()) if isinstance(join_col, str) else []
-            
-            merged = gpd.GeoDataFrame(merged, geometry='geometry')
-            return merged, options
+                merged = self.build_data(futures[0].result(), futures[1].result())
+                self.write_artifact(merged)
+            return merged, self.get_entity_options(merged)
         except Exception as e:
             st.error(f"Data loading failed: {e}")
             return None, []
+    
+    def get_entity_options(self, data: pd.DataFrame) -> list:
+        """Entity ids ordered by their display label"""
+        id_col = self.get_id_column()
+        entity_ids = data[id_col].unique()
+        return entity_ids[np.argsort(get_registry().labels(id_col, entity_ids).astype(str))].tolist()
+    
+    # === SHARED ARROW ARTIFACT ===
+    
+    def get_artifact_path(self) -> str:
+        """Arrow IPC file written next to the CSV it was built from"""
+        return os.path.splitext(self.data_file)[0] + '.arrow'
+    
+    def artifact_is_current(self) -> bool:
+        """True when the artifact exists and was built from the current sources"""
+        path = self.get_artifact_path()
+        if not os.path.exists(path):
+            return False
+        try:
+            import pyarrow as pa
+            with pa.memory_map(path, 'r') as source:
+                metadata = pa.ipc.open_file(source).schema.metadata or {}
+            return metadata.get(b'dataset_version', b'').decode() == self.get_dataset_version()
+        except Exception:
+            return False
+    
+    def write_artifact(self, merged: gpd.GeoDataFrame):
+        """Write attributes and WKB geometry as an uncompressed Arrow IPC file for memory-mapping
+        
+        Name columns are left out - they are rebuilt from the id columns and the registry on read - and
+        geometry is dictionary-encoded so each entity's polygon is stored once.
+        """
+        import pyarrow as pa
+        
+        id_col = self.get_id_column()
+        name_columns = ['Province', 'District', 'Sector', 'sector_display', 'sector_key', 'month_name']
+        attributes = pd.DataFrame(merged.drop(columns=['geometry'] + [c for c in name_columns if c in merged.columns]))
+        
+        entities = merged.drop_duplicates(id_col)
+        wkb = entities.geometry.to_wkb()
+        dictionary_index = pd.Index(entities[id_col].values).get_indexer(merged[id_col].values)
+        geometry = pa.DictionaryArray.from_arrays(
+            pa.array(dictionary_index.astype('int32'), mask=merged.geometry.isna().values),
+            pa.array(list(wkb.values), type=pa.binary())
+        )
+        
+        table = pa.Table.from_pandas(attributes, preserve_index=False).append_column('geometry', geometry)
+        table = table.replace_schema_metadata({
+            'dataset_version': self.get_dataset_version(),
+            'columns': json.dumps(list(merged.columns)),
+            'entities': json.dumps(get_registry().export_entities()),
+            'crs': merged.crs.to_wkt() if merged.crs is not None else ''
+        })
+        
+        # Write to a temporary file and swap it in so other processes never map a partial file
+        path = self.get_artifact_path()
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with pa.OSFile(temp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def read_artifact(self) -> gpd.GeoDataFrame:
+        """Memory-map the Arrow artifact; numeric columns stay zero-copy views of the OS page cache"""
+        import pyarrow as pa
+        import geopandas as gpd
+        
+        table = pa.ipc.open_file(pa.memory_map(self.get_artifact_path(), 'r')).read_all()
+        metadata = table.schema.metadata
+        
+        # Decode each distinct polygon once; the trailing None serves rows without geometry (index -1)
+        geometry = table.column('geometry').combine_chunks()
+        polygons = np.asarray(gpd.GeoSeries.from_wkb(geometry.dictionary.to_numpy(zero_copy_only=False)).values)
+        shapes = np.append(polygons, None)[geometry.indices.fill_null(-1).to_numpy()]
+        
+        df = table.drop(['geometry']).to_pandas(split_blocks=True)
+        
+        # Ids were assigned by the writing process's registry; translate them if ours differ
+        registry = get_registry()
+        district_map, sector_map = registry.remap_entities(json.loads(metadata[b'entities']))
+        if 'district_id' in df.columns and not np.array_equal(district_map, np.arange(len(district_map))):
+            df['district_id'] = district_map[df['district_id'].values]
+        if 'sector_id' in df.columns and not np.array_equal(sector_map, np.arange(len(sector_map))):
+            df['sector_id'] = sector_map[df['sector_id'].values]
+        
+        # Name columns, month names and geometry go straight into their final positions - the stored columns
+        # are already in final order, and reordering with df[columns] would copy every column off the map
+        id_columns = [col for col in ['province_id', 'district_id', 'sector_id'] if col in df.columns]
+        added = registry.attach_labels(pd.DataFrame({col: df[col].values for col in id_columns})).drop(columns=id_columns)
+        if 'month' in df.columns:
+            added['month_name'] = np.array(calendar.month_name, dtype=object)[df['month'].values]
+        added['geometry'] = shapes
+        columns = [col for col in json.loads(metadata[b'columns']) if col in df.columns or col in added.columns]
+        for position, col in enumerate(columns):
+            if col not in df.columns:
+                df.insert(position, col, added[col].values)
+        
+        # GeoDataFrame copies a plain DataFrame unless told not to
+        merged = gpd.GeoDataFrame(df, geometry='geometry', crs=metadata.get(b'crs', b'').decode() or None, copy=False)
+        if logger.isEnabledFor(logging.DEBUG):
+            copied = self.get_copied_columns(table, merged)
+            if copied:
+                logger.debug("Arrow artifact %s: %s copied instead of memory-mapped", self.get_artifact_path(), ', '.join(copied))
+        return merged
+    
+    @staticmethod
+    def get_copied_columns(table, frame: pd.DataFrame) -> List[str]:
+        """Numeric columns of a frame read from an artifact that no longer share the mapped Arrow buffers"""
+        import pyarrow.types as pat
+        copied = []
+        for field in table.schema:
+            column = table.column(field.name)
+            # Remapped ids are rebuilt on purpose; columns with nulls are always filled into new arrays
+            if field.name not in frame.columns or field.name.endswith('_id') or column.null_count or column.num_chunks != 1:
+                continue
+            if pat.is_integer(field.type) or pat.is_floating(field.type):
+                if not np.shares_memory(frame[field.name].to_numpy(), column.chunk(0).to_numpy()):
+                    copied.append(field.name)
+        return copied
+    
+    def build_data(self, df: pd.DataFrame, gdf: Optional[gpd.GeoDataFrame]) -> gpd.GeoDataFrame:
+        """Process the raw CSV and merge it with its geometries - a plain DataFrame when there are none"""
+        import geopandas as gpd
+        df = self.process_data(df)
+        registry = get_registry()
+        id_col = self.get_id_column()
+        
+        # Resolve every province/district/sector alias to its canonical integer id once
+        df = registry.apply(df)
+        if gdf is None:
+            merged = df
+        else:
+            gdf = registry.apply(gdf[self.get_join_columns() + ['geometry']])
+            gdf = gdf[[id_col, 'geometry']].drop_duplicates(subset=id_col)
+            merged = df.merge(gdf, on=id_col, how='left')
+        
+        # Sector display names for selection come from the registry, one string per sector
+        if id_col == 'sector_id':
+            merged['sector_display'] = registry.sector_display_labels(merged['sector_id'].values)
+            merged['sector_key'] = registry.sector_key_labels(merged['sector_id'].values)
+        
+        return merged if gdf is None else gpd.GeoDataFrame(merged, geometry='geometry')
 
 class MalariaDataLoader(BaseDataLoader):
     def __init__(self):
@@ -56,6 +383,9 @@ class MalariaDataLoader(BaseDataLoader):
     def get_join_column(self):
         return 'District'
     
+    def get_id_column(self):
+        return 'district_id'
+    
     def process_data(self, df):
         df['Date'] = pd.to_datetime(df['Date'])
         df['year'] = df['Date'].dt.year.astype('int32')
@@ -74,6 +404,9 @@ class SectorDataLoader(BaseDataLoader):
     def get_join_column(self):
         return ['District', 'Sector']
     
+    def get_id_column(self):
+        return 'sector_id'
+    
     def process_data(self, df):
         df['Date'] = pd.to_datetime(df['Date'])
         df['year'] = df['Date'].dt.year.astype('int32')
@@ -83,4 +416,10 @@ class SectorDataLoader(BaseDataLoader):
         for col in ['Population', 'Simple malaria cases', 'incidence']:
             if col in df.columns:
                 df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-        return df
\ No newline at end of file
+        return df
+
+def load_levels(loaders: Dict[str, BaseDataLoader]) -> Dict[str, Tuple[gpd.GeoDataFrame, list]]:
+    """Read every level's CSV and geometry in one worker pool, then join and build each level"""
+    with ThreadPoolExecutor(max_workers=2 * len(loaders)) as executor:
+        reads = {name: loader.submit_reads(executor) for name, loader in loaders.items()}
+        return {name: loaders[name].load_from_futures(*futures) for name, futures in reads.items()}
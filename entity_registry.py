@@ -0,0 +1,224 @@
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+class EntityRegistry:
+    """Canonical province/district/sector dictionary mapping every alias to a compact integer id"""
+
+    PROVINCES = ['Kigali City', 'Northern', 'Southern', 'Eastern', 'Western']
+
+    PROVINCE_ALIASES = {
+        'kigali': 'Kigali City', 'kigali city': 'Kigali City', 'city of kigali': 'Kigali City',
+        'umujyi wa kigali': 'Kigali City',
+        'north': 'Northern', 'northern': 'Northern', 'northern province': 'Northern', 'amajyaruguru': 'Northern',
+        'south': 'Southern', 'southern': 'Southern', 'southern province': 'Southern', 'amajyepfo': 'Southern',
+        'east': 'Eastern', 'eastern': 'Eastern', 'eastern province': 'Eastern', 'iburasirazuba': 'Eastern',
+        'west': 'Western', 'western': 'Western', 'western province': 'Western', 'iburengerazuba': 'Western'
+    }
+
+    # The 30 districts and their provinces - ids follow this order
+    DISTRICTS = {
+        'Gasabo': 'Kigali City', 'Kicukiro': 'Kigali City', 'Nyarugenge': 'Kigali City',
+        'Burera': 'Northern', 'Gakenke': 'Northern', 'Gicumbi': 'Northern', 'Musanze': 'Northern', 'Rulindo': 'Northern',
+        'Gisagara': 'Southern', 'Huye': 'Southern', 'Kamonyi': 'Southern', 'Muhanga': 'Southern',
+        'Nyamagabe': 'Southern', 'Nyanza': 'Southern', 'Nyaruguru': 'Southern', 'Ruhango': 'Southern',
+        'Bugesera': 'Eastern', 'Gatsibo': 'Eastern', 'Kayonza': 'Eastern', 'Kirehe': 'Eastern',
+        'Ngoma': 'Eastern', 'Nyagatare': 'Eastern', 'Rwamagana': 'Eastern',
+        'Karongi': 'Western', 'Ngororero': 'Western', 'Nyabihu': 'Western', 'Nyamasheke': 'Western',
+        'Rubavu': 'Western', 'Rusizi': 'Western', 'Rutsiro': 'Western'
+    }
+
+    DISTRICT_ALIASES = {
+        'cyangugu': 'Rusizi', 'gisenyi': 'Rubavu', 'ruhengeri': 'Musanze', 'butare': 'Huye', 'gitarama': 'Muhanga'
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.province_names: List[str] = list(self.PROVINCES)
+        self.district_names: List[str] = list(self.DISTRICTS)
+        self.district_province: List[int] = [self.PROVINCES.index(p) for p in self.DISTRICTS.values()]
+        self.sector_names: List[str] = []
+        self.sector_district: List[int] = []
+        self.sector_display: List[str] = []
+        self.sector_keys: List[str] = []
+        self._province_index = {self.normalize(alias): self.PROVINCES.index(name)
+                                 for alias, name in self.PROVINCE_ALIASES.items()}
+        self._district_index = {self.normalize(name): i for i, name in enumerate(self.district_names)}
+        self._district_index.update({self.normalize(alias): self.district_names.index(name)
+                                     for alias, name in self.DISTRICT_ALIASES.items()})
+        self._sector_index: Dict[tuple, int] = {}
+
+    @staticmethod
+    def normalize(name) -> str:
+        """Alias lookup key: lower case with collapsed whitespace"""
+        return ' '.join(str(name).split()).lower()
+
+    @staticmethod
+    def canonical_name(name) -> str:
+        """Display form of a name that has no registered alias"""
+        return ' '.join(str(name).split()).title()
+
+    def resolve_provinces(self, names: pd.Series) -> np.ndarray:
+        """Province ids for a column of names, -1 where the name is unknown"""
+        return self._resolve(names, lambda name: self._province_index.get(self.normalize(name), -1))
+
+    def resolve_districts(self, names: pd.Series) -> np.ndarray:
+        """District ids for a column of names, registering districts not seen before - -1 where a name is missing"""
+        return self._resolve(names, self._district_id)
+
+    def resolve_sectors(self, district_ids: np.ndarray, names: pd.Series) -> np.ndarray:
+        """Sector ids for (district id, sector name) pairs, registering new sectors in sorted order
+        
+        A missing or blank name, or an unknown district, gets -1 and is not registered.
+        """
+        codes, uniques = pd.factorize(names)
+        keys = np.array([self.normalize(name) for name in uniques] + [''], dtype=object)
+        display = {self.normalize(name): self.canonical_name(name) for name in uniques}
+        district_ids = np.asarray(district_ids)
+        known = (keys[codes] != '') & (district_ids >= 0)
+        result = np.full(len(codes), -1, dtype='int32')
+        if not known.any():
+            return result
+        pairs = pd.DataFrame({'district_id': district_ids[known], 'key': keys[codes][known]})
+        unique_pairs = pairs.drop_duplicates().sort_values(['district_id', 'key'])
+        with self._lock:
+            for district_id, key in unique_pairs.itertuples(index=False):
+                if (district_id, key) not in self._sector_index:
+                    self._sector_index[(district_id, key)] = len(self.sector_names)
+                    self.sector_names.append(display[key])
+                    self.sector_district.append(int(district_id))
+                    self.sector_display.append(f"{display[key]} ({self.district_names[district_id]})")
+                    self.sector_keys.append(f"{display[key]}_{self.district_names[district_id]}")
+            unique_index = pd.MultiIndex.from_frame(unique_pairs)
+            ids = np.array([self._sector_index[pair] for pair in unique_index], dtype='int32')
+        result[known] = ids[unique_index.get_indexer(pd.MultiIndex.from_frame(pairs))]
+        return result
+
+    def _resolve(self, names: pd.Series, resolve_one) -> np.ndarray:
+        """Resolve each distinct name once and broadcast the ids back to the rows"""
+        codes, uniques = pd.factorize(names)
+        ids = np.array([resolve_one(name) for name in uniques] + [-1], dtype='int32')
+        return ids[codes]
+
+    def _district_id(self, name) -> int:
+        key = self.normalize(name)
+        if not key:
+            return -1
+        with self._lock:
+            if key not in self._district_index:
+                self._district_index[key] = len(self.district_names)
+                self.district_names.append(self.canonical_name(name))
+                self.district_province.append(-1)
+            return self._district_index[key]
+
+    def apply(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Add integer ids for every entity column and rewrite the names in canonical form"""
+        if 'District' in frame.columns:
+            frame['district_id'] = self.resolve_districts(frame['District'])
+            frame['District'] = self.district_labels(frame['district_id'].values)
+        if 'Province' in frame.columns or 'district_id' in frame.columns:
+            province_ids = np.full(len(frame), -1, dtype='int32')
+            if 'Province' in frame.columns:
+                province_ids = self.resolve_provinces(frame['Province'])
+            if 'district_id' in frame.columns:
+                # Fall back to the district's province where the province name is unknown or missing
+                district_ids = frame['district_id'].values
+                from_district = np.where(district_ids >= 0,
+                                         np.asarray(self.district_province, dtype='int32')[np.maximum(district_ids, 0)], -1)
+                province_ids = np.where(province_ids >= 0, province_ids, from_district)
+            frame['province_id'] = province_ids
+            frame['Province'] = self.province_labels(province_ids)
+        if 'Sector' in frame.columns and 'district_id' in frame.columns:
+            frame['sector_id'] = self.resolve_sectors(frame['district_id'].values, frame['Sector'])
+            frame['Sector'] = self.sector_labels(frame['sector_id'].values)
+        return frame
+
+    def attach_labels(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Rebuild the name columns from id columns, e.g. for frames read back from an artifact"""
+        if 'province_id' in frame.columns:
+            frame['Province'] = self.province_labels(frame['province_id'].values)
+        if 'district_id' in frame.columns:
+            frame['District'] = self.district_labels(frame['district_id'].values)
+        if 'sector_id' in frame.columns:
+            frame['Sector'] = self.sector_labels(frame['sector_id'].values)
+            frame['sector_display'] = self.sector_display_labels(frame['sector_id'].values)
+            frame['sector_key'] = self.sector_key_labels(frame['sector_id'].values)
+        return frame
+    
+    def export_entities(self) -> dict:
+        """Districts and sectors in id order, so another process can map the ids back"""
+        with self._lock:
+            return {
+                'districts': list(self.district_names),
+                'sectors': [[district, name] for district, name in zip(self.sector_district, self.sector_names)]
+            }
+    
+    def remap_entities(self, entities: dict) -> Tuple[np.ndarray, np.ndarray]:
+        """Translate exported district and sector ids to this registry's ids"""
+        district_map = self.resolve_districts(pd.Series(entities['districts'], dtype=object))
+        sectors = entities['sectors']
+        if not sectors:
+            return district_map, np.array([], dtype='int32')
+        sector_districts = district_map[np.array([district for district, _ in sectors], dtype='int32')]
+        sector_map = self.resolve_sectors(sector_districts, pd.Series([name for _, name in sectors], dtype=object))
+        return district_map, sector_map
+    
+    def province_labels(self, ids: np.ndarray) -> np.ndarray:
+        return self._labels(self.province_names, ids)
+
+    def district_labels(self, ids: np.ndarray) -> np.ndarray:
+        return self._labels(self.district_names, ids)
+
+    def sector_labels(self, ids: np.ndarray) -> np.ndarray:
+        return self._labels(self.sector_names, ids)
+
+    def sector_display_labels(self, ids: np.ndarray) -> np.ndarray:
+        """'Sector (District)' labels, built once per sector rather than per row"""
+        return self._labels(self.sector_display, ids)
+
+    def sector_key_labels(self, ids: np.ndarray) -> np.ndarray:
+        """'Sector_District' keys, built once per sector rather than per row"""
+        return self._labels(self.sector_keys, ids)
+
+    def labels(self, id_column: str, ids: np.ndarray) -> np.ndarray:
+        """Display labels for a column of ids - sectors are shown as 'Sector (District)'"""
+        names = {'province_id': self.province_names, 'district_id': self.district_names,
+                 'sector_id': self.sector_display}[id_column]
+        return self._labels(names, ids)
+    
+    def find_ids(self, id_column: str, name: str) -> List[int]:
+        """Ids matching a name or alias without registering anything - sectors match by name or 'Sector (District)'"""
+        key = self.normalize(name)
+        if id_column == 'province_id':
+            province = self._province_index.get(key)
+            return [] if province is None else [province]
+        if id_column == 'district_id':
+            district = self._district_index.get(key)
+            return [] if district is None else [district]
+        with self._lock:
+            return [i for i, (sector, display) in enumerate(zip(self.sector_names, self.sector_display))
+                    if self.normalize(sector) == key or self.normalize(display) == key]
+    
+    def label(self, id_column: str, entity_id: int) -> str:
+        """Display label for a single id, used as the multiselect format_func"""
+        names = {'province_id': self.province_names, 'district_id': self.district_names,
+                 'sector_id': self.sector_display}[id_column]
+        return names[entity_id] if 0 <= entity_id < len(names) else 'Unknown'
+
+    @staticmethod
+    def _labels(names: List[str], ids: np.ndarray) -> np.ndarray:
+        labels = np.array(list(names) + ['Unknown'], dtype=object)
+        ids = np.asarray(ids)
+        return labels[np.where((ids >= 0) & (ids < len(names)), ids, len(names))]
+
+_registry: Optional[EntityRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> EntityRegistry:
+    """Process-wide registry shared by every loader and session"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = EntityRegistry()
+        return _registry
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import os
+import numpy as np
+import pandas as pd
+import streamlit as st
+from typing import Dict, Optional, Tuple
+
+from data_loader import BaseDataLoader
+
+class FacilityClusterIndex:
+    """Health-facility points aggregated into nested grid clusters for every map zoom level
+
+    Cell sizes halve from one zoom level to the next, so every cell sits inside exactly one cell of each
+    coarser level and a cluster can be expanded into its children. Only cluster summaries reach the map.
+    """
+
+    DEFAULT_FILE = 'data/health_facilities.csv'
+    ZOOM_LEVELS = list(range(6, 15))
+    CELL_PIXELS = 64  # roughly one marker per 64x64 screen pixels
+
+    def __init__(self, data_file: str = DEFAULT_FILE):
+        self.data_file = data_file
+
+    def is_available(self) -> bool:
+        """The layer is optional - it only shows when a facility file is present"""
+        return os.path.exists(self.data_file)
+
+    def get_dataset_version(self) -> str:
+        return BaseDataLoader.get_file_signature(self.data_file)
+
+    @classmethod
+    def get_cell_size(cls, zoom: int) -> float:
+        """Cell width in degrees of CELL_PIXELS screen pixels at a Web Mercator zoom level"""
+        return 360.0 / (256 * 2 ** zoom) * cls.CELL_PIXELS
+
+    def build(self) -> Dict[str, object]:
+        """Build the cluster index once per facility file version"""
+        return self._build(self.get_dataset_version())
+
+    @st.cache_resource(max_entries=2)  # current and previous version
+    def _build(_self, dataset_version: str) -> Dict[str, object]:
+        """Cached per dataset version"""
+        from scipy import sparse
+        df = pd.read_csv(_self.data_file, usecols=['Facility', 'District', 'Latitude', 'Longitude', 'Date', 'Cases'])
+        dates = pd.to_datetime(df['Date'])
+        df['year'], df['month'] = dates.dt.year.astype('int32'), dates.dt.month.astype('int32')
+        df['Cases'] = pd.to_numeric(df['Cases'], errors='coerce').fillna(0)
+
+        facilities = df.drop_duplicates('Facility').dropna(subset=['Latitude', 'Longitude']).reset_index(drop=True)
+        periods = pd.MultiIndex.from_frame(df[['year', 'month']].drop_duplicates().sort_values(['year', 'month']))
+        cases = (df.pivot_table(index='Facility', columns=['year', 'month'], values='Cases', aggfunc='sum')
+                 .reindex(index=facilities['Facility'], columns=periods).fillna(0).to_numpy())
+
+        lon = facilities['Longitude'].to_numpy(dtype=float)
+        lat = facilities['Latitude'].to_numpy(dtype=float)
+        levels = {}
+        for zoom in _self.ZOOM_LEVELS:
+            size = _self.get_cell_size(zoom)
+            cells, facility_cell = np.unique(
+                np.column_stack([np.floor(lon / size), np.floor(lat / size)]).astype('int64'),
+                axis=0, return_inverse=True
+            )
+            facility_cell = facility_cell.ravel()
+            membership = sparse.csr_matrix(
+                (np.ones(len(lon)), (facility_cell, np.arange(len(lon)))), shape=(len(cells), len(lon))
+            )
+            count = np.asarray(membership.sum(axis=1)).ravel()
+            levels[zoom] = {
+                'cells': cells,
+                'facility_cell': facility_cell,
+                'count': count.astype(int),
+                'lon': (membership @ lon) / count,
+                'lat': (membership @ lat) / count,
+                # Cell x period case totals - one sparse product for every period
+                'cases': membership @ cases
+            }
+        return {'facilities': facilities, 'periods': periods, 'cases': cases, 'levels': levels}
+
+    def get_clusters(self, zoom: int, year: int, month: int,
+                     within: Optional[Tuple[int, int, int]] = None) -> pd.DataFrame:
+        """Cluster summaries for a period at a zoom level, optionally only the children of (zoom, x, y)"""
+        index = self.build()
+        zoom = min(max(zoom, self.ZOOM_LEVELS[0]), self.ZOOM_LEVELS[-1])
+        level = index['levels'][zoom]
+        column = index['periods'].get_indexer([(year, month)])[0]
+        period_cases = level['cases'][:, column] if column >= 0 else np.zeros(len(level['cells']))
+
+        keep = np.ones(len(level['cells']), dtype=bool)
+        if within is not None:
+            parent_zoom, parent_x, parent_y = within
+            shift = zoom - parent_zoom
+            if shift < 0:
+                raise ValueError("Clusters can only be expanded into a finer zoom level")
+            keep = ((level['cells'][:, 0] >> shift) == parent_x) & ((level['cells'][:, 1] >> shift) == parent_y)
+
+        clusters = pd.DataFrame({
+            'zoom': zoom,
+            'cell_x': level['cells'][keep, 0],
+            'cell_y': level['cells'][keep, 1],
+            'lon': level['lon'][keep],
+            'lat': level['lat'][keep],
+            'facilities': level['count'][keep],
+            'cases': period_cases[keep]
+        })
+        # Single-facility clusters are labelled with the facility itself
+        first_facility = pd.Series(np.arange(len(level['facility_cell']))).groupby(level['facility_cell']).first()
+        names = index['facilities']['Facility'].to_numpy()[first_facility.reindex(np.flatnonzero(keep)).to_numpy()]
+        clusters['label'] = np.where(clusters['facilities'] == 1, names,
+                                     clusters['facilities'].astype(str) + ' facilities')
+        return clusters.sort_values('cases', ascending=False).reset_index(drop=True)
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import itertools
+import os
+import numpy as np
+import pandas as pd
+import streamlit as st
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+SEASON = 12
+
+# Smoothing parameter grid searched per entity: (level alpha, trend beta, seasonal gamma, seasonal on/off).
+# The non-seasonal sets (damped Holt) win for entities whose seasonal pattern does not repeat reliably.
+PARAMETER_GRID = np.array(
+    list(itertools.product([0.1, 0.3, 0.5, 0.8], [0.01, 0.1], [0.05, 0.2, 0.4], [1.0])) +
+    list(itertools.product([0.1, 0.3, 0.5, 0.8, 1.0], [0.0, 0.01, 0.1], [0.0], [0.0]))
+)
+DAMPING = 0.95
+
+def fit_holt_winters(values: np.ndarray, horizon: int) -> np.ndarray:
+    """Damped additive Holt-Winters forecasts of an entities x months array, every entity fitted at once
+
+    Each entity gets the grid parameters with the lowest one-step-ahead error after the first season.
+    Series shorter than two seasons fall back to seasonal naive with the recent trend.
+    """
+    n_entities, n_periods = values.shape
+    if n_periods < 2 * SEASON:
+        return seasonal_naive(values, horizon)
+
+    # Evaluate every parameter set for every entity in one recursion: rows are (parameter set, entity)
+    n_sets = len(PARAMETER_GRID)
+    y = np.tile(values, (n_sets, 1))
+    alpha, beta, gamma, seasonal_on = (np.repeat(PARAMETER_GRID[:, i], n_entities) for i in range(4))
+
+    first, second = values[:, :SEASON], values[:, SEASON:2 * SEASON]
+    level = np.tile(first.mean(axis=1), n_sets)
+    trend = np.tile((second.mean(axis=1) - first.mean(axis=1)) / SEASON, n_sets)
+    seasonal = np.tile(first - first.mean(axis=1, keepdims=True), (n_sets, 1)) * seasonal_on[:, None]
+    sse = np.zeros(len(y))
+
+    for t in range(n_periods):
+        s = t % SEASON
+        prediction = level + DAMPING * trend + seasonal[:, s]
+        if t >= SEASON:
+            sse += (y[:, t] - prediction) ** 2
+        new_level = alpha * (y[:, t] - seasonal[:, s]) + (1 - alpha) * (level + DAMPING * trend)
+        trend = beta * (new_level - level) + (1 - beta) * DAMPING * trend
+        seasonal[:, s] = gamma * (y[:, t] - new_level) + (1 - gamma) * seasonal[:, s]
+        level = new_level
+
+    best = sse.reshape(n_sets, n_entities).argmin(axis=0) * n_entities + np.arange(n_entities)
+    steps = np.arange(1, horizon + 1)
+    damped_steps = np.cumsum(DAMPING ** steps)
+    season_index = (n_periods + steps - 1) % SEASON
+    forecasts = level[best, None] + damped_steps[None, :] * trend[best, None] + seasonal[best][:, season_index]
+    return np.clip(forecasts, 0, None)
+
+def seasonal_naive(values: np.ndarray, horizon: int) -> np.ndarray:
+    """Same month last year plus the average monthly change over the last year, or the last value"""
+    n_periods = values.shape[1]
+    steps = np.arange(1, horizon + 1)
+    if n_periods < SEASON:
+        return np.repeat(values[:, -1:], horizon, axis=1)
+    last_season = values[:, -SEASON:]
+    if n_periods >= SEASON + 1:
+        drift = (values[:, -1] - values[:, -SEASON - 1]) / SEASON
+    else:
+        drift = np.zeros(len(values))
+    forecasts = last_season[:, (steps - 1) % SEASON] + drift[:, None] * steps[None, :]
+    return np.clip(forecasts, 0, None)
+
+class SeasonalForecaster:
+    """Next-quarter case projections for every district or sector, refitted once per dataset version"""
+
+    FORECAST_TARGETS = {'Districts': 'all cases', 'Sectors': 'Simple malaria cases'}
+    PARALLEL_THRESHOLD = 2000  # entities per level before fitting is spread over processes
+
+    def __init__(self, dashboard_type: str, metrics_calculator, horizon: int = 3, workers: Optional[int] = None):
+        self.dashboard_type = dashboard_type
+        self.metrics_calculator = metrics_calculator
+        self.horizon = horizon
+        self.workers = workers or os.cpu_count() or 1
+
+    def get_target(self) -> str:
+        return self.FORECAST_TARGETS.get(self.dashboard_type, self.FORECAST_TARGETS['Districts'])
+
+    def supports(self, metric: str) -> bool:
+        """The target count itself, or a derived metric of it with a per-entity denominator"""
+        if metric == self.get_target():
+            return True
+        definition = self.metrics_calculator.get_derived_metrics().get(metric)
+        return definition is not None and definition.numerator == self.get_target()
+
+    def get_forecasts(self, data: gpd.GeoDataFrame) -> pd.DataFrame:
+        """Forecast target cases of every entity - built once per dataset version when it is known"""
+        dataset_version = self.metrics_calculator.dataset_version
+        if dataset_version is None:
+            return self._fit(data)
+        return self._cached_forecasts(data, self.dashboard_type, dataset_version, self.horizon)
+
+    @st.cache_data(max_entries=4)  # both levels, current and previous version
+    def _cached_forecasts(_self, _data, dashboard_type: str, dataset_version: str, horizon: int) -> pd.DataFrame:
+        """Cached per (level, dataset version, horizon)"""
+        return _self._fit(_data)
+
+    def _fit(self, data: gpd.GeoDataFrame) -> pd.DataFrame:
+        """Fit every entity's monthly series and return id, year, month and forecast rows"""
+        id_col = self.metrics_calculator.get_id_column()
+        series = data.groupby([id_col, 'year', 'month'])[self.get_target()].sum()
+        dates = pd.to_datetime(pd.DataFrame({
+            'year': series.index.get_level_values('year'), 'month': series.index.get_level_values('month'), 'day': 1
+        }))
+        values = pd.Series(series.values, index=pd.MultiIndex.from_arrays([series.index.get_level_values(id_col), dates]))
+
+        # Entities x consecutive months; gaps are interpolated so every series is evenly spaced
+        months = pd.date_range(dates.min(), dates.max(), freq='MS')
+        matrix = values.unstack().reindex(columns=months)
+        matrix = matrix.interpolate(axis=1, limit_direction='both').fillna(0)
+
+        entity_values = matrix.to_numpy(dtype=float)
+        if len(entity_values) > self.PARALLEL_THRESHOLD and self.workers > 1:
+            chunks = np.array_split(entity_values, self.workers)
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                forecasts = np.vstack(list(executor.map(fit_holt_winters, chunks, [self.horizon] * len(chunks))))
+        else:
+            forecasts = fit_holt_winters(entity_values, self.horizon)
+
+        future = pd.date_range(months[-1] + pd.DateOffset(months=1), periods=self.horizon, freq='MS')
+        return pd.DataFrame({
+            id_col: np.repeat(matrix.index.values, self.horizon),
+            'year': np.tile(future.year.values, len(matrix)).astype('int32'),
+            'month': np.tile(future.month.values, len(matrix)).astype('int32'),
+            'forecast': forecasts.ravel()
+        })
+
+    def forecast_metric(self, data: gpd.GeoDataFrame, metric: str) -> Optional[pd.DataFrame]:
+        """Forecasts in the units of a metric - derived metrics use each entity's latest denominator"""
+        if not self.supports(metric):
+            return None
+        definition = self.metrics_calculator.get_derived_metrics().get(metric)
+        if definition is not None and definition.denominator not in data.columns:
+            return None
+        forecasts = self.get_forecasts(data).copy()
+        if definition is not None and metric != self.get_target():
+            id_col = self.metrics_calculator.get_id_column()
+            latest = data.sort_values(['year', 'month']).groupby(id_col)[definition.denominator].last()
+            denominator = forecasts[id_col].map(latest)
+            forecasts['forecast'] = (forecasts['forecast'] * definition.scale / denominator.where(denominator > 0)).fillna(0)
+        return forecasts
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+from entity_registry import get_registry
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+class GeometryStore:
+    """Boundary polygons as WKB in GeoParquet - one row group per district, a bounding box per feature"""
+
+    PARTITION_COLUMN = 'District'
+    BBOX_FIELDS = ['xmin', 'ymin', 'xmax', 'ymax']
+
+    def __init__(self, geometry_file: str, signature: str):
+        self.geometry_file = geometry_file
+        self.signature = signature
+
+    def get_store_path(self) -> str:
+        """GeoParquet file written next to the GeoJSON it was built from"""
+        return os.path.splitext(self.geometry_file)[0] + '.geoparquet'
+
+    def is_current(self) -> bool:
+        """True when the store exists and was built from the current geometry file"""
+        path = self.get_store_path()
+        if not os.path.exists(path):
+            return False
+        try:
+            import pyarrow.parquet as pq
+            metadata = pq.read_schema(path).metadata or {}
+            return metadata.get(b'source_signature', b'').decode() == self.signature
+        except Exception:
+            return False
+
+    def build(self):
+        """Parse the GeoJSON once and write it as WKB, sorted and grouped by district"""
+        import geopandas as gpd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        gdf = gpd.read_file(self.geometry_file)
+        registry = get_registry()
+        if self.PARTITION_COLUMN in gdf.columns:
+            gdf[self.PARTITION_COLUMN] = registry.district_labels(registry.resolve_districts(gdf[self.PARTITION_COLUMN]))
+        else:
+            gdf[self.PARTITION_COLUMN] = ''
+        gdf = gdf.sort_values(self.PARTITION_COLUMN, kind='stable').reset_index(drop=True)
+
+        bounds = gdf.geometry.bounds.to_numpy()
+        bbox = pa.StructArray.from_arrays([pa.array(bounds[:, i]) for i in range(4)], names=self.BBOX_FIELDS)
+        table = pa.Table.from_pandas(pd.DataFrame(gdf.drop(columns='geometry')), preserve_index=False)
+        table = table.append_column('bbox', bbox).append_column(
+            'geometry', pa.array(list(gdf.geometry.to_wkb().values), type=pa.binary())
+        )
+        table = table.replace_schema_metadata({
+            'geo': json.dumps(self._geo_metadata(gdf, bounds)),
+            'source_signature': self.signature
+        })
+
+        path = self.get_store_path()
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            # One row group per district, so district and bounding-box filters skip whole groups
+            partitions = gdf[self.PARTITION_COLUMN].values
+            starts = np.flatnonzero(np.r_[True, partitions[1:] != partitions[:-1]])
+            with pq.ParquetWriter(temp_path, table.schema) as writer:
+                for start, end in zip(starts, np.r_[starts[1:], len(gdf)]):
+                    writer.write_table(table.slice(start, end - start))
+            os.replace(temp_path, path)
+        except OSError:
+            # Read-only deployments keep working from the GeoJSON
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _geo_metadata(self, gdf: gpd.GeoDataFrame, bounds: np.ndarray) -> dict:
+        """GeoParquet 1.1 column metadata with the bbox covering column"""
+        column = {
+            'encoding': 'WKB',
+            'geometry_types': sorted(gdf.geometry.geom_type.dropna().unique().tolist()),
+            'bbox': [float(np.nanmin(bounds[:, 0])), float(np.nanmin(bounds[:, 1])),
+                     float(np.nanmax(bounds[:, 2])), float(np.nanmax(bounds[:, 3]))] if len(gdf) else [],
+            'covering': {'bbox': {field: ['bbox', field] for field in self.BBOX_FIELDS}}
+        }
+        if gdf.crs is not None:
+            column['crs'] = gdf.crs.to_json_dict()
+        return {'version': '1.1.0', 'primary_column': 'geometry', 'columns': {'geometry': column}}
+
+    def read(self, districts: Optional[Sequence[str]] = None, bbox: Optional[Tuple[float, float, float, float]] = None,
+             columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Features matching the district and bounding-box filters, geometry left as WKB bytes"""
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        condition = None
+        if districts is not None:
+            registry = get_registry()
+            names = [name for district in districts for name in registry.district_labels(registry.find_ids('district_id', district))]
+            condition = pc.field(self.PARTITION_COLUMN).isin(names)
+        if bbox is not None:
+            xmin, ymin, xmax, ymax = bbox
+            overlaps = ((pc.field('bbox', 'xmin') <= xmax) & (pc.field('bbox', 'xmax') >= xmin) &
+                        (pc.field('bbox', 'ymin') <= ymax) & (pc.field('bbox', 'ymax') >= ymin))
+            condition = overlaps if condition is None else condition & overlaps
+
+        table = ds.dataset(self.get_store_path(), format='parquet').to_table(columns=columns, filter=condition)
+        return table.to_pandas()
+
+    def read_geodataframe(self, districts: Optional[Sequence[str]] = None,
+                          bbox: Optional[Tuple[float, float, float, float]] = None) -> gpd.GeoDataFrame:
+        """Matching features with only their geometry decoded"""
+        return self.decode(self.read(districts, bbox))
+
+    def decode(self, frame: pd.DataFrame) -> gpd.GeoDataFrame:
+        """Turn a WKB frame from read() into a GeoDataFrame"""
+        import geopandas as gpd
+        geometry = gpd.GeoSeries.from_wkb(frame['geometry'].values, index=frame.index, crs=self.get_crs())
+        return gpd.GeoDataFrame(frame.drop(columns=['geometry', 'bbox'], errors='ignore'), geometry=geometry)
+
+    def get_crs(self):
+        """CRS recorded in the GeoParquet metadata"""
+        import pyarrow.parquet as pq
+        from pyproj import CRS
+        geo = json.loads((pq.read_schema(self.get_store_path()).metadata or {}).get(b'geo', b'{}'))
+        crs = geo.get('columns', {}).get('geometry', {}).get('crs')
+        return CRS.from_json_dict(crs) if crs else None
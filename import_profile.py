@@ -0,0 +1,110 @@
+"""Reproducible import-time report for the dashboard's cold start.
+
+Imports the app module in fresh interpreters with ``python -X importtime`` and
+reports the median total, the slowest modules and which heavy stacks were
+pulled in at import. Heavy stacks the baseline (Streamlit itself) already
+imports are listed apart, since the app cannot defer them:
+
+    python import_profile.py                  # text report
+    python import_profile.py --runs 7 --json  # machine-readable, for tracking over time
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+HEAVY_MODULES = ['geopandas', 'plotly.express', 'plotly.graph_objects', 'shapely', 'scipy.sparse', 'pyproj', 'fiona']
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+def profile_once(module: str) -> Dict[str, Dict[str, int]]:
+    """Import a module in a fresh interpreter and parse the importtime output (microseconds)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else f'import {module} failed')
+
+    timings = {}
+    pending_children = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        depth = (len(indent) - 1) // 2
+        timings[name] = {'self': int(self_us), 'cumulative': int(cumulative_us), 'direct': False}
+
+        # importtime lists children before their parent, one indent level deeper
+        if depth == 1:
+            pending_children.append(name)
+        elif depth == 0:
+            if name == module:
+                for child in pending_children:
+                    timings[child]['direct'] = True
+            pending_children = []
+    return timings
+
+def build_report(module: str, runs: int, top: int, baseline: str = 'streamlit') -> dict:
+    """Median timings over several fresh imports"""
+    samples = [profile_once(module) for _ in range(runs)]
+    baseline_modules = set(profile_once(baseline)) if baseline else set()
+    modules = set().union(*samples)
+
+    def median(name: str, field: str) -> float:
+        return statistics.median(sample[name][field] for sample in samples if name in sample) / 1000
+
+    slowest = sorted(modules, key=lambda name: median(name, 'cumulative'), reverse=True)
+    direct = [name for name in slowest if any(sample.get(name, {}).get('direct') for sample in samples)]
+    return {
+        'module': module,
+        'runs': runs,
+        'python': sys.version.split()[0],
+        'total_ms': round(median(module, 'cumulative'), 1),
+        'direct_imports_ms': {name: round(median(name, 'cumulative'), 1) for name in direct[:top]},
+        'slowest_self_ms': {
+            name: round(median(name, 'self'), 1)
+            for name in sorted(modules, key=lambda name: median(name, 'self'), reverse=True)[:top]
+        },
+        'baseline': baseline,
+        'heavy_modules_imported': [name for name in HEAVY_MODULES
+                                   if any(name in sample for sample in samples) and name not in baseline_modules],
+        'heavy_modules_in_baseline': [name for name in HEAVY_MODULES if name in baseline_modules]
+    }
+
+def format_report(report: dict) -> str:
+    """Plain text version of the report"""
+    lines = [
+        f"Import profile: {report['module']} (median of {report['runs']} runs, Python {report['python']})",
+        f"Total: {report['total_ms']:.1f} ms",
+        "",
+        f"Direct imports of {report['module']} (cumulative ms):"
+    ]
+    lines += [f"  {name:<40} {ms:8.1f}" for name, ms in report['direct_imports_ms'].items()]
+    lines += ["", "Slowest modules (self ms):"]
+    lines += [f"  {name:<40} {ms:8.1f}" for name, ms in report['slowest_self_ms'].items()]
+    heavy: List[str] = report['heavy_modules_imported']
+    lines += ["", f"Heavy stacks imported at startup: {', '.join(heavy) if heavy else 'none'}"]
+    if report['heavy_modules_in_baseline']:
+        lines.append(f"Already imported by {report['baseline']}: {', '.join(report['heavy_modules_in_baseline'])}")
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='main_dashboard', help='Module to import (default: main_dashboard)')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreter runs to take the median of')
+    parser.add_argument('--baseline', default='streamlit', help='Module whose own imports are listed apart (default: streamlit)')
+    parser.add_argument('--top', type=int, default=15, help='Number of modules to list')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    report = build_report(args.module, args.runs, args.top, args.baseline)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""Multi-session load test for the dashboard, driven headlessly through Streamlit's AppTest runner.
+
+Simulated sessions switch tabs, scrub the year and month sliders, change metrics and pick trend
+entities in one process, sharing its caches and figure pool the way sessions of one instance do.
+Rerun latency percentiles, throughput and memory are reported per session count.
+
+AppTest installs a process-wide mock Runtime for each run and clears it afterwards, so runs cannot
+overlap: the sessions' threads take turns. Latency therefore includes waiting for other sessions'
+reruns. It models queueing for one script thread, not a server running scripts in parallel, so read
+the session counts as offered load on a single core:
+
+    python load_test.py                                   # 1, 2, 4 and 8 sessions on the bundled data
+    python load_test.py --sessions 1,4,16 --interactions 30 --budget-ms 1500
+    python load_test.py --synthetic --years 8 --json      # generated data, machine-readable
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(APP_DIR, 'main_dashboard.py')
+
+DATA_FILES = {
+    'district': ('data/district_malaria_data.csv', 'data/district_geometries.geojson'),
+    'sector': ('data/sector_malaria_data.csv', 'data/sector_geometries.geojson')
+}
+
+# Widget key prefix and trend id column of each tab; the provinces tab only has a metric selector
+TABS = {'Districts': ('district', 'district_id'), 'Sectors': ('sector', 'sector_id'), 'Provinces': ('province', None)}
+
+# Relative weight of each interaction - tab switches are followed by an interaction in the new tab,
+# since st.tabs renders every tab on each rerun and switching alone does not rerun the script
+ACTIONS = {'tab': 2, 'year': 3, 'month': 4, 'metric': 2, 'trend': 2}
+
+RWANDA_BOUNDS = (28.86, -2.84, 30.90, -1.05)
+
+# === DATA ===
+
+def prepare_data_root(synthetic: bool, years: int, sectors_per_district: int, seed: int) -> Tuple[str, Optional[str]]:
+    """Directory holding data/ for the app to run from, and a temporary directory to remove afterwards
+
+    The bundled CSVs are used as they are when their boundaries exist. Otherwise a working copy gets
+    grid boundaries, since only the shape of the polygons matters for load, not where they lie.
+    """
+    if not synthetic and all(os.path.exists(os.path.join(APP_DIR, path)) for pair in DATA_FILES.values() for path in pair):
+        return APP_DIR, None
+
+    root = tempfile.mkdtemp(prefix='dashboard_load_')
+    os.makedirs(os.path.join(root, 'data'))
+    if synthetic or not all(os.path.exists(os.path.join(APP_DIR, csv)) for csv, _ in DATA_FILES.values()):
+        write_synthetic_csvs(root, years, sectors_per_district, seed)
+    else:
+        for csv, _ in DATA_FILES.values():
+            shutil.copy(os.path.join(APP_DIR, csv), os.path.join(root, csv))
+    write_grid_geometries(root)
+    return root, root
+
+def write_synthetic_csvs(root: str, years: int, sectors_per_district: int, seed: int):
+    """Seasonal monthly counts for every district and a fixed number of sectors per district"""
+    from entity_registry import EntityRegistry
+
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=pd.Timestamp.today().normalize().replace(day=1), periods=12 * years, freq='MS')
+    # Two transmission peaks a year, as in the bundled data
+    season = 1 + 0.5 * np.cos(2 * np.pi * (dates.month.to_numpy() - 5) / 12) ** 2
+
+    district_rows, sector_rows = [], []
+    for district, province in EntityRegistry.DISTRICTS.items():
+        sector_population = rng.integers(15_000, 45_000, sectors_per_district)
+        sector_rate = rng.gamma(2.0, 2.0, sectors_per_district)  # monthly cases per 1,000 people
+        sector_cases = rng.poisson(np.outer(season, sector_rate * sector_population / 1000))
+        for j in range(sectors_per_district):
+            sector_rows.append(pd.DataFrame({
+                'Date': dates.strftime('%Y-%m-%d'), 'Province': province, 'District': district,
+                'Sector': f'{district} {j + 1:02d}', 'Population': sector_population[j],
+                'Simple malaria cases': sector_cases[:, j],
+                'incidence': sector_cases[:, j] / sector_population[j] * 1000
+            }))
+
+        population = int(sector_population.sum())
+        cases = sector_cases.sum(axis=1) + rng.poisson(0.1 * sector_cases.sum(axis=1))
+        severe = rng.binomial(cases, 0.002)
+        district_rows.append(pd.DataFrame({
+            'Date': dates.strftime('%Y-%m-%d'), 'Province': province, 'District': district, 'Population': population,
+            'all cases': cases, 'Severe cases/Deaths': severe.astype(float),
+            'all cases incidence': cases / population * 1000, 'Severe cases/Deaths incidence': severe / population * 1000
+        }))
+
+    pd.concat(district_rows).to_csv(os.path.join(root, DATA_FILES['district'][0]), index=False)
+    pd.concat(sector_rows).to_csv(os.path.join(root, DATA_FILES['sector'][0]), index=False)
+
+def write_grid_geometries(root: str):
+    """District cells on a grid over Rwanda's bounding box, each split into square sector cells"""
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    districts = pd.read_csv(os.path.join(root, DATA_FILES['district'][0]), usecols=['Province', 'District'])
+    sectors = pd.read_csv(os.path.join(root, DATA_FILES['sector'][0]), usecols=['Province', 'District', 'Sector'])
+    districts = districts.drop_duplicates('District').reset_index(drop=True)
+    sectors = sectors.drop_duplicates().reset_index(drop=True)
+    district_keys = sectors['District'].str.strip().str.lower()
+
+    x0, y0, x1, y1 = RWANDA_BOUNDS
+    columns = int(np.ceil(np.sqrt(len(districts))))
+    width, height = (x1 - x0) / columns, (y1 - y0) / int(np.ceil(len(districts) / columns))
+    district_cells, sector_cells = [], []
+    for i, district in enumerate(districts['District']):
+        left, bottom = x0 + (i % columns) * width, y0 + (i // columns) * height
+        district_cells.append(box(left, bottom, left + width, bottom + height))
+        members = sectors[district_keys == district.strip().lower()]
+        k = max(1, int(np.ceil(np.sqrt(len(members)))))
+        for j, row in enumerate(members.itertuples(index=False)):
+            sx, sy = left + (j % k) * width / k, bottom + (j // k) * height / k
+            sector_cells.append({'Province': row.Province, 'District': row.District, 'Sector': row.Sector,
+                                 'geometry': box(sx, sy, sx + width / k, sy + height / k)})
+
+    gpd.GeoDataFrame(districts, geometry=district_cells, crs=4326).to_file(
+        os.path.join(root, DATA_FILES['district'][1]), driver='GeoJSON')
+    gpd.GeoDataFrame(sector_cells, crs=4326).to_file(os.path.join(root, DATA_FILES['sector'][1]), driver='GeoJSON')
+
+# === SESSIONS ===
+
+class LoadSession:
+    """One simulated browser session: an AppTest instance and a random walk over the controls"""
+
+    # AppTest.run swaps the global Runtime._instance, so overlapping runs would see another session's
+    # runtime or none at all
+    _run_lock = threading.Lock()
+
+    def __init__(self, seed: int, timeout: float):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(APP_FILE, default_timeout=timeout)
+        self.rng = random.Random(seed)
+        self.tab = 'Districts'
+
+    def run(self) -> Tuple[float, Optional[str]]:
+        """Rerun the script, returning its wall time in seconds - waiting for its turn included - and the first exception"""
+        start = time.perf_counter()
+        with self._run_lock:
+            self.at.run()
+        elapsed = time.perf_counter() - start
+        exceptions = self.at.exception
+        return elapsed, (exceptions[0].value if len(exceptions) else None)
+
+    def interact(self) -> Optional[str]:
+        """Change one control, without rerunning - the name of the action, or None when it had nothing to change"""
+        action = self.rng.choices(list(ACTIONS), weights=list(ACTIONS.values()))[0]
+        if action == 'tab':
+            self.tab = self.rng.choice([tab for tab in TABS if tab != self.tab])
+            action = 'metric' if self.tab == 'Provinces' else self.rng.choice(['year', 'month', 'metric', 'trend'])
+            return f'tab+{action}' if self._apply(action) else None
+        if self.tab == 'Provinces' and action != 'metric':
+            self.tab = self.rng.choice(['Districts', 'Sectors'])
+        return action if self._apply(action) else None
+
+    def _apply(self, action: str) -> bool:
+        prefix, id_col = TABS[self.tab]
+        try:
+            if action in ('year', 'month'):
+                slider = self.at.slider(key=f'{prefix}_{action}_slider_main')
+                if slider.min == slider.max:
+                    return False
+                values = range(int(slider.min), int(slider.max) + 1)
+                slider.set_value(self.rng.choice([value for value in values if value != slider.value]))
+            elif action == 'metric':
+                key = 'province_metric_selector' if prefix == 'province' else f'{prefix}_metric_selector_main'
+                selectbox = self.at.selectbox(key=key)
+                selectbox.set_value(self.rng.choice([option for option in selectbox.options if option != selectbox.value]))
+            elif action == 'trend':
+                from entity_registry import get_registry
+
+                multiselect = self.at.multiselect(key=f'trend_filter_{self.tab.lower()}')
+                labels = self.rng.sample(multiselect.options, min(len(multiselect.options), self.rng.randint(1, 4)))
+                multiselect.set_value([get_registry().find_ids(id_col, label)[0] for label in labels])
+        except (KeyError, IndexError):
+            # Control not rendered on this rerun, e.g. the trend filter while a tab shows an error
+            return False
+        return True
+
+# === MEASUREMENT ===
+
+def current_rss_mb() -> float:
+    """Resident set size of this process, or its peak where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+class MemorySampler(threading.Thread):
+    """Polls RSS in the background to catch the peak between reruns"""
+
+    def __init__(self, interval: float = 0.02):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def stop(self) -> float:
+        self._stopped.set()
+        self.join()
+        return max(self.peak, current_rss_mb())
+
+def run_level(sessions: int, interactions: int, seed: int, timeout: float, think_time: float) -> dict:
+    """Open `sessions` sessions, then let each make `interactions` changes, their reruns taking turns"""
+    gc.collect()
+    baseline = current_rss_mb()
+    sampler = MemorySampler()
+    sampler.start()
+
+    clients = [LoadSession(seed * 1000 + i, timeout) for i in range(sessions)]
+    first_loads, errors = [], []
+    for client in clients:
+        elapsed, error = client.run()
+        first_loads.append(elapsed)
+        errors += [error] if error else []
+    opened = current_rss_mb()
+
+    latencies: List[List[float]] = [[] for _ in clients]
+    actions: Dict[str, int] = {}
+    lock = threading.Lock()
+    barrier = threading.Barrier(sessions)
+
+    def drive(i: int):
+        client = clients[i]
+        barrier.wait()
+        try:
+            for _ in range(interactions):
+                action = client.interact()
+                if action is None:
+                    continue
+                elapsed, error = client.run()
+                latencies[i].append(elapsed)
+                with lock:
+                    actions[action] = actions.get(action, 0) + 1
+                    errors.extend([error] if error else [])
+                if think_time:
+                    time.sleep(client.rng.uniform(0, 2 * think_time))
+        except Exception as e:
+            # A session that stops early still counts, rather than vanishing with its thread
+            with lock:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    threads = [threading.Thread(target=drive, args=(i,), name=f'load-session-{i}') for i in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    peak = sampler.stop()
+
+    reruns = np.array([elapsed for session in latencies for elapsed in session]) * 1000
+    percentiles = dict(zip(['p50', 'p90', 'p95', 'p99'], np.percentile(reruns, [50, 90, 95, 99]).round(1).tolist())) \
+        if len(reruns) else {}
+    del clients
+    return {
+        'sessions': sessions,
+        'reruns': int(len(reruns)),
+        'errors': len(errors),
+        'first_error': str(errors[0]) if errors else None,
+        'first_load_ms': round(statistics.median(first_loads) * 1000, 1),
+        'latency_ms': {**percentiles, 'mean': round(float(reruns.mean()), 1) if len(reruns) else None,
+                       'max': round(float(reruns.max()), 1) if len(reruns) else None},
+        'throughput_rps': round(len(reruns) / wall, 2) if wall else None,
+        'wall_s': round(wall, 2),
+        'rss_baseline_mb': round(baseline, 1),
+        'rss_peak_mb': round(peak, 1),
+        'mb_per_session': round((opened - baseline) / sessions, 1),
+        'actions': dict(sorted(actions.items()))
+    }
+
+def build_report(session_counts: List[int], interactions: int, seed: int, timeout: float, think_time: float,
+                 budget_ms: float, data_root: str) -> dict:
+    """Warm the process-wide caches once, then measure each session count in turn"""
+    start = time.perf_counter()
+    _, error = LoadSession(seed, timeout).run()
+    if error:
+        raise RuntimeError(f"App failed on first load: {error}")
+    cold_start = time.perf_counter() - start
+
+    levels = [run_level(n, interactions, seed + n, timeout, think_time) for n in session_counts]
+    # Largest session count before the first one whose p95 passes the budget
+    within = 0
+    for level in levels:
+        if level['errors'] or level['latency_ms'].get('p95', float('inf')) > budget_ms:
+            break
+        within = level['sessions']
+    return {
+        'data_root': data_root,
+        'python': sys.version.split()[0],
+        'cpus': os.cpu_count(),
+        'interactions_per_session': interactions,
+        'think_time_s': think_time,
+        'budget_ms': budget_ms,
+        'cold_start_s': round(cold_start, 2),
+        'levels': levels,
+        'max_sessions_within_budget': within
+    }
+
+def format_report(report: dict) -> str:
+    """Plain text version of the report"""
+    lines = [
+        f"Load test: {report['interactions_per_session']} interactions per session, "
+        f"Python {report['python']}, {report['cpus']} CPUs",
+        f"Data: {report['data_root']}",
+        f"Cold start (first session, empty caches): {report['cold_start_s']:.2f} s",
+        "",
+        f"{'sessions':>8} {'reruns':>7} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8} "
+        f"{'rerun/s':>8} {'MB/sess':>8} {'peak MB':>8} {'errors':>7}"
+    ]
+    for level in report['levels']:
+        latency = level['latency_ms']
+        cells = [latency.get(name) for name in ('p50', 'p90', 'p95', 'p99', 'max')]
+        lines.append(
+            f"{level['sessions']:>8} {level['reruns']:>7} " + ' '.join(
+                f"{value:>8.1f}" if value is not None else f"{'-':>8}" for value in cells) +
+            f" {level['throughput_rps'] or 0:>8.2f} {level['mb_per_session']:>8.1f} {level['rss_peak_mb']:>8.1f} "
+            f"{level['errors']:>7}"
+        )
+    lines += ["", "Latencies are per rerun in ms; MB/sess is RSS added by opening one session.",
+              "Reruns take turns (AppTest swaps a process-wide Runtime), so latency includes queueing behind other sessions."]
+    errors = [level['first_error'] for level in report['levels'] if level['first_error']]
+    if errors:
+        lines.append(f"First error: {errors[0]}")
+    lines.append(f"Sessions within the {report['budget_ms']:.0f} ms p95 budget without errors: "
+                 f"up to {report['max_sessions_within_budget']}")
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', default='1,2,4,8', help='Comma-separated open session counts')
+    parser.add_argument('--interactions', type=int, default=20, help='Control changes (reruns) per session')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Mean pause between a session\'s reruns, in seconds')
+    parser.add_argument('--budget-ms', type=float, default=1000.0, help='p95 rerun latency budget')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Timeout of a single rerun, in seconds')
+    parser.add_argument('--seed', type=int, default=7, help='Seed of the sessions\' random walks and synthetic data')
+    parser.add_argument('--synthetic', action='store_true', help='Generate CSVs instead of using the bundled data')
+    parser.add_argument('--years', type=int, default=5, help='Years of synthetic data')
+    parser.add_argument('--sectors-per-district', type=int, default=14, help='Sectors per district in synthetic data')
+    parser.add_argument('--verbose', action='store_true', help='Keep the app\'s own progress output')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    session_counts = sorted({int(n) for n in args.sessions.split(',') if n.strip()})
+    data_root, temp_root = prepare_data_root(args.synthetic, args.years, args.sectors_per_district, args.seed)
+    # Source files do not change during a run, so the watcher would only add noise
+    os.environ.setdefault('DASHBOARD_WATCH_INTERVAL', '0')
+    cwd = os.getcwd()
+    os.chdir(data_root)
+    try:
+        # The app prints progress on every rerun; keep it out of the report unless asked for
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            report = build_report(session_counts, args.interactions, args.seed, args.timeout, args.think_time,
+                                  args.budget_ms, 'synthetic' if args.synthetic else ('bundled' if temp_root is None
+                                                                                    else 'bundled CSVs, grid boundaries'))
+    finally:
+        os.chdir(cwd)
+        if temp_root is not None:
+            shutil.rmtree(temp_root, ignore_errors=True)
+
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+if __name__ == "__main__":
+    main()
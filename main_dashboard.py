@@ -1,14 +1,31 @@
+from __future__ import annotations
+
+import os
+import time
 import streamlit as st
-import geopandas as gpd
 import pandas as pd
-from typing import List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
 import numpy as np
 
+if TYPE_CHECKING:
+    import geopandas as gpd
+
 # Import custom classes
 from data_loader import MalariaDataLoader, SectorDataLoader
 from metrics_calculator import MetricsCalculator
 from map_visualizations import MapVisualizations
 from chart_visualizations import ChartVisualizations
+from spatial_statistics import SpatialStatistics
+from reconciliation import HierarchyReconciler
+from entity_registry import get_registry
+from facility_clusters import FacilityClusterIndex
+from data_export import ViewExporter
+from forecasting import SeasonalForecaster
+from source_watcher import DatasetSnapshot, SourceWatcher
+from sqlite_source import get_sqlite_source
 
 class DashboardConfig:
     """Handle page configuration and styling"""
@@ -126,6 +143,9 @@ class DashboardUI:
         7: "July", 8: "August", 9: "September", 10: "October", 11: "November", 12: "December"
     }
     
+    # Month spans offered as seasons in range mode: (first month, last month), wrapping into the next year
+    TRANSMISSION_SEASONS = {'Apr–Jun': (4, 6), 'Oct–Jan': (10, 1)}
+    
     # Updated HTML templates with fixed heights and better spacing
     SECTION_TEMPLATE = """
     <div style="background: linear-gradient(135deg, #1a1a1a 0%, #2d2d2d 100%); 
@@ -173,11 +193,98 @@ class DashboardUI:
         'concerns': {'border_color': '#ef4444', 'header_color': '#f87171'}
     }
     
-    def __init__(self, dashboard_type: str, metrics_calculator, map_viz, chart_viz):
+    # Show per-section run counters under each section (set DASHBOARD_SECTION_TIMINGS=1)
+    SHOW_SECTION_TIMINGS = os.environ.get('DASHBOARD_SECTION_TIMINGS') == '1'
+    
+    def __init__(self, dashboard_type: str, metrics_calculator, map_viz, chart_viz, spatial_stats=None, forecaster=None):
         self.dashboard_type = dashboard_type
         self.metrics_calculator = metrics_calculator
         self.map_viz = map_viz
         self.chart_viz = chart_viz
+        self.spatial_stats = spatial_stats
+        self.forecaster = forecaster
+        self.prefetched_figures: Dict[tuple, Future] = {}
+        self.figure_timings: Dict[str, float] = {}
+    
+    @contextmanager
+    def track_section(self, section: str):
+        """Count runs and time of a dashboard section, so fragment reruns can be checked section by section"""
+        key_prefix = "district" if self.dashboard_type == "Districts" else "sector"
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            section_runs = st.session_state.setdefault('section_runs', {})
+            runs = section_runs.get(f"{key_prefix}_{section}", {}).get('runs', 0) + 1
+            section_runs[f"{key_prefix}_{section}"] = {'runs': runs, 'last_ms': round(elapsed_ms, 1)}
+            # The counters are always kept; printing every section of every rerun is opt-in
+            if self.SHOW_SECTION_TIMINGS:
+                print(f"Section {key_prefix}_{section}: run #{runs} in {elapsed_ms:.1f} ms")
+                st.caption(f"⏱️ {section.replace('_', ' ')} · run #{runs} · {elapsed_ms:.0f} ms")
+    
+    def prefetch_figures(self, data: gpd.GeoDataFrame, selected_year: int, selected_month: int, selected_metric: str,
+                         period_range: Optional[tuple] = None):
+        """Start building this rerun's independent figures in the worker pool, when one is configured
+        
+        The widget values they depend on are read from session state before the widgets render. Each section
+        takes its figure when it renders. Without a pool (the default) each section builds its own figure inline.
+        """
+        key_prefix = "district" if self.dashboard_type == "Districts" else "sector"
+        state = st.session_state
+        jobs = {}
+        if period_range is None:
+            if not state.get(f"{key_prefix}_map_animation", False):
+                color_mode = state.get(f"{key_prefix}_map_color_mode", 'continuous')
+                jobs[('map', selected_year, selected_month, selected_metric, color_mode)] = partial(
+                    self.map_viz.create_choropleth_map, data, selected_year, selected_month, selected_metric, color_mode
+                )
+            top_n = state.get(f"{key_prefix}_ranking_n", 10)
+            bottom = state.get(f"{key_prefix}_ranking_position", "Top") == "Bottom"
+            jobs[('top_entities', selected_year, selected_month, selected_metric, top_n, bottom)] = partial(
+                self.chart_viz.create_top_entities_chart, data, selected_year, selected_month, selected_metric, top_n, bottom
+            )
+        trend_entities = tuple(state.get(f"trend_filter_{self.dashboard_type.lower()}") or ())
+        if trend_entities:
+            show_forecast = state.get(f"trend_forecast_{self.dashboard_type.lower()}", False)
+            jobs[('trend', trend_entities, selected_metric, show_forecast)] = partial(
+                self._build_trend_figure, data, list(trend_entities), selected_metric, show_forecast
+            )
+        jobs[('scatter', selected_year, selected_month)] = partial(
+            self.chart_viz.create_scatterplot, data, selected_year, selected_month
+        )
+        
+        pool = get_figure_pool()
+        if pool is None:
+            return
+        for key, build in jobs.items():
+            self.prefetched_figures[key] = pool.submit(self._time_figure, key[0], build)
+    
+    def _take_figure(self, key: tuple, build: Callable):
+        """The prefetched figure for exactly these inputs, else build it now - each prefetched figure is used once"""
+        future = self.prefetched_figures.pop(key, None)
+        if future is None:
+            return self._time_figure(key[0], build)
+        return future.result()
+    
+    def _time_figure(self, name: str, build: Callable):
+        start = time.perf_counter()
+        try:
+            return build()
+        finally:
+            self.figure_timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    
+    def report_figure_timings(self, started: float):
+        """Record per-figure build times against the rerun's wall-clock time"""
+        key_prefix = "district" if self.dashboard_type == "Districts" else "sector"
+        for future in self.prefetched_figures.values():
+            future.cancel()
+        self.prefetched_figures.clear()
+        wall_ms = (time.perf_counter() - started) * 1000
+        st.session_state.setdefault('figure_timings', {})[key_prefix] = {**self.figure_timings, 'wall_ms': round(wall_ms, 1)}
+        if self.SHOW_SECTION_TIMINGS and self.figure_timings:
+            built = " · ".join(f"{name} {ms:.0f} ms" for name, ms in self.figure_timings.items())
+            st.caption(f"⏱️ figures: {built} · sum {sum(self.figure_timings.values()):.0f} ms · rerun {wall_ms:.0f} ms")
     
     def render_header(self):
         """Render dashboard header"""
@@ -188,8 +295,12 @@ class DashboardUI:
             st.title("🏥 Rwanda Malaria Sectors Dashboard")
             st.markdown("*Track malaria cases, incidence, and trends across Rwanda's sectors*")
     
-    def render_controls_in_main_area(self, data: gpd.GeoDataFrame, entity_options: List[str]) -> Tuple[int, int, str]:
-        """Render collapsible controls with enhanced styling"""
+    def render_controls_in_main_area(self, data: gpd.GeoDataFrame, entity_options: List[int]
+                                     ) -> Tuple[int, int, str, Optional[Tuple[Tuple[int, int], Tuple[int, int]]]]:
+        """Render collapsible controls with enhanced styling
+        
+        Returns the selected month, metric and - in range mode - the (start, end) periods, ending at the month.
+        """
         
         # Enhanced CSS for better expander styling
         st.markdown("""
@@ -256,27 +367,33 @@ class DashboardUI:
             with col1:
                 st.markdown('<div class="control-section">', unsafe_allow_html=True)
                 st.markdown("#### 📅 Time Period")
-                selected_year, selected_month = self._render_time_controls_main(data)
+                selected_year, selected_month, period_range = self._render_time_controls_main(data)
                 st.markdown('</div>', unsafe_allow_html=True)
             
             with col2:
                 st.markdown('<div class="control-section">', unsafe_allow_html=True)
                 st.markdown("#### 📈 Primary Metric")
-                selected_metric = self._render_metric_selection_main()
+                selected_metric = self._render_metric_selection_main(data)
                 st.markdown('</div>', unsafe_allow_html=True)
             
             with col3:
                 st.markdown('<div class="control-section">', unsafe_allow_html=True)
                 st.markdown("#### 📊 Current Selection")
-                self._render_enhanced_selection_summary(selected_year, selected_month, selected_metric)
+                self._render_enhanced_selection_summary(selected_year, selected_month, selected_metric, period_range)
                 st.markdown('</div>', unsafe_allow_html=True)
         
-        return selected_year, selected_month, selected_metric
+        return selected_year, selected_month, selected_metric, period_range
     
-    def _render_time_controls_main(self, data: gpd.GeoDataFrame) -> Tuple[int, int]:
-        """Render time controls in main area (not sidebar)"""
+    def _render_time_controls_main(self, data: gpd.GeoDataFrame) -> Tuple[int, int, Optional[tuple]]:
+        """Render time controls in main area (not sidebar) - one month, or a range of months"""
         key_prefix = "district" if self.dashboard_type == "Districts" else "sector"
         
+        mode = st.radio("Period", ["Month", "Range"], horizontal=True, key=f"{key_prefix}_period_mode",
+                        help="Aggregate any span of months: counts are summed, incidence is population-weighted")
+        if mode == "Range":
+            start, end = self._render_range_controls_main(data, key_prefix)
+            return end[0], end[1], (start, end)
+        
         # Initialize session state
         years = sorted(data['year'].unique())
         if f'{key_prefix}_year' not in st.session_state:
@@ -299,7 +416,55 @@ class DashboardUI:
         # Month selection with validation
         selected_month = self._render_month_control_main(data, selected_year, key_prefix)
         
-        return selected_year, selected_month
+        return selected_year, selected_month, None
+    
+    def _render_range_controls_main(self, data: gpd.GeoDataFrame, key_prefix: str) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        """Render a custom, quarter or season range over the available months"""
+        periods = sorted(set(zip(data['year'].astype(int), data['month'].astype(int))))
+        kind = st.selectbox("Range", ["Custom", "Quarter", "Season"], key=f"{key_prefix}_range_kind")
+        
+        if kind == "Custom":
+            labels = [self._format_period(period) for period in periods]
+            start_label, end_label = st.select_slider(
+                "Months", options=labels, value=(labels[max(len(labels) - 12, 0)], labels[-1]),
+                key=f"{key_prefix}_range_slider", help="Inclusive range of months to aggregate"
+            )
+            return periods[labels.index(start_label)], periods[labels.index(end_label)]
+        
+        presets = self._get_range_presets(periods, kind)
+        start, end = st.selectbox(
+            kind, presets, index=len(presets) - 1, key=f"{key_prefix}_range_{kind.lower()}",
+            format_func=lambda span: self._format_period_range(span, kind)
+        )
+        # Clamp to the data, so a season still in progress ends at the latest month
+        return max(start, periods[0]), min(end, periods[-1])
+    
+    def _get_range_presets(self, periods: List[Tuple[int, int]], kind: str) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """Calendar quarters or seasons overlapping the available months, oldest first"""
+        if kind == "Quarter":
+            spans = [(3 * q + 1, 3 * q + 3) for q in range(4)]
+        else:
+            spans = list(self.TRANSMISSION_SEASONS.values())
+        
+        presets = []
+        for year in range(periods[0][0] - 1, periods[-1][0] + 1):
+            for first, last in spans:
+                start, end = (year, first), (year + (last < first), last)
+                if start <= periods[-1] and end >= periods[0]:
+                    presets.append((start, end))
+        return sorted(presets)
+    
+    def _format_period(self, period: Tuple[int, int]) -> str:
+        return f"{self.MONTH_NAMES[period[1]][:3]} {period[0]}"
+    
+    def _format_period_range(self, period_range: Tuple[Tuple[int, int], Tuple[int, int]], kind: str = "Custom") -> str:
+        """'Q2 2023' for quarters, otherwise 'Oct 2022 – Jan 2023'"""
+        start, end = period_range
+        if kind == "Quarter":
+            return f"Q{(start[1] - 1) // 3 + 1} {start[0]}"
+        if start == end:
+            return self._format_period(start)
+        return f"{self._format_period(start)} – {self._format_period(end)}"
     
     def _render_month_control_main(self, data: gpd.GeoDataFrame, selected_year: int, key_prefix: str) -> int:
         """Render month control in main area with validation"""
@@ -322,11 +487,11 @@ class DashboardUI:
             st.error("No data available for selected year")
             return 1
     
-    def _render_metric_selection_main(self) -> str:
-        """Render metric selection in main area"""
+    def _render_metric_selection_main(self, data: gpd.GeoDataFrame) -> str:
+        """Render metric selection in main area, including derived metrics the data can support"""
         key_prefix = "district" if self.dashboard_type == "Districts" else "sector"
         
-        metric_options = self.metrics_calculator.get_available_metrics()
+        metric_options = self.metrics_calculator.get_available_metrics(data.columns)
         selected_metric_display = st.selectbox(
             "Choose Metric", list(metric_options.keys()),
             key=f"{key_prefix}_metric_selector_main",
@@ -334,22 +499,25 @@ class DashboardUI:
         )
         return metric_options[selected_metric_display]
     
-    def _render_entity_selection_main(self, entity_options: List[str]) -> List[str]:
-        """Render entity selection in main area"""
+    def _render_entity_selection_main(self, entity_options: List[int]) -> List[int]:
+        """Render entity id selection in main area"""
         key_prefix = "district" if self.dashboard_type == "Districts" else "sector"
         entity_label = "Districts" if self.dashboard_type == "Districts" else "Sectors"
+        id_col = self.metrics_calculator.get_id_column()
         
         return st.multiselect(
             f"Choose {entity_label} to Compare", entity_options, default=[],
+            format_func=lambda entity_id: get_registry().label(id_col, entity_id),
             key=f"{key_prefix}_entity_selector_main", max_selections=10,
             help=f"Select up to 10 {entity_label.lower()} to see their trends over time"
         )
     
-    def _render_enhanced_selection_summary(self, year: int, month: int, metric: str):
+    def _render_enhanced_selection_summary(self, year: int, month: int, metric: str, period_range: Optional[tuple] = None):
         """Enhanced summary with better formatting and fixed height"""
         month_name = self.MONTH_NAMES.get(month, str(month))
+        period_label = f"{month_name} {year}" if period_range is None else self._format_period_range(period_range)
         metric_options = self.metrics_calculator.get_available_metrics()
-        metric_display = next((k for k, v in metric_options.items() if v == metric), metric)
+        metric_display = next((k for k, v in metric_options.items() if v == metric), self.metrics_calculator.get_metric_label(metric))
         
         st.markdown(f"""
         <div style="background: linear-gradient(135deg, #1e40af 0%, #3b82f6 100%); 
@@ -357,7 +525,7 @@ class DashboardUI:
                     text-align: center; height: 120px; display: flex; 
                     flex-direction: column; justify-content: center;">
             <div style="font-size: 1.2rem; font-weight: bold; margin-bottom: 0.5rem;">
-                📊 {month_name} {year}
+                📊 {period_label}
             </div>
             <div style="font-size: 1rem; opacity: 0.9;">
                 📈 {metric_display}
@@ -374,7 +542,7 @@ class DashboardUI:
         if f'{other_prefix}_month' in st.session_state:
             st.session_state[f'{key_prefix}_month'] = st.session_state[f'{other_prefix}_month']
     
-    def render_color_coded_overview(self, current_data, previous_data, selected_year: int, selected_month: int, selected_metric: str):
+    def render_color_coded_overview(self, data, selected_year: int, selected_month: int, selected_metric: str):
         """Render equal-height color-coded sections using CSS Grid with dynamic sizing"""
         st.markdown(f"### {self.MONTH_NAMES.get(selected_month)} {selected_year} Overview")
         
@@ -382,10 +550,8 @@ class DashboardUI:
         dashboard_class = "districts" if self.dashboard_type == "Districts" else "sectors"
         st.markdown(f'<div class="overview-container {dashboard_class}">', unsafe_allow_html=True)
         
-        # Create the three sections
-        status_html = self._render_section_html('status', current_data, previous_data, selected_metric)
-        improvements_html = self._render_section_html('improvements', current_data, previous_data, selected_metric)
-        concerns_html = self._render_section_html('concerns', current_data, previous_data, selected_metric)
+        # The three sections come pre-rendered for every period of the metric
+        status_html, improvements_html, concerns_html = self.get_overview_cards(data, selected_year, selected_month, selected_metric)
         
         # Render all three sections
         col1, col2, col3 = st.columns(3)
@@ -398,18 +564,212 @@ class DashboardUI:
         
         st.markdown('</div>', unsafe_allow_html=True)
     
-    def render_map_and_top_entities(self, data: gpd.GeoDataFrame, selected_year: int, selected_month: int, selected_metric: str):
-        """Render map and top entities charts with maximized map size"""
-        map_col, chart_col = st.columns([7, 3])
+    def render_range_overview(self, data: gpd.GeoDataFrame, period_range: Tuple[Tuple[int, int], Tuple[int, int]],
+                              selected_metric: str):
+        """Totals, map and ranking of a range of months, read from the prefix-sum index"""
+        start, end = period_range
+        period_label = self._format_period_range(period_range)
+        st.markdown(f"### {period_label} Overview")
+        
+        count_metrics = self.metrics_calculator.get_count_metrics()
+        definition = self.metrics_calculator.get_derived_metrics().get(selected_metric)
+        parts = [definition.numerator, definition.denominator] if definition is not None else []
+        range_values = self.metrics_calculator.aggregate_range(
+            data, start, end, list(dict.fromkeys([selected_metric] + count_metrics + parts))
+        )
+        if range_values.empty or selected_metric not in range_values.columns:
+            st.warning(f"No data found for {period_label}. Please select a different range.")
+            return
         
-        with map_col:
-            map_fig = self.map_viz.create_choropleth_map(data, selected_year, selected_month, selected_metric)
-            st.plotly_chart(map_fig, use_container_width=True)
+        # Headline totals; a derived metric is recomputed from the summed parts, not averaged over entities
+        headline = [("Months", f"{(end[0] - start[0]) * 12 + end[1] - start[1] + 1}")]
+        headline += [(self.metrics_calculator.get_metric_label(metric), f"{range_values[metric].sum():,.0f}")
+                     for metric in count_metrics]
+        if definition is not None and set(parts) <= set(range_values.columns) and range_values[parts[1]].sum() > 0:
+            overall = range_values[parts[0]].sum() * definition.scale / range_values[parts[1]].sum()
+            headline.append((f"Overall {definition.label}", f"{overall:,.2f}"))
+        for col, (label, value) in zip(st.columns(len(headline)), headline):
+            col.metric(label, value)
         
+        map_col, chart_col = st.columns([7, 3])
+        with map_col:
+            st.plotly_chart(self.map_viz.create_range_choropleth_map(data, range_values, selected_metric, period_label),
+                            use_container_width=True)
         with chart_col:
-            top_entities_fig = self.chart_viz.create_top_entities_chart(data, selected_year, selected_month, selected_metric)
+            st.plotly_chart(self.chart_viz.create_range_chart(range_values, selected_metric, period_label),
+                            use_container_width=True)
+    
+    @st.fragment
+    def render_map_and_top_entities(self, data: gpd.GeoDataFrame, selected_year: int, selected_month: int, selected_metric: str,
+                                    all_data: Optional[gpd.GeoDataFrame] = None):
+        """Render map and top entities charts with maximized map size - reruns on its own when the map mode changes"""
+        with self.track_section('map_top_entities'):
+            map_col, chart_col = st.columns([7, 3])
+            
+            with map_col:
+                key_prefix = "district" if self.dashboard_type == "Districts" else "sector"
+                animate_col, mode_col = st.columns([3, 2])
+                with animate_col:
+                    animate = all_data is not None and st.toggle(
+                        "▶️ Animate all months in the browser", value=False, key=f"{key_prefix}_map_animation",
+                        help="Send the boundaries once and play or scrub through every month without reloading the page"
+                    )
+                with mode_col:
+                    color_modes = {'continuous': 'Continuous', **self.metrics_calculator.CLASS_SCHEMES}
+                    color_mode = st.selectbox(
+                        "Color classes", list(color_modes), format_func=color_modes.get, key=f"{key_prefix}_map_color_mode",
+                        disabled=animate, help="Class breaks are computed once over all periods, so colors stay comparable month to month"
+                    )
+                # The full dataset is passed so class breaks, ranges and animation frames cover every period
+                map_data = all_data if all_data is not None else data
+                if animate:
+                    # Facility clusters are counted for the selected month, so they stay off while scrubbing
+                    map_fig = self.map_viz.create_animated_choropleth_map(map_data, selected_metric, selected_year, selected_month)
+                else:
+                    map_fig = self._take_figure(
+                        ('map', selected_year, selected_month, selected_metric, color_mode),
+                        partial(self.map_viz.create_choropleth_map, map_data, selected_year, selected_month, selected_metric, color_mode)
+                    )
+                    self._render_facility_layer(map_fig, selected_year, selected_month)
+                if map_fig is None:
+                    st.info(f"No {selected_metric} values to animate - turn off animation to see the selected month")
+                else:
+                    st.plotly_chart(map_fig, use_container_width=True)
+            
+            with chart_col:
+                self._render_rankings(all_data if all_data is not None else data, selected_year, selected_month, selected_metric)
+    
+    def _render_facility_layer(self, map_fig, selected_year: int, selected_month: int):
+        """Optional health-facility clusters with a detail level and drill-down into one cluster"""
+        facility_index = FacilityClusterIndex()
+        if not facility_index.is_available():
+            return
+        key_prefix = "district" if self.dashboard_type == "Districts" else "sector"
+        if not st.toggle("🏥 Show health facilities", value=False, key=f"{key_prefix}_facility_layer"):
+            return
+        
+        detail_levels = {"Province": 7, "District": 8, "Sector": 10, "Facility": 14}
+        detail_col, expand_col = st.columns(2)
+        with detail_col:
+            detail = st.select_slider("Cluster detail", list(detail_levels), value="District", key=f"{key_prefix}_facility_detail")
+        zoom = detail_levels[detail]
+        clusters = facility_index.get_clusters(zoom, selected_year, selected_month)
+        
+        # Drill down: replace the view with the next level's clusters inside one cluster
+        expandable = clusters[clusters['facilities'] > 1].head(50)
+        with expand_col:
+            expand = st.selectbox(
+                "Expand cluster", [None] + list(expandable.index), key=f"{key_prefix}_facility_expand",
+                format_func=lambda i: "—" if i is None else
+                f"{expandable.at[i, 'label']} · {expandable.at[i, 'cases']:,.0f} cases"
+            )
+        center = None
+        if expand is not None and expand in expandable.index:
+            parent = expandable.loc[expand]
+            child_zoom = min(zoom + 2, FacilityClusterIndex.ZOOM_LEVELS[-1])
+            clusters = facility_index.get_clusters(child_zoom, selected_year, selected_month,
+                                                   within=(zoom, int(parent['cell_x']), int(parent['cell_y'])))
+            center, zoom = {'lat': float(parent['lat']), 'lon': float(parent['lon'])}, zoom + 1
+        self.map_viz.add_facility_clusters(map_fig, clusters, center, zoom if center else None)
+    
+    @st.fragment
+    def _render_rankings(self, data: gpd.GeoDataFrame, selected_year: int, selected_month: int, selected_metric: str):
+        """Top/bottom N bar chart read from the precomputed rank table"""
+        key_prefix = "district" if self.dashboard_type == "Districts" else "sector"
+        with self.track_section('rankings'):
+            position_col, n_col = st.columns(2)
+            with position_col:
+                position = st.radio("Ranking", ["Top", "Bottom"], horizontal=True, key=f"{key_prefix}_ranking_position",
+                                    label_visibility="collapsed")
+            with n_col:
+                top_n = st.select_slider("N", options=[5, 10, 15, 20], value=10, key=f"{key_prefix}_ranking_n",
+                                         label_visibility="collapsed")
+            bottom = position == "Bottom"
+            top_entities_fig = self._take_figure(
+                ('top_entities', selected_year, selected_month, selected_metric, top_n, bottom),
+                partial(self.chart_viz.create_top_entities_chart, data, selected_year, selected_month, selected_metric, top_n, bottom)
+            )
             st.plotly_chart(top_entities_fig, use_container_width=True)
     
+    @st.fragment
+    def render_export_controls(self, data: gpd.GeoDataFrame, selected_year: int, selected_month: int, selected_metric: str,
+                               period_range: Optional[tuple] = None):
+        """Download the rows behind the current view or the full history - the file is built only when clicked"""
+        key_prefix = "district" if self.dashboard_type == "Districts" else "sector"
+        exporter = ViewExporter(self.dashboard_type, self.metrics_calculator, self.map_viz.loader)
+        with self.track_section('export'), st.expander("⬇️ Export Data", expanded=False):
+            view = period_range or ((selected_year, selected_month), (selected_year, selected_month))
+            scopes = {'view': f"Current view ({self._format_period_range(view)})", 'history': "Full history"}
+            scope_col, format_col, geometry_col = st.columns(3)
+            with scope_col:
+                scope = st.radio("Rows", list(scopes), format_func=scopes.get, key=f"{key_prefix}_export_scope")
+            with format_col:
+                file_format = st.selectbox("Format", list(exporter.get_formats()), key=f"{key_prefix}_export_format",
+                                           format_func=lambda f: exporter.FORMATS[f][0])
+            with geometry_col:
+                include_geometry = st.checkbox("Include boundaries (WKT)", value=False, key=f"{key_prefix}_export_geometry",
+                                               help="Adds each row's boundary - much larger files")
+            
+            start, end = view if scope == 'view' else (None, None)
+            span = "all" if start is None else f"{start[0]}-{start[1]:02d}_{end[0]}-{end[1]:02d}"
+            level = "districts" if self.dashboard_type == "Districts" else "sectors"
+            # download_button accepts no generator and reads the file into its media store once, so a click
+            # still holds one export in memory; it is encoded on disk first so nothing else is held beside it.
+            # /api/export streams the same file in blocks and is the flat-memory route for large histories.
+            st.download_button(
+                f"Download {exporter.FORMATS[file_format][0]}",
+                data=lambda: exporter.export_reader(file_format, exporter.iter_chunks(
+                    data, start, end, metrics=[selected_metric], include_geometry=include_geometry
+                )),
+                file_name=f"malaria_{level}_{span}.{file_format}", mime=exporter.FORMATS[file_format][1],
+                key=f"{key_prefix}_export_download", on_click="ignore"
+            )
+    
+    @st.fragment
+    def render_seasonality_grid(self, data: gpd.GeoDataFrame, selected_year: int, selected_metric: str):
+        """Render the selected year's 12 months side by side on demand"""
+        key_prefix = "district" if self.dashboard_type == "Districts" else "sector"
+        with self.track_section('seasonality_grid'), st.expander("🗓️ Month-by-Month Maps", expanded=False):
+            show_grid = st.checkbox(
+                f"Show all 12 months of {selected_year}", value=False, key=f"{key_prefix}_seasonality_toggle",
+                help="Compare seasonality across the year on one shared color scale"
+            )
+            if not show_grid:
+                return
+            grid_fig = self.map_viz.create_small_multiples_map(data, selected_year, selected_metric)
+            st.plotly_chart(grid_fig, use_container_width=True)
+    
+    @st.fragment
+    def render_hotspot_analysis(self, data: gpd.GeoDataFrame, selected_year: int, selected_month: int, selected_metric: str):
+        """Render LISA hotspot map and Moran's I evolution on demand"""
+        if self.spatial_stats is None:
+            return
+        
+        key_prefix = "district" if self.dashboard_type == "Districts" else "sector"
+        with self.track_section('hotspots'), st.expander("🔥 Spatial Hotspot Analysis (Moran's I / LISA)", expanded=False):
+            show_hotspots = st.checkbox(
+                "Compute hotspots for all periods", value=False, key=f"{key_prefix}_hotspot_toggle",
+                help="Classify hot and cold spots using local Moran's I over shared-border neighbours"
+            )
+            if not show_hotspots:
+                return
+            
+            global_stats = self.spatial_stats.compute_global_morans_i(data, selected_metric)
+            period_classes = self.spatial_stats.get_period_classes(data, selected_metric, selected_year, selected_month)
+            
+            map_col, chart_col = st.columns([6, 4])
+            with map_col:
+                hotspot_fig = self.map_viz.create_hotspot_map(data, period_classes, selected_year, selected_month, selected_metric)
+                st.plotly_chart(hotspot_fig, use_container_width=True)
+            with chart_col:
+                current = global_stats[(global_stats['year'] == selected_year) & (global_stats['month'] == selected_month)]
+                if not current.empty:
+                    st.metric("Global Moran's I", f"{current['morans_i'].iloc[0]:.3f}",
+                              help=f"p-value {current['p_value'].iloc[0]:.3f} from {self.spatial_stats.permutations} permutations")
+                morans_fig = self.chart_viz.create_morans_i_chart(global_stats, selected_metric, selected_year, selected_month)
+                if morans_fig:
+                    st.plotly_chart(morans_fig, use_container_width=True)
+    
     def render_detailed_analysis(self, data: gpd.GeoDataFrame, selected_metric: str, selected_year: int, selected_month: int):
         """Render detailed analysis section with dedicated trend filter"""
         col_left, col_right = st.columns([1, 1])
@@ -420,8 +780,14 @@ class DashboardUI:
         with col_right:
             self._render_priority_analysis(data, selected_year, selected_month)
     
+    @st.fragment
     def _render_trends_section_with_filter(self, data: gpd.GeoDataFrame, selected_metric: str):
-        """Render trends section with its own dedicated filter"""
+        """Render trends section with its own dedicated filter - a filter change reruns only this section"""
+        with self.track_section('trends'):
+            self._render_trends(data, selected_metric)
+    
+    def _render_trends(self, data: gpd.GeoDataFrame, selected_metric: str):
+        """Trend filter and chart"""
         entity_type = "Districts" if self.dashboard_type == "Districts" else "Sectors"
         
         # Create dedicated trend filter container
@@ -431,26 +797,38 @@ class DashboardUI:
         </div>
         """, unsafe_allow_html=True)
         
-        # Get entity options for trend filter
-        if self.dashboard_type == "Sectors" and 'sector_display' in data.columns:
-            entity_options = sorted(data['sector_display'].unique())
-        else:
-            entity_col = 'District' if self.dashboard_type == "Districts" else 'Sector'
-            entity_options = sorted(data[entity_col].unique())
+        # Get entity id options for trend filter, ordered by display label
+        registry = get_registry()
+        id_col = self.metrics_calculator.get_id_column()
+        entity_ids = data[id_col].unique()
+        entity_options = entity_ids[np.argsort(registry.labels(id_col, entity_ids).astype(str))].tolist()
         
         # Dedicated trend filter (separate from main controls)
         trend_entities = st.multiselect(
             f"Select {entity_type} for Trend Analysis",
             entity_options,
             default=[],
+            format_func=lambda entity_id: registry.label(id_col, entity_id),
             key=f"trend_filter_{self.dashboard_type.lower()}",
             max_selections=8,
             help=f"Choose {entity_type.lower()} to compare their trends over time (separate from main dashboard filters)"
         )
         
+        # Optional next-quarter projection, fitted for every entity once per dataset version
+        show_forecast = False
+        if self.forecaster is not None and self.forecaster.supports(selected_metric):
+            show_forecast = st.checkbox(
+                f"📈 Show {self.forecaster.horizon}-month forecast", value=False,
+                key=f"trend_forecast_{self.dashboard_type.lower()}",
+                help="Seasonal Holt-Winters projection of cases, drawn as a dashed extension of each line"
+            )
+        
         # Render trend chart
         if trend_entities:
-            trend_fig = self.chart_viz.create_trend_chart(data, trend_entities, selected_metric)
+            trend_fig = self._take_figure(
+                ('trend', tuple(trend_entities), selected_metric, show_forecast),
+                partial(self._build_trend_figure, data, trend_entities, selected_metric, show_forecast)
+            )
             if trend_fig:
                 st.plotly_chart(trend_fig, use_container_width=True)
         else:
@@ -458,28 +836,72 @@ class DashboardUI:
     
     # === PRIVATE HELPER METHODS ===
     
-    def _calculate_overview_metrics(self, data) -> dict:
-        """Calculate overview metrics for current dashboard type - REMOVED avg_population"""
+    def get_overview_cards(self, data, selected_year: int, selected_month: int, selected_metric: str) -> Tuple[str, str, str]:
+        """Status, improvements and concerns HTML of a period - built for all periods at once per dataset version"""
+        dataset_version = self.metrics_calculator.dataset_version
+        if dataset_version is None:
+            cards = self._build_overview_cards(data, selected_metric)
+        else:
+            cards = self._cached_overview_cards(data, self.dashboard_type, dataset_version, selected_metric)
+        return cards[(selected_year, selected_month)]
+    
+    @st.cache_resource(max_entries=32)  # every metric of both levels, current and previous version
+    def _cached_overview_cards(_self, _data, dashboard_type: str, dataset_version: str, selected_metric: str) -> Dict[Tuple[int, int], Tuple[str, str, str]]:
+        """Cached per (level, dataset version, metric)"""
+        return _self._build_overview_cards(_data, selected_metric)
+    
+    def _build_overview_cards(self, data, selected_metric: str) -> Dict[Tuple[int, int], Tuple[str, str, str]]:
+        """Render the three overview sections of every period from one group-by and one entity x period table"""
+        overview = self._calculate_overview_metrics(data)
+        
+        # Entity x period sums; an entity missing from a period stays NaN and is left out of its comparisons
+        id_col = self.metrics_calculator.get_id_column()
+        values = data.groupby([id_col, 'year', 'month'])[selected_metric].sum().unstack(['year', 'month'])
+        entities = get_registry().labels(id_col, values.index.values)
+        
+        cards = {}
+        for period in values.columns:
+            year, month = period
+            previous_period = (year - 1, 12) if month == 1 else (year, month - 1)
+            status = self._build_status_content(overview.get(period, {}), overview.get(previous_period, {}))
+            
+            if previous_period in values.columns:
+                comparison = pd.DataFrame({
+                    'entity': entities,
+                    'absolute_change': values[period].values - values[previous_period].values
+                }).dropna()
+                comparison = comparison[comparison['absolute_change'] != 0]
+                improvements = self._build_performance_content(comparison.nsmallest(4, 'absolute_change'), 'improvements')
+                concerns = self._build_performance_content(comparison.nlargest(4, 'absolute_change'), 'concerns')
+            else:
+                improvements = concerns = self._build_performance_content(None, 'improvements')
+            
+            cards[(int(year), int(month))] = (
+                self._render_section_html('status', status),
+                self._render_section_html('improvements', improvements),
+                self._render_section_html('concerns', concerns)
+            )
+        return cards
+    
+    def _calculate_overview_metrics(self, data) -> Dict[Tuple[int, int], dict]:
+        """Calculate overview metrics of every period for current dashboard type - REMOVED avg_population"""
         if data is None or data.empty:
             return {}
         
         if self.dashboard_type == "Districts":
-            total_cases = data['all cases'].sum()
-            total_population = data['Population'].sum()
-            incidence = (total_cases / total_population * 1000) if total_population > 0 else 0
-            severe_cases = data['Severe cases/Deaths'].sum()
+            totals = data.groupby(['year', 'month'])[['all cases', 'Population', 'Severe cases/Deaths']].sum()
+            incidence = (totals['all cases'] / totals['Population'] * 1000).where(totals['Population'] > 0, 0)
             # REMOVED avg_population calculation
-            return {
-                'total_cases': total_cases, 
-                'incidence': incidence, 
-                'severe_cases': severe_cases
-                # REMOVED 'avg_population': avg_population
-            }
+            overview = pd.DataFrame({
+                'total_cases': totals['all cases'],
+                'incidence': incidence,
+                'severe_cases': totals['Severe cases/Deaths']
+            })
         else:
-            simple_cases = data['Simple malaria cases'].sum()
-            total_population = data['Population'].sum()
-            incidence = (simple_cases / total_population * 1000) if total_population > 0 else 0
-            return {'simple_cases': simple_cases, 'incidence': incidence}
+            totals = data.groupby(['year', 'month'])[['Simple malaria cases', 'Population']].sum()
+            incidence = (totals['Simple malaria cases'] / totals['Population'] * 1000).where(totals['Population'] > 0, 0)
+            overview = pd.DataFrame({'simple_cases': totals['Simple malaria cases'], 'incidence': incidence})
+        return overview.to_dict('index')
     
     def _calculate_delta(self, current_metrics: dict, previous_metrics: dict, key: str, fmt: str) -> str:
         """Calculate delta between current and previous metrics with color coding"""
@@ -517,19 +939,16 @@ class DashboardUI:
         else:
             return "#ffffff"  # White for no change
     
-    def _render_section_html(self, section_type: str, current_data, previous_data, selected_metric: str) -> str:
+    def _render_section_html(self, section_type: str, content: str) -> str:
         """Generate HTML for a section (for use with CSS Grid) - Updated titles for TOP 4"""
         colors = self.SECTION_COLORS[section_type]
         
         if section_type == 'status':
             header = "🔵 CURRENT STATUS"
-            content = self._build_status_content(current_data, previous_data)
         elif section_type == 'improvements':
             header = "🟢 TOP 4 MOST IMPROVED"  # Updated to TOP 4
-            content = self._build_performance_content(current_data, previous_data, selected_metric, 'improvements')
         else:  # concerns
             header = "🔴 TOP 4 CONCERNS"  # Updated to TOP 4
-            content = self._build_performance_content(current_data, previous_data, selected_metric, 'concerns')
         
         return self.SECTION_TEMPLATE.format(
             border_color=colors['border_color'], 
@@ -538,11 +957,8 @@ class DashboardUI:
             content=content
         )
     
-    def _build_status_content(self, current_data, previous_data) -> str:
+    def _build_status_content(self, current_metrics: dict, previous_metrics: dict) -> str:
         """Build content for status section with color-coded elements and consistent spacing - REMOVED avg_population"""
-        current_metrics = self._calculate_overview_metrics(current_data)
-        previous_metrics = self._calculate_overview_metrics(previous_data)
-        
         content = ""
         
         if self.dashboard_type == "Districts":
@@ -586,13 +1002,11 @@ class DashboardUI:
         
         return content
     
-    def _build_performance_content(self, current_data, previous_data, selected_metric: str, performance_type: str) -> str:
+    def _build_performance_content(self, performance_data: Optional[pd.DataFrame], performance_type: str) -> str:
         """Build content for performance sections with color-coded changes - TOP 4 instead of TOP 3"""
-        if previous_data is None or previous_data.empty or current_data.empty:
+        if performance_data is None:
             return '<div style="text-align: center; opacity: 0.7; color: white;">No comparison data</div>'
         
-        performance_data = self._get_performance_data(current_data, previous_data, selected_metric, performance_type)
-        
         if performance_data.empty:
             message = "No improvements vs last month" if performance_type == 'improvements' else "No concerns vs last month"
             return f'<div style="text-align: center; opacity: 0.7; color: white;">{message}</div>'
@@ -615,38 +1029,23 @@ class DashboardUI:
         
         return content
     
-    def _get_performance_data(self, current_data, previous_data, selected_metric: str, performance_type: str):
-        """Get performance data for improvements or concerns - returns TOP 4"""
-        entity_col = 'District' if self.dashboard_type == "Districts" else 'Sector'
-        
-        # Prepare data based on dashboard type
-        if self.dashboard_type == "Sectors" and 'sector_display' in current_data.columns:
-            current_summary = current_data.groupby('sector_display')[selected_metric].sum().reset_index()
-            previous_summary = previous_data.groupby('sector_display')[selected_metric].sum().reset_index()
-        else:
-            current_summary = current_data.groupby(entity_col)[selected_metric].sum().reset_index()
-            previous_summary = previous_data.groupby(entity_col)[selected_metric].sum().reset_index()
-        
-        current_summary.columns = ['entity', 'current_value']
-        previous_summary.columns = ['entity', 'previous_value']
-        
-        # Calculate changes
-        comparison = current_summary.merge(previous_summary, on='entity', how='inner')
-        comparison['absolute_change'] = comparison['current_value'] - comparison['previous_value']
-        comparison = comparison[comparison['absolute_change'] != 0]
-        
-        # Return top 4 based on performance type (changed from 3 to 4)
-        if performance_type == 'improvements':
-            return comparison.nsmallest(4, 'absolute_change')  # Changed from 3 to 4
-        else:
-            return comparison.nlargest(4, 'absolute_change')   # Changed from 3 to 4
+    def _build_trend_figure(self, data: gpd.GeoDataFrame, trend_entities: List[int], selected_metric: str, show_forecast: bool):
+        forecasts = None
+        if show_forecast and self.forecaster is not None and self.forecaster.supports(selected_metric):
+            forecasts = self.forecaster.forecast_metric(data, selected_metric)
+        return self.chart_viz.create_trend_chart(data, trend_entities, selected_metric, forecasts)
     
+    @st.fragment
     def _render_priority_analysis(self, data: gpd.GeoDataFrame, selected_year: int, selected_month: int):
         """Render priority analysis section without header"""
-        scatterplot_fig, threshold1, threshold2 = self.chart_viz.create_scatterplot(data, selected_year, selected_month)
-        if scatterplot_fig:
-            st.plotly_chart(scatterplot_fig, use_container_width=True)
-            self._render_interpretation_guide()
+        with self.track_section('priority_scatter'):
+            scatterplot_fig, threshold1, threshold2 = self._take_figure(
+                ('scatter', selected_year, selected_month),
+                partial(self.chart_viz.create_scatterplot, data, selected_year, selected_month)
+            )
+            if scatterplot_fig:
+                st.plotly_chart(scatterplot_fig, use_container_width=True)
+                self._render_interpretation_guide()
     
     def _render_interpretation_guide(self):
         """Render interpretation guide based on dashboard type"""
@@ -671,28 +1070,95 @@ class DashboardUI:
             | 🟩 Green | **Low Population & Low Cases** | Low-risk zones: periodic monitoring and minimal resource input |
             """)
 
+def create_loader(loader_class):
+    """Loader reading the SQLite export when DASHBOARD_SQLITE points at one, the Parquet store when
+    DASHBOARD_BACKEND is duckdb, otherwise the CSV and GeoJSON files"""
+    loader = loader_class()
+    sqlite_path = os.environ.get('DASHBOARD_SQLITE')
+    if sqlite_path:
+        loader.attach_source(get_sqlite_source(sqlite_path))
+    elif os.environ.get('DASHBOARD_BACKEND') == 'duckdb':
+        loader.attach_source(loader.get_query_backend())
+    return loader
+
+def warm_dataset(snapshot: DatasetSnapshot, loaders: dict):
+    """Build a new dataset version's indexes and aggregates before it is published"""
+    for dashboard_type, loader in loaders.items():
+        data, _ = snapshot.datasets[dashboard_type]
+        metrics_calculator = MetricsCalculator(dashboard_type, loader.get_dataset_version())
+        ui = DashboardUI(dashboard_type, metrics_calculator, None, None)
+        latest_year, latest_month = max(zip(data['year'], data['month']))
+        SpatialStatistics(loader).get_weights(data)
+        SeasonalForecaster(dashboard_type, metrics_calculator).get_forecasts(data)
+        metrics_calculator.get_range_index(data)
+        MapVisualizations(dashboard_type, metrics_calculator, loader)._get_feature_collection(data)
+        for metric in metrics_calculator.get_count_metrics():
+            metrics_calculator.get_rankings(data, metric)
+            metrics_calculator.get_color_scales(data, metric)
+            ui.get_overview_cards(data, int(latest_year), int(latest_month), metric)
+    HierarchyReconciler(loaders["Districts"], loaders["Sectors"]).get_province_data(
+        snapshot.datasets["Districts"][0], snapshot.datasets["Sectors"][0]
+    )
+
+def remove_stale_files(snapshot: DatasetSnapshot, previous: Optional[DatasetSnapshot]):
+    """Delete static map geometry of versions before the previous one - open pages may still fetch that one"""
+    keep = [(dashboard_type, versions[0]) for published in (snapshot, previous) if published is not None
+            for dashboard_type, versions in published.versions.items()]
+    MapVisualizations.remove_stale_geometry(keep)
+
+@st.cache_resource
+def get_figure_pool() -> Optional[ThreadPoolExecutor]:
+    """Worker threads shared by all sessions for building figures - one per spare CPU, at most 2
+    
+    Figure building is mostly Python holding the GIL, so the pool only overlaps it with rendering. On one CPU a
+    warm rerun took 221 ms inline against 259 ms with 1 worker and 264 ms with 2, so single-CPU hosts build
+    inline (0). DASHBOARD_FIGURE_WORKERS overrides the count.
+    """
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+    workers = int(os.environ.get('DASHBOARD_FIGURE_WORKERS', min(2, cpus - 1)))
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='figure') if workers > 0 else None
+
+@st.cache_resource(show_spinner="Loading district and sector data...")
+def get_source_watcher() -> SourceWatcher:
+    """Load both levels once and keep them current in the background - shared by all sessions
+
+    DASHBOARD_WATCH_INTERVAL sets the polling interval in seconds (0 turns watching off).
+    """
+    interval = float(os.environ.get('DASHBOARD_WATCH_INTERVAL', '30'))
+    return SourceWatcher({"Districts": partial(create_loader, MalariaDataLoader),
+                          "Sectors": partial(create_loader, SectorDataLoader)},
+                         warm=warm_dataset, interval=interval, on_publish=remove_stale_files).start()
+
 class MainDashboard:
     """Main dashboard orchestrator"""
     
     def __init__(self):
         self.config = DashboardConfig()
-        self.district_loader = MalariaDataLoader()
-        self.sector_loader = SectorDataLoader()
+        self.district_loader = create_loader(MalariaDataLoader)
+        self.sector_loader = create_loader(SectorDataLoader)
+        self.reconciler = HierarchyReconciler(self.district_loader, self.sector_loader)
         self.current_dashboard_type = "Districts"
         self.current_data = None
         self.current_entity_options = None
+        self.loaded_data = {}
+        self.snapshot = None
         
     def initialize(self):
         """Initialize the dashboard"""
         self.config.setup_page()
         self.config.apply_custom_css()
     
+    def get_snapshot(self) -> DatasetSnapshot:
+        """The published dataset of this run, with the loaders pinned to its versions for every cache key"""
+        if self.snapshot is None:
+            self.snapshot = get_source_watcher().snapshot
+            self.district_loader.pin_sources(self.snapshot.versions["Districts"])
+            self.sector_loader.pin_sources(self.snapshot.versions["Sectors"])
+        return self.snapshot
+    
     def load_data(self, dashboard_type: str):
-        """Load data based on dashboard type"""
-        if dashboard_type == "Districts":
-            data, entity_options = self.district_loader.load_data()
-        else:
-            data, entity_options = self.sector_loader.load_data()
+        """Load data based on dashboard type - both levels are loaded together on first use"""
+        data, entity_options = self.get_snapshot().datasets[dashboard_type]
         
         if data is None:
             st.error("Failed to load data. Please check your data files.")
@@ -702,15 +1168,14 @@ class MainDashboard:
     
     def setup_components(self, dashboard_type: str, data: gpd.GeoDataFrame):
         """Setup dashboard components"""
-        metrics_calculator = MetricsCalculator(dashboard_type)
+        loader = self.district_loader if dashboard_type == "Districts" else self.sector_loader
+        metrics_calculator = MetricsCalculator(dashboard_type, loader.get_dataset_version())
         
-        # Debug: Print dashboard type to verify
-        print(f"Setting up components for: {dashboard_type}")
-        print(f"Available metrics: {metrics_calculator.get_available_metrics()}")
-        
-        map_viz = MapVisualizations(dashboard_type, metrics_calculator)
+        map_viz = MapVisualizations(dashboard_type, metrics_calculator, loader)
         chart_viz = ChartVisualizations(dashboard_type, metrics_calculator)
-        ui = DashboardUI(dashboard_type, metrics_calculator, map_viz, chart_viz)
+        spatial_stats = SpatialStatistics(loader)
+        forecaster = SeasonalForecaster(dashboard_type, metrics_calculator)
+        ui = DashboardUI(dashboard_type, metrics_calculator, map_viz, chart_viz, spatial_stats, forecaster)
         
         return metrics_calculator, map_viz, chart_viz, ui, data
     
@@ -718,19 +1183,71 @@ class MainDashboard:
         """Main dashboard execution"""
         self.initialize()
         
-        # Create tabs for Districts and Sectors
-        tab1, tab2 = st.tabs(["🏘️ Districts", "🏭 Sectors"])
+        # Create tabs for Districts, Sectors and the derived Provinces view
+        tab1, tab2, tab3 = st.tabs(["🏘️ Districts", "🏭 Sectors", "🗺️ Provinces"])
         
         with tab1:
             self._run_dashboard_tab("Districts")
         
         with tab2:
             self._run_dashboard_tab("Sectors")
+        
+        with tab3:
+            self._run_province_tab()
+    
+    def _run_province_tab(self):
+        """Run province tab rolled up from the already loaded district and sector data"""
+        district_data = self.loaded_data.get("Districts")
+        sector_data = self.loaded_data.get("Sectors")
+        if district_data is None or sector_data is None:
+            st.warning("Province view needs both district and sector data.")
+            return
+        
+        st.title("🏥 Rwanda Malaria Provinces Dashboard")
+        st.markdown("*Province totals rolled up from sectors and districts, with cross-level reconciliation*")
+        
+        province_data = self.reconciler.get_province_data(district_data, sector_data)
+        chart_viz = ChartVisualizations("Provinces", None)
+        metric_options = {
+            '📊 All Cases': 'all cases',
+            '📈 All Cases Incidence': 'all cases incidence',
+            '🦟 Simple Malaria Cases (from sectors)': 'Simple malaria cases',
+            '⚠️ Severe Cases & Deaths': 'Severe cases/Deaths'
+        }
+        metric_display = st.selectbox("Choose Metric", list(metric_options.keys()), key="province_metric_selector")
+        metric = metric_options[metric_display]
+        
+        # Follow the period chosen on the other tabs
+        year = st.session_state.get('district_year', int(province_data['year'].max()))
+        month = st.session_state.get('district_month', 12)
+        
+        trend_col, bar_col = st.columns([6, 4])
+        with trend_col:
+            trend_fig = chart_viz.create_province_trend_chart(province_data, metric, metric_display[2:])
+            if trend_fig:
+                st.plotly_chart(trend_fig, use_container_width=True)
+        with bar_col:
+            bar_fig = chart_viz.create_province_bar_chart(province_data, year, month, metric, metric_display[2:])
+            if bar_fig:
+                st.plotly_chart(bar_fig, use_container_width=True)
+            else:
+                st.info(f"No province data for {year}-{month:02d}")
+        
+        report = self.reconciler.get_reconciliation_report(district_data, sector_data)
+        with st.expander(f"🔍 Sector ↔ District Reconciliation ({len(report):,} mismatched district-months)", expanded=False):
+            if report.empty:
+                st.success("Sector roll-ups agree with the district file for every month.")
+            else:
+                st.dataframe(report, use_container_width=True, hide_index=True)
+                st.download_button("⬇️ Download report (CSV)", report.to_csv(index=False),
+                                   file_name="reconciliation_report.csv", mime="text/csv")
     
     def _run_dashboard_tab(self, dashboard_type: str):
         """Run dashboard for specific tab with main area controls"""
+        started = time.perf_counter()
         # Load data
         data, entity_options = self.load_data(dashboard_type)
+        self.loaded_data[dashboard_type] = data
         
         # Setup components
         metrics_calculator, map_viz, chart_viz, ui, data = self.setup_components(dashboard_type, data)
@@ -738,41 +1255,54 @@ class MainDashboard:
         # Render header
         ui.render_header()
         
-        # Render controls in MAIN AREA instead of sidebar (entity selection removed)
-        selected_year, selected_month, selected_metric = ui.render_controls_in_main_area(data, entity_options)
-        
-        # Filter data by year and month for maps and top charts
-        filtered_data = data[(data['year'] == selected_year) & (data['month'] == selected_month)]
-        
-        # Get previous month data for comparison
-        if selected_month == 1:
-            # If January, compare with December of previous year
-            prev_month = 12
-            prev_year = selected_year - 1
-        else:
-            # Otherwise, compare with previous month of same year
-            prev_month = selected_month - 1
-            prev_year = selected_year
+        # Controls and overview run with the whole script: every section below depends on the selection.
+        # The sections after them are fragments, so their own widgets rerun only that section.
+        with ui.track_section('controls_overview'):
+            # Render controls in MAIN AREA instead of sidebar (entity selection removed)
+            selected_year, selected_month, selected_metric, period_range = ui.render_controls_in_main_area(data, entity_options)
+            data = metrics_calculator.ensure_metric(data, selected_metric)
+            
+            # Filter data by year and month for maps and top charts
+            filtered_data = data[(data['year'] == selected_year) & (data['month'] == selected_month)]
+            
+            # Debug: Check if filtered data is empty
+            if filtered_data.empty:
+                st.warning(f"No data found for {selected_year}-{selected_month:02d}. Please select a different time period.")
+                return
+            
+            # Figures below are built concurrently while the overview renders, then shown in order
+            ui.prefetch_figures(data, selected_year, selected_month, selected_metric, period_range)
+            
+            # Range mode: totals, map and ranking over the range replace the single-month rows
+            if period_range is not None:
+                ui.render_range_overview(data, period_range, selected_metric)
+            else:
+                # First Row: Color-coded overview with all key information, compared with the previous month
+                ui.render_color_coded_overview(data, selected_year, selected_month, selected_metric)
         
-        previous_data = data[(data['year'] == prev_year) & (data['month'] == prev_month)]
+        # Second Row: Map and top entities (using filtered data) - Map maximized
+        if period_range is None:
+            ui.render_map_and_top_entities(filtered_data, selected_year, selected_month, selected_metric, all_data=data)
         
-        # Debug: Check if filtered data is empty
-        if filtered_data.empty:
-            st.warning(f"No data found for {selected_year}-{selected_month:02d}. Please select a different time period.")
-            return
+        # Rows behind the view, or the full history, as a file
+        ui.render_export_controls(data, selected_year, selected_month, selected_metric, period_range)
         
-        # First Row: Color-coded overview with all key information
-        ui.render_color_coded_overview(filtered_data, previous_data, selected_year, selected_month, selected_metric)
+        # Optional month-by-month grid of the selected year
+        ui.render_seasonality_grid(data, selected_year, selected_metric)
         
-        # Second Row: Map and top entities (using filtered data) - Map maximized
-        ui.render_map_and_top_entities(filtered_data, selected_year, selected_month, selected_metric)
+        # Optional hotspot row computed over all periods
+        ui.render_hotspot_analysis(data, selected_year, selected_month, selected_metric)
         
         # Third Row: Detailed analysis (using all data for trends, current month for scatterplot)
         ui.render_detailed_analysis(data, selected_metric, selected_year, selected_month)
+        
+        ui.report_figure_timings(started)
 
 # Main execution
 def main():
     """Main function to run the dashboard"""
+    # Start loading before any page element renders - importing this module alone loads nothing
+    get_source_watcher()
     dashboard = MainDashboard()
     dashboard.run()
 
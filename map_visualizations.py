@@ -1,14 +1,19 @@
-import plotly.express as px
+from __future__ import annotations
+
+import os
 import streamlit as st
-from typing import Dict, Any
-import geopandas as gpd
+from typing import TYPE_CHECKING, Dict, Any, Iterable, Optional, Tuple
+
+if TYPE_CHECKING:
+    import geopandas as gpd
 
 class MapVisualizations:
     """Handle choropleth map visualizations for both districts and sectors"""
     
-    def __init__(self, dashboard_type: str, metrics_calculator):
+    def __init__(self, dashboard_type: str, metrics_calculator, loader=None):
         self.dashboard_type = dashboard_type
         self.metrics_calculator = metrics_calculator
+        self.loader = loader
         
         # Pink to purple color scale
         self.pink_purple_scale = [
@@ -19,13 +24,29 @@ class MapVisualizations:
             [0.8, '#7b1fa2'],    # Light purple
             [1.0, '#4a148c']     # Deep purple
         ]
+        
+        # LISA cluster colors - hot spots in the scheme's deep pink, cold spots in blue
+        self.hotspot_colors = {
+            'High-High (Hotspot)': '#e91e63',
+            'Low-Low (Coldspot)': '#3b82f6',
+            'Low-High (Outlier)': '#93c5fd',
+            'High-Low (Outlier)': '#f8bbd9',
+            'Not Significant': '#3a3a3a'
+        }
     
-    def create_choropleth_map(self, data: gpd.GeoDataFrame, year: int, month: int, metric: str) -> Any:
-        """Create choropleth map using Plotly with pink-purple color scheme"""
+    def create_choropleth_map(self, data: gpd.GeoDataFrame, year: int, month: int, metric: str,
+                              color_mode: str = 'continuous') -> Any:
+        """Create choropleth map using Plotly with pink-purple color scheme, continuous or in precomputed classes"""
+        import plotly.express as px
         filtered_data = data[(data['year'] == year) & (data['month'] == month)].copy()
         
-        # Get global range for consistent coloring across all time periods
-        vmin, vmax = self.metrics_calculator.get_color_scale_range(data, metric)
+        # Get global range and class breaks for consistent coloring across all time periods
+        color_scales = self.metrics_calculator.get_color_scales(data, metric)
+        vmin, vmax = color_scales['range']
+        edges = color_scales.get(color_mode)
+        # A constant metric collapses to a single edge - nothing to class, so it stays continuous
+        if color_mode in self.metrics_calculator.CLASS_SCHEMES and len(edges) >= 2:
+            return self._create_classed_choropleth_map(data, filtered_data, year, month, metric, edges)
         
         # Get titles and labels based on dashboard type and metric
         title, colorbar_title = self._get_map_titles(year, month, metric)
@@ -43,11 +64,11 @@ class MapVisualizations:
             else:
                 display_col = 'Sector' if 'Sector' in filtered_data.columns else 'District'
         
-        # Create the map
+        # Create the map over the shared, decoded boundaries keyed by entity id
         fig = px.choropleth_mapbox(
             filtered_data,
-            geojson=filtered_data.geometry.__geo_interface__,
-            locations=filtered_data.index,
+            geojson=self._get_feature_collection(data),
+            locations=filtered_data[self.metrics_calculator.get_id_column()].astype(str),
             color=metric,
             hover_name=display_col,
             hover_data=hover_data,
@@ -78,6 +99,376 @@ class MapVisualizations:
         
         return fig
     
+    def _create_classed_choropleth_map(self, data: gpd.GeoDataFrame, filtered_data: gpd.GeoDataFrame, year: int, month: int, metric: str,
+                                       edges) -> Any:
+        """Choropleth with one flat color per class, using class edges computed once over all periods"""
+        import numpy as np
+        import plotly.express as px
+        from plotly.colors import sample_colorscale
+        
+        n_classes = max(len(edges) - 1, 1)
+        filtered_data['color_class'] = np.clip(
+            np.searchsorted(edges, filtered_data[metric].to_numpy(dtype=float), side='right') - 1, 0, n_classes - 1
+        )
+        colors = sample_colorscale(self.pink_purple_scale, [i / max(n_classes - 1, 1) for i in range(n_classes)])
+        stepped_scale = [[bound, color] for i, color in enumerate(colors) for bound in (i / n_classes, (i + 1) / n_classes)]
+        class_labels = [f"{self._format_break(edges[i])} – {self._format_break(edges[i + 1])}" for i in range(n_classes)]
+        
+        title, colorbar_title = self._get_map_titles(year, month, metric)
+        display_col = self.metrics_calculator.get_display_column()
+        if display_col not in filtered_data.columns:
+            display_col = 'District' if self.dashboard_type == "Districts" else 'Sector'
+        hover_data = {metric: ':,.2f', **self._get_hover_data(), 'color_class': False}
+        
+        fig = px.choropleth_mapbox(
+            filtered_data,
+            geojson=self._get_feature_collection(data),
+            locations=filtered_data[self.metrics_calculator.get_id_column()].astype(str),
+            color='color_class',
+            hover_name=display_col,
+            hover_data=hover_data,
+            color_continuous_scale=stepped_scale,
+            range_color=[-0.5, n_classes - 0.5],
+            mapbox_style='carto-darkmatter',
+            zoom=6.8,
+            center={'lat': -1.9, 'lon': 29.9},
+            title=title,
+            labels=self._get_map_labels()
+        )
+        fig.update_layout(
+            plot_bgcolor='rgba(20,20,20,0.9)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font_color='white',
+            title_font_size=16,
+            height=520,
+            margin=dict(l=0, r=0, t=40, b=0),
+            title=dict(font=dict(color='white')),
+            coloraxis_colorbar=dict(
+                title_font_color='white', tickfont_color='white', title=dict(text=colorbar_title),
+                tickvals=list(range(n_classes)), ticktext=class_labels
+            )
+        )
+        return fig
+    
+    @staticmethod
+    def _format_break(value: float) -> str:
+        return f"{value:,.0f}" if abs(value) >= 100 else f"{value:,.1f}"
+    
+    def add_facility_clusters(self, fig: Any, clusters, center: dict = None, zoom: float = None) -> Any:
+        """Overlay health-facility cluster summaries as sized markers - one marker per cluster, not per facility"""
+        import numpy as np
+        import plotly.graph_objects as go
+        
+        if clusters is None or clusters.empty:
+            return fig
+        cases = clusters['cases'].to_numpy(dtype=float)
+        scale = np.sqrt(cases / cases.max()) if cases.max() > 0 else np.zeros_like(cases)
+        fig.add_trace(go.Scattermapbox(
+            lon=clusters['lon'], lat=clusters['lat'], mode='markers+text',
+            marker=dict(size=10 + 30 * scale, color='#22d3ee', opacity=0.75),
+            text=np.where(clusters['facilities'] > 1, clusters['facilities'].astype(str), ''),
+            textfont=dict(color='#0f172a', size=10),
+            customdata=np.column_stack([clusters['label'], clusters['facilities'], cases]),
+            hovertemplate='<b>%{customdata[0]}</b><br>Facilities: %{customdata[1]}<br>Cases: %{customdata[2]:,.0f}<extra></extra>',
+            name='Health facilities', showlegend=False
+        ))
+        if center is not None:
+            fig.update_layout(mapbox_center=center, mapbox_zoom=zoom)
+        return fig
+    
+    def create_animated_choropleth_map(self, data: gpd.GeoDataFrame, metric: str, year: int = None, month: int = None) -> Any:
+        """Create a month-scrubbing choropleth: geometry is sent once, each period ships only its values as a frame
+        
+        Returns None when no period has a value to show.
+        """
+        import plotly.graph_objects as go
+        
+        id_col = self.metrics_calculator.get_id_column()
+        display_col = self.metrics_calculator.get_display_column()
+        if display_col not in data.columns:
+            display_col = 'District' if self.dashboard_type == "Districts" else 'Sector'
+        
+        # One feature per entity, keyed by its id
+        entities = data.drop_duplicates(id_col)
+        entities = entities[entities.geometry.notna()].sort_values(id_col)
+        geojson = self._get_feature_collection(data)
+        locations = entities[id_col].astype(str).tolist()
+        
+        # Entity x period values in one pivot; each column becomes one lightweight frame
+        values = data.pivot_table(index=id_col, columns=['year', 'month'], values=metric, aggfunc='sum')
+        values = values.reindex(entities[id_col].values)
+        periods = list(values.columns)
+        if not periods:
+            return None
+        start = (year, month) if (year, month) in periods else periods[-1]
+        
+        vmin, vmax = self.metrics_calculator.get_color_scale_range(data, metric)
+        _, colorbar_title = self._get_map_titles(start[0], start[1], metric)
+        frame_names = [f"{y}-{m:02d}" for y, m in periods]
+        
+        fig = go.Figure(
+            data=[go.Choroplethmapbox(
+                geojson=geojson, locations=locations, z=values[start].values,
+                text=entities[display_col].values, zmin=vmin, zmax=vmax,
+                colorscale=self.pink_purple_scale, marker_line_width=0.5,
+                marker_line_color='rgba(255,255,255,0.3)',
+                hovertemplate='<b>%{text}</b><br>' + colorbar_title + ': %{z:,.2f}<extra></extra>',
+                colorbar=dict(title=dict(text=colorbar_title, font=dict(color='white')), tickfont=dict(color='white'))
+            )],
+            frames=[
+                go.Frame(
+                    name=name, data=[go.Choroplethmapbox(z=values[period].values)], traces=[0],
+                    layout=dict(title_text=self._get_map_titles(period[0], period[1], metric)[0])
+                )
+                for name, period in zip(frame_names, periods)
+            ]
+        )
+        
+        step_args = dict(mode='immediate', frame=dict(duration=0, redraw=True), transition=dict(duration=0))
+        fig.update_layout(
+            mapbox=dict(style='carto-darkmatter', zoom=6.8, center={'lat': -1.9, 'lon': 29.9}),
+            plot_bgcolor='rgba(20,20,20,0.9)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font_color='white',
+            title=dict(text=self._get_map_titles(start[0], start[1], metric)[0], font=dict(color='white', size=16)),
+            height=600,
+            margin=dict(l=0, r=0, t=40, b=0),
+            updatemenus=[dict(
+                type='buttons', direction='left', x=0.02, y=0.02, xanchor='left', yanchor='bottom',
+                bgcolor='#2b2b2b', font=dict(color='white'), showactive=False,
+                buttons=[
+                    dict(label='▶ Play', method='animate',
+                         args=[None, dict(mode='immediate', fromcurrent=True,
+                                          frame=dict(duration=600, redraw=True), transition=dict(duration=0))]),
+                    dict(label='⏸ Pause', method='animate', args=[[None], step_args])
+                ]
+            )],
+            sliders=[dict(
+                active=periods.index(start), x=0.2, len=0.78, y=0.02, yanchor='bottom',
+                currentvalue=dict(prefix='Period: ', font=dict(color='white')),
+                font=dict(color='white'), bgcolor='#444', activebgcolor='#e91e63',
+                steps=[dict(label=name, method='animate', args=[[name], step_args]) for name in frame_names]
+            )]
+        )
+        
+        return fig
+    
+    def create_small_multiples_map(self, data: gpd.GeoDataFrame, year: int, metric: str, columns: int = 4) -> Any:
+        """Create a grid of the year's 12 monthly choropleths on one color scale
+        
+        Plotly embeds an inline geojson in every trace, so with static serving on the boundaries go out once as a
+        URL the browser fetches a single time for all 12 subplots. Each subplot is still its own mapbox WebGL
+        context, which is why the grid stays behind an opt-in toggle.
+        """
+        import calendar
+        import numpy as np
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
+        
+        id_col = self.metrics_calculator.get_id_column()
+        display_col = self.metrics_calculator.get_display_column()
+        if display_col not in data.columns:
+            display_col = 'District' if self.dashboard_type == "Districts" else 'Sector'
+        entities = data.drop_duplicates(id_col)
+        entities = entities[entities.geometry.notna()].sort_values(id_col)
+        entity_ids, labels = entities[id_col].values, entities[display_col].values
+        geojson = self._get_geometry_url(data) or self._get_feature_collection(data)
+        locations = entity_ids.astype(str).tolist()
+        
+        # Entity x month values for the whole year in one vectorised slice
+        year_rows = data[data['year'] == year]
+        rows = np.searchsorted(entity_ids, year_rows[id_col].values)
+        valid = (rows < len(entity_ids)) & (entity_ids[np.minimum(rows, len(entity_ids) - 1)] == year_rows[id_col].values)
+        values = np.full((len(entity_ids), 12), np.nan)
+        values[rows[valid], year_rows['month'].values[valid] - 1] = year_rows[metric].values[valid]
+        
+        vmin, vmax = self.metrics_calculator.get_color_scale_range(data, metric)
+        _, colorbar_title = self._get_map_titles(year, 1, metric)
+        grid_rows = -(-12 // columns)
+        fig = make_subplots(
+            rows=grid_rows, cols=columns, specs=[[{'type': 'mapbox'}] * columns for _ in range(grid_rows)],
+            subplot_titles=list(calendar.month_abbr[1:]), horizontal_spacing=0.01, vertical_spacing=0.04
+        )
+        for month in range(1, 13):
+            fig.add_trace(
+                go.Choroplethmapbox(
+                    geojson=geojson, locations=locations, z=values[:, month - 1], text=labels,
+                    zmin=vmin, zmax=vmax, coloraxis='coloraxis', marker_line_width=0.2,
+                    marker_line_color='rgba(255,255,255,0.2)',
+                    hovertemplate=f'<b>%{{text}}</b><br>{calendar.month_abbr[month]} {year}: %{{z:,.2f}}<extra></extra>'
+                ),
+                row=(month - 1) // columns + 1, col=(month - 1) % columns + 1
+            )
+        
+        fig.update_mapboxes(style='carto-darkmatter', zoom=5.6, center={'lat': -1.95, 'lon': 29.9})
+        fig.update_annotations(font=dict(color='white', size=12))
+        fig.update_layout(
+            coloraxis=dict(colorscale=self.pink_purple_scale, cmin=vmin, cmax=vmax,
+                           colorbar=dict(title=dict(text=colorbar_title, font=dict(color='white')), tickfont=dict(color='white'))),
+            paper_bgcolor='rgba(0,0,0,0)',
+            font_color='white',
+            title=dict(text=f"{year} Month by Month", font=dict(color='white', size=16)),
+            height=260 * grid_rows,
+            margin=dict(l=0, r=0, t=60, b=0)
+        )
+        return fig
+    
+    def create_range_choropleth_map(self, data: gpd.GeoDataFrame, range_values, metric: str, period_label: str) -> Any:
+        """Choropleth of one value per entity over a range of months, colored over the range's own spread"""
+        import plotly.graph_objects as go
+        
+        id_col = self.metrics_calculator.get_id_column()
+        display_col = self.metrics_calculator.get_display_column()
+        entities = data.drop_duplicates(id_col)
+        entities = entities[entities.geometry.notna()].set_index(id_col)
+        range_values = range_values[range_values[id_col].isin(entities.index)]
+        
+        _, colorbar_title = self._get_map_titles(0, 1, metric)
+        label = self.metrics_calculator.get_metric_label(metric)
+        entity_label = 'District' if self.dashboard_type == "Districts" else 'Sector'
+        fig = go.Figure(go.Choroplethmapbox(
+            geojson=self._get_feature_collection(data), locations=range_values[id_col].astype(str).values,
+            z=range_values[metric].values, text=range_values[display_col].values,
+            customdata=range_values['months'].values, colorscale=self.pink_purple_scale,
+            marker_line_width=0.5, marker_line_color='rgba(255,255,255,0.3)',
+            colorbar=dict(title=dict(text=colorbar_title, font=dict(color='white')), tickfont=dict(color='white')),
+            hovertemplate=f'<b>%{{text}}</b><br>{label}: %{{z:,.2f}}<br>Months reported: %{{customdata}}<extra></extra>'
+        ))
+        fig.update_layout(
+            mapbox=dict(style='carto-darkmatter', zoom=6.8, center={'lat': -1.9, 'lon': 29.9}),
+            paper_bgcolor='rgba(0,0,0,0)',
+            font_color='white',
+            height=520,
+            margin=dict(l=0, r=0, t=40, b=0),
+            title=dict(text=f'{label} by {entity_label} ({period_label})', font=dict(color='white', size=16))
+        )
+        return fig
+    
+    def _get_feature_collection(self, data: gpd.GeoDataFrame) -> dict:
+        """Boundaries of every entity keyed by id, decoded from the shared-boundary topology once per dataset version"""
+        dataset_version = self.metrics_calculator.dataset_version
+        if dataset_version is None:
+            return self._build_feature_collection(data)
+        return self._cached_feature_collection(data, self.dashboard_type, dataset_version)
+    
+    @st.cache_resource(max_entries=4)  # both levels, current and previous version
+    def _cached_feature_collection(_self, _data, dashboard_type: str, dataset_version: str) -> dict:
+        """Cached per (level, dataset version)"""
+        return _self._build_feature_collection(_data)
+    
+    def _get_geometry_url(self, data: gpd.GeoDataFrame) -> Optional[str]:
+        """URL of the feature collection served as a static file, or None when it has to go inline
+        
+        Needs server.enableStaticServing and a known dataset version, which names the file.
+        """
+        dataset_version = self.metrics_calculator.dataset_version
+        if dataset_version is None or not st.get_option('server.enableStaticServing'):
+            return None
+        return self._cached_geometry_url(data, self.dashboard_type, dataset_version)
+    
+    @st.cache_resource(max_entries=4)  # both levels, current and previous version
+    def _cached_geometry_url(_self, _data, dashboard_type: str, dataset_version: str) -> Optional[str]:
+        """Write the collection once per (level, dataset version) into the app's static folder"""
+        import json
+        name = _self.get_geometry_file_name(dashboard_type, dataset_version)
+        static_dir = _self.get_static_dir()
+        path = os.path.join(static_dir, name)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(static_dir, exist_ok=True)
+            with open(temp_path, 'w') as f:
+                json.dump(_self._get_feature_collection(_data), f, separators=(',', ':'))
+            os.replace(temp_path, path)
+        except OSError as e:
+            # Read-only deployments keep sending the collection inline
+            print(f"Could not write {path} ({e}), map geometry stays inline")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return None
+        # Relative, so it resolves under any server.baseUrlPath
+        return f"app/static/{name}"
+    
+    @staticmethod
+    def get_static_dir() -> str:
+        """Streamlit serves ./static beside the main script, which lives in this directory"""
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    
+    @staticmethod
+    def get_geometry_file_name(dashboard_type: str, dataset_version: str) -> str:
+        import hashlib
+        return f"{dashboard_type.lower()}_{hashlib.sha1(dataset_version.encode()).hexdigest()[:16]}.geojson"
+    
+    @classmethod
+    def remove_stale_geometry(cls, keep: Iterable[Tuple[str, str]]):
+        """Delete static geometry files of every (level, dataset version) not in keep"""
+        keep_names = {cls.get_geometry_file_name(dashboard_type, version) for dashboard_type, version in keep}
+        static_dir = cls.get_static_dir()
+        try:
+            names = os.listdir(static_dir)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith('.geojson') and name.startswith(('districts_', 'sectors_')) and name not in keep_names:
+                try:
+                    os.remove(os.path.join(static_dir, name))
+                except OSError:
+                    pass
+    
+    def _build_feature_collection(self, data: gpd.GeoDataFrame) -> dict:
+        """From the loader's topology file when there is a loader, else encoded from the loaded frame"""
+        if self.loader is not None:
+            return self.loader.get_feature_collection()
+        from topology import decode_topology, encode_topology
+        id_col = self.metrics_calculator.get_id_column()
+        entities = data.drop_duplicates(id_col)
+        entities = entities[entities.geometry.notna()]
+        return decode_topology(encode_topology(list(entities.geometry.values), entities[id_col].astype(str).tolist()))
+    
+    def create_hotspot_map(self, data: gpd.GeoDataFrame, hotspot_classes, year: int, month: int, metric: str) -> Any:
+        """Create LISA hot/cold-spot map for the selected period"""
+        import plotly.express as px
+        filtered_data = data[(data['year'] == year) & (data['month'] == month)]
+        key_columns = [col for col in ['District', 'Sector'] if col in hotspot_classes.columns]
+        filtered_data = filtered_data.merge(
+            hotspot_classes[key_columns + ['lisa_class', 'p_value']], on=key_columns, how='left'
+        )
+        filtered_data['lisa_class'] = filtered_data['lisa_class'].astype(str).replace('nan', 'Not Significant')
+        
+        title, _ = self._get_map_titles(year, month, metric)
+        display_col = self.metrics_calculator.get_display_column()
+        if display_col not in filtered_data.columns:
+            display_col = 'District' if self.dashboard_type == "Districts" else 'Sector'
+        
+        fig = px.choropleth_mapbox(
+            filtered_data,
+            geojson=self._get_feature_collection(data),
+            locations=filtered_data[self.metrics_calculator.get_id_column()].astype(str),
+            color='lisa_class',
+            hover_name=display_col,
+            hover_data={metric: ':,.2f', 'p_value': ':.3f'},
+            color_discrete_map=self.hotspot_colors,
+            category_orders={'lisa_class': list(self.hotspot_colors.keys())},
+            mapbox_style='carto-darkmatter',
+            zoom=6.8,
+            center={'lat': -1.9, 'lon': 29.9},
+            title=f'Hotspots (Local Moran\'s I): {title}',
+            labels={'lisa_class': 'Cluster', 'p_value': 'p-value', **self._get_map_labels()}
+        )
+        
+        fig.update_layout(
+            plot_bgcolor='rgba(20,20,20,0.9)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font_color='white',
+            title_font_size=16,
+            height=520,
+            margin=dict(l=0, r=0, t=40, b=0),
+            title=dict(font=dict(color='white')),
+            legend=dict(font=dict(color='white'), bgcolor='rgba(30,30,30,0.9)')
+        )
+        fig.update_traces(marker_line_width=0.5, marker_line_color='rgba(255,255,255,0.3)')
+        
+        return fig
+    
     def _get_map_titles(self, year: int, month: int, metric: str) -> tuple:
         """Get appropriate titles based on dashboard type and metric"""
         month_names = {
@@ -99,7 +490,8 @@ class MapVisualizations:
             'all cases incidence': (f'All Cases Incidence by District ({month_name} {year})', 'All Cases Incidence'),
             'Severe cases/Deaths incidence': (f'Severe Cases & Deaths Incidence by District ({month_name} {year})', 'Severe Cases & Deaths Incidence')
         }
-        return title_map.get(metric, (f'District Analysis ({month_name} {year})', 'Value'))
+        label = self.metrics_calculator.get_metric_label(metric)
+        return title_map.get(metric, (f'{label} by District ({month_name} {year})', label))
     
     def _get_sector_titles(self, year: int, month_name: str, metric: str) -> tuple:
         """Get titles for sector maps"""
@@ -107,7 +499,8 @@ class MapVisualizations:
             'Simple malaria cases': (f'Simple Malaria Cases Distribution ({month_name} {year})', 'Simple Malaria Cases'),
             'incidence': (f'Simple Malaria Incidence ({month_name} {year})', 'Incidence')
         }
-        return title_map.get(metric, (f'Sector Analysis ({month_name} {year})', 'Value'))
+        label = self.metrics_calculator.get_metric_label(metric)
+        return title_map.get(metric, (f'{label} by Sector ({month_name} {year})', label))
     
     def _get_hover_data(self) -> Dict[str, Any]:
         """Get hover data configuration based on dashboard type"""
@@ -1,12 +1,41 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-from typing import Tuple, Optional
+from typing import Dict, Iterable, NamedTuple, Tuple, Optional
+
+from entity_registry import get_registry
+
+class DerivedMetric(NamedTuple):
+    """A metric defined as numerator / denominator * scale over base columns"""
+    label: str
+    numerator: str
+    denominator: str
+    scale: float = 1.0
 
 class MetricsCalculator:
     """Calculate key metrics for both district and sector dashboards"""
     
-    def __init__(self, dashboard_type: str):
+    # Derived metrics are computed on first use only when the source data does not already carry them
+    DERIVED_METRICS = {
+        'Districts': {
+            'all cases incidence': DerivedMetric('All Cases Incidence', 'all cases', 'Population', 1000),
+            'Severe cases/Deaths incidence': DerivedMetric('Severe Cases & Deaths Incidence', 'Severe cases/Deaths', 'Population', 1000),
+            'all cases per 10,000': DerivedMetric('All Cases per 10,000', 'all cases', 'Population', 10000),
+            'severe case ratio': DerivedMetric('Severe Case Ratio (%)', 'Severe cases/Deaths', 'all cases', 100)
+        },
+        'Sectors': {
+            'incidence': DerivedMetric('Incidence', 'Simple malaria cases', 'Population', 1000),
+            'incidence per 10,000': DerivedMetric('Simple Cases per 10,000', 'Simple malaria cases', 'Population', 10000)
+        }
+    }
+    
+    # Classed map color modes and the number of classes each one uses
+    CLASS_SCHEMES = {'quantile': 'Quantiles', 'jenks': 'Natural breaks', 'log': 'Log bins'}
+    COLOR_CLASSES = 5
+    
+    def __init__(self, dashboard_type: str, dataset_version: Optional[str] = None):
         self.dashboard_type = dashboard_type
+        self.dataset_version = dataset_version
         # Updated district metrics - removed "Severe cases/Deaths incidence"
         self.district_metrics = {
             '📊 All Cases': 'all cases',
@@ -18,15 +47,69 @@ class MetricsCalculator:
             '📊 Incidence': 'incidence'
         }
     
-    def get_available_metrics(self) -> dict:
-        """Get available metrics based on dashboard type"""
-        if self.dashboard_type == "Districts":
-            return self.district_metrics
-        elif self.dashboard_type == "Sectors":
-            return self.sector_metrics
+    def get_available_metrics(self, columns: Optional[Iterable[str]] = None) -> dict:
+        """Get available metrics based on dashboard type, plus derived metrics whose base columns exist"""
+        if self.dashboard_type == "Sectors":
+            metrics = dict(self.sector_metrics)
         else:
-            # Fallback
-            return self.district_metrics
+            metrics = dict(self.district_metrics)
+        
+        # Derived metrics that mirror a source column only backfill it when missing - they are not new options
+        available = set(self.get_value_columns() if columns is None else columns)
+        for name, definition in self.get_derived_metrics().items():
+            if name in metrics.values() or name in self.get_value_columns():
+                continue
+            if {definition.numerator, definition.denominator} <= available:
+                metrics[f"🧮 {definition.label}"] = name
+        return metrics
+    
+    def get_derived_metrics(self) -> Dict[str, DerivedMetric]:
+        """Derived metric definitions for this level"""
+        return self.DERIVED_METRICS.get(self.dashboard_type, self.DERIVED_METRICS['Districts'])
+    
+    def get_metric_columns(self, metric: str) -> list:
+        """Stored columns a metric is computed and aggregated from - what a view has to read for it"""
+        definition = self.get_derived_metrics().get(metric)
+        columns = [metric] if definition is None else [metric, definition.numerator, definition.denominator]
+        return list(dict.fromkeys(columns + [self.get_count_metrics()[0], 'Population']))
+    
+    def get_metric_label(self, metric: str) -> str:
+        """Readable name of a metric column"""
+        definition = self.get_derived_metrics().get(metric)
+        return definition.label if definition else metric
+    
+    def ensure_metric(self, data: pd.DataFrame, metric: str) -> pd.DataFrame:
+        """The frame with a derived metric's column, computed on first use - the input frame is never modified
+        
+        A frame missing the column comes back as a shallow copy carrying it, so the shared per-version frame
+        stays as loaded and metrics nobody selects are never computed.
+        """
+        definition = self.get_derived_metrics().get(metric)
+        if definition is None or metric in data.columns:
+            return data
+        view = data.copy(deep=False)
+        view[metric] = self.get_derived_values(data, metric)
+        return view
+    
+    def get_derived_values(self, data: pd.DataFrame, metric: str) -> np.ndarray:
+        """Values of a derived metric - computed once per dataset version when it is known"""
+        if self.dataset_version is None:
+            return self._derive(data, self.get_derived_metrics()[metric])
+        return self._cached_derived_values(data, self.dashboard_type, self.dataset_version, metric)
+    
+    @st.cache_resource(max_entries=32)  # every metric of both levels, current and previous version
+    def _cached_derived_values(_self, _data, dashboard_type: str, dataset_version: str, metric: str) -> np.ndarray:
+        """Cached per (level, dataset version, metric); read-only, since every session shares it"""
+        values = _self._derive(_data, _self.get_derived_metrics()[metric])
+        values.setflags(write=False)
+        return values
+    
+    @staticmethod
+    def _derive(data: pd.DataFrame, definition: DerivedMetric) -> np.ndarray:
+        numerator = data[definition.numerator].to_numpy(dtype=float)
+        denominator = data[definition.denominator].to_numpy(dtype=float)
+        return np.divide(numerator * definition.scale, denominator,
+                         out=np.zeros_like(numerator), where=denominator > 0)
     
     @st.cache_data
     def calculate_metrics(_self, _data, selected_year: int, selected_metric: str, 
@@ -101,10 +184,256 @@ class MetricsCalculator:
         
         return total_cases, overall_incidence, change_percent
     
-    @st.cache_data
-    def get_color_scale_range(_self, _data, metric: str) -> Tuple[float, float]:
-        """Get the global min and max for consistent color scaling across years - cached"""
-        return _data[metric].min(), _data[metric].max()
+    def get_count_metrics(self) -> list:
+        """Metrics that are totalled by summing; the rest are rates averaged over entities"""
+        if self.dashboard_type == "Districts":
+            return ['all cases', 'Severe cases/Deaths']
+        else:
+            return ['Simple malaria cases']
+    
+    def get_value_columns(self) -> list:
+        """Numeric columns reported per entity and period"""
+        if self.dashboard_type == "Districts":
+            return ['all cases', 'Severe cases/Deaths', 'all cases incidence', 'Severe cases/Deaths incidence', 'Population']
+        else:
+            return ['Simple malaria cases', 'incidence', 'Population']
+    
+    def aggregate_metric(self, data: pd.DataFrame, metric: str, group_columns: list) -> pd.DataFrame:
+        """Aggregate a metric over groups the same way calculate_metrics builds dashboard totals"""
+        count_metrics = self.get_count_metrics()
+        cases_column = metric if metric in count_metrics else count_metrics[0]
+        how = 'sum' if metric in count_metrics else 'mean'
+        
+        grouped = data.groupby(group_columns, sort=True) if group_columns else data.groupby(lambda _: 'total')
+        result = grouped.agg(value=(metric, how), cases=(cases_column, 'sum'), population=('Population', 'sum'))
+        # Overall incidence: (total cases / total population) * 1000
+        result['incidence'] = (result['cases'] / result['population'].where(result['population'] > 0) * 1000).fillna(0)
+        return result.reset_index(drop=not group_columns)
+    
+    def get_range_index(self, data: pd.DataFrame) -> Dict[str, object]:
+        """Entity x month prefix sums of every stored value column - built once per dataset version when it is known"""
+        if self.dataset_version is None:
+            return self._prefix_sums(data)
+        return self._build_range_index(data, self.dashboard_type, self.dataset_version)
+    
+    @st.cache_resource(max_entries=4)  # both levels, current and previous version
+    def _build_range_index(_self, _data, dashboard_type: str, dataset_version: str) -> Dict[str, object]:
+        """Cached per (level, dataset version)"""
+        return _self._prefix_sums(_data)
+    
+    def _prefix_sums(self, data: pd.DataFrame) -> Dict[str, object]:
+        """Cumulative sums along consecutive months, with a leading zero column so any range is two reads"""
+        id_col = self.get_id_column()
+        derived = self.get_derived_metrics()
+        columns = [col for col in dict.fromkeys(
+            self.get_value_columns() + [d.numerator for d in derived.values()] + [d.denominator for d in derived.values()]
+        ) if col in data.columns and col not in derived]
+        
+        ids = np.unique(data[id_col].values)
+        # Consecutive month axis from the first to the last period, so months with no rows still have a column
+        month_keys = data['year'].values.astype(int) * 12 + data['month'].values.astype(int) - 1
+        first = month_keys.min()
+        periods = [divmod(key, 12) for key in range(first, month_keys.max() + 1)]
+        periods = [(year, month + 1) for year, month in periods]
+        rows = np.searchsorted(ids, data[id_col].values)
+        cols = month_keys - first
+        
+        def prefix(values: np.ndarray) -> np.ndarray:
+            grid = np.zeros((len(ids), len(periods) + 1))
+            np.add.at(grid, (rows, cols + 1), values)
+            return np.cumsum(grid, axis=1)
+        
+        sums = {col: prefix(data[col].to_numpy(dtype=float)) for col in columns}
+        return {
+            'ids': ids,
+            'periods': periods,
+            'sums': sums,
+            # Months each entity reported, so stock columns like Population average over observed months only
+            'observed': prefix(np.ones(len(data)))
+        }
+    
+    def aggregate_range(self, data: pd.DataFrame, start: Tuple[int, int], end: Tuple[int, int],
+                        metrics: Iterable[str]) -> pd.DataFrame:
+        """Every entity's value of each metric over an inclusive (year, month) range, from two prefix-sum reads
+        
+        Count metrics are range totals, other stored columns are averages over the reported months, and derived
+        metrics divide the range's numerator by its denominator - so incidence is population-weighted.
+        """
+        index = self.get_range_index(data)
+        keys = [year * 12 + month for year, month in index['periods']]
+        s = np.searchsorted(keys, start[0] * 12 + start[1])
+        e = np.searchsorted(keys, end[0] * 12 + end[1], side='right')
+        months = index['observed'][:, e] - index['observed'][:, s]
+        count_metrics = self.get_count_metrics()
+        
+        def column_value(column: str) -> np.ndarray:
+            total = index['sums'][column][:, e] - index['sums'][column][:, s]
+            if column in count_metrics:
+                return total
+            return np.divide(total, months, out=np.zeros_like(total), where=months > 0)
+        
+        id_col = self.get_id_column()
+        result = pd.DataFrame({id_col: index['ids'], 'months': months.astype(int)})
+        derived = self.get_derived_metrics()
+        for metric in metrics:
+            definition = derived.get(metric)
+            if definition is not None and {definition.numerator, definition.denominator} <= set(index['sums']):
+                numerator, denominator = column_value(definition.numerator), column_value(definition.denominator)
+                result[metric] = np.divide(numerator * definition.scale, denominator,
+                                           out=np.zeros_like(numerator), where=denominator > 0)
+            elif metric in index['sums']:
+                result[metric] = column_value(metric)
+        
+        result = result[result['months'] > 0].reset_index(drop=True)
+        result[self.get_display_column()] = get_registry().labels(id_col, result[id_col].values)
+        return result
+    
+    def get_rankings(self, data: pd.DataFrame, metric: str) -> Dict[str, object]:
+        """Entity x period values and ranks of a metric - built once per dataset version when it is known"""
+        data = self.ensure_metric(data, metric)
+        if self.dataset_version is None:
+            return self._rank_cube(data, [metric])
+        return self._build_rankings(data, self.dashboard_type, self.dataset_version, metric)
+    
+    @st.cache_resource(max_entries=32)  # every metric of both levels, current and previous version
+    def _build_rankings(_self, _data, dashboard_type: str, dataset_version: str, metric: str) -> Dict[str, object]:
+        """Cached per (level, dataset version, metric)"""
+        return _self._rank_cube(_data, [metric])
+    
+    def _rank_cube(self, data: pd.DataFrame, metrics: list) -> Dict[str, object]:
+        """Rank every entity in every period with one sort per metric"""
+        id_col = self.get_id_column()
+        columns = [col for col in dict.fromkeys(metrics + self.get_value_columns()) if col in data.columns]
+        ids = np.sort(data[id_col].unique())
+        periods = pd.MultiIndex.from_frame(data[['year', 'month']].drop_duplicates().sort_values(['year', 'month']))
+        
+        pivot = data.pivot_table(index=id_col, columns=['year', 'month'], values=columns, aggfunc='sum')
+        values = {col: pivot[col].reindex(index=ids, columns=periods).to_numpy(dtype=float) for col in columns}
+        
+        order, ranks, counts = {}, {}, {}
+        positions = np.arange(1, len(ids) + 1)[:, None]
+        for metric in metrics:
+            matrix = values[metric]
+            missing = np.isnan(matrix)
+            # Descending along entities; entities without a value sort last and get rank 0
+            order[metric] = np.argsort(-np.where(missing, -np.inf, matrix), axis=0, kind='stable')
+            rank = np.empty(matrix.shape, dtype='int32')
+            np.put_along_axis(rank, order[metric], positions, axis=0)
+            rank[missing] = 0
+            ranks[metric] = rank
+            counts[metric] = (~missing).sum(axis=0)
+        
+        return {'ids': ids, 'periods': periods, 'values': values, 'order': order, 'ranks': ranks, 'counts': counts}
+    
+    def get_top_entities(self, data: pd.DataFrame, metric: str, year: int, month: int,
+                         top_n: int = 10, bottom: bool = False) -> pd.DataFrame:
+        """Top (or bottom) N entities of a period with their rank and rank change since the previous month"""
+        rankings = self.get_rankings(data, metric)
+        periods = rankings['periods']
+        column = periods.get_indexer([(year, month)])[0]
+        id_col = self.get_id_column()
+        if column < 0 or metric not in rankings['order']:
+            return pd.DataFrame(columns=[id_col, metric, 'rank', 'previous_rank', 'rank_change'])
+        
+        ranked = rankings['order'][metric][:rankings['counts'][metric][column], column]
+        picked = (ranked[::-1] if bottom else ranked)[:top_n]
+        
+        result = pd.DataFrame({id_col: rankings['ids'][picked]})
+        for col, matrix in rankings['values'].items():
+            result[col] = matrix[picked, column]
+        result['rank'] = rankings['ranks'][metric][picked, column]
+        
+        previous = (year - 1, 12) if month == 1 else (year, month - 1)
+        previous_column = periods.get_indexer([previous])[0]
+        if previous_column >= 0:
+            previous_rank = rankings['ranks'][metric][picked, previous_column].astype(float)
+            result['previous_rank'] = np.where(previous_rank > 0, previous_rank, np.nan)
+        else:
+            result['previous_rank'] = np.nan
+        # Positive = moved up the ranking (towards rank 1)
+        result['rank_change'] = result['previous_rank'] - result['rank']
+        
+        registry = get_registry()
+        if id_col == 'sector_id':
+            result['Sector'] = registry.sector_labels(result[id_col].values)
+            result['sector_display'] = registry.sector_display_labels(result[id_col].values)
+            result['District'] = registry.district_labels(
+                np.asarray(registry.sector_district, dtype='int32')[result[id_col].values]
+            )
+        else:
+            result['District'] = registry.district_labels(result[id_col].values)
+        return result
+    
+    def get_color_scale_range(self, data: pd.DataFrame, metric: str) -> Tuple[float, float]:
+        """Get the global min and max over all periods for consistent color scaling across years - cached"""
+        return self.get_color_scales(data, metric)['range']
+    
+    def get_color_scales(self, data: pd.DataFrame, metric: str) -> Dict[str, object]:
+        """Global range and class breaks of a metric over all periods - built once per dataset version when it is known"""
+        data = self.ensure_metric(data, metric)
+        if self.dataset_version is None:
+            return self._color_scales(data, metric)
+        return self._build_color_scales(data, self.dashboard_type, self.dataset_version, metric)
+    
+    @st.cache_resource(max_entries=32)  # every metric of both levels, current and previous version
+    def _build_color_scales(_self, _data, dashboard_type: str, dataset_version: str, metric: str) -> Dict[str, object]:
+        """Cached per (level, dataset version, metric)"""
+        return _self._color_scales(_data, metric)
+    
+    def _color_scales(self, data: pd.DataFrame, metric: str) -> Dict[str, object]:
+        """Range plus quantile, natural-break and log class edges, each from the lowest to the highest value"""
+        values = pd.to_numeric(data[metric], errors='coerce').to_numpy(dtype=float)
+        values = np.sort(values[np.isfinite(values)])
+        if values.size == 0:
+            return {'range': (0.0, 0.0), **{scheme: np.array([0.0, 0.0]) for scheme in self.CLASS_SCHEMES}}
+        
+        vmin, vmax = values[0], values[-1]
+        positive = values[values > 0]
+        if positive.size and vmax > positive[0]:
+            log_edges = np.r_[vmin, np.geomspace(positive[0], vmax, self.COLOR_CLASSES + 1)[1:]]
+        else:
+            log_edges = np.linspace(vmin, vmax, self.COLOR_CLASSES + 1)
+        return {
+            'range': (vmin, vmax),
+            'quantile': np.unique(np.quantile(values, np.linspace(0, 1, self.COLOR_CLASSES + 1))),
+            'jenks': self._natural_breaks(values, self.COLOR_CLASSES),
+            'log': np.unique(log_edges)
+        }
+    
+    @staticmethod
+    def _natural_breaks(values: np.ndarray, classes: int, sample_size: int = 1000) -> np.ndarray:
+        """Fisher-Jenks class edges minimising within-class variance, on an evenly spaced quantile sample
+        
+        Tied values are collapsed into weighted points, so a break never splits a run of equal values.
+        """
+        sample, weights = np.unique(np.quantile(values, np.linspace(0, 1, min(sample_size, values.size))), return_counts=True)
+        n = sample.size
+        classes = min(classes, n)
+        if classes < 2:
+            return np.array([sample[0], sample[-1]])
+        
+        # Weighted squared deviation of every segment sample[i:j] from prefix sums, as one (i, j) matrix
+        counts = np.r_[0, np.cumsum(weights)]
+        sums, squares = np.r_[0, np.cumsum(weights * sample)], np.r_[0, np.cumsum(weights * sample ** 2)]
+        i, j = np.arange(n + 1)[:, None], np.arange(n + 1)[None, :]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            segment_cost = squares[j] - squares[i] - (sums[j] - sums[i]) ** 2 / (counts[j] - counts[i])
+        segment_cost = np.where(j > i, segment_cost, np.inf)
+        
+        cost = segment_cost[0]
+        starts = []
+        for _ in range(1, classes):
+            total = cost[:, None] + segment_cost
+            starts.append(total.argmin(axis=0))
+            cost = total.min(axis=0)
+        
+        # Walk back from the full sample; each edge sits halfway between two neighbouring classes
+        edges, end = [sample[-1]], n
+        for step in reversed(starts):
+            end = step[end]
+            edges.append((sample[end - 1] + sample[end]) / 2)
+        edges.append(sample[0])
+        return np.unique(edges)
     
     def get_entity_column(self) -> str:
         """Get the column name for entities (districts/sectors)"""
@@ -113,6 +442,13 @@ class MetricsCalculator:
         else:
             return 'Sector'
     
+    def get_id_column(self) -> str:
+        """Get the canonical integer id column for entities (districts/sectors)"""
+        if self.dashboard_type == "Districts":
+            return 'district_id'
+        else:
+            return 'sector_id'
+    
     def get_display_column(self) -> str:
         """Get the column name for display purposes"""
         if self.dashboard_type == "Districts":
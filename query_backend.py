@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import json
+import os
+import uuid
+import shutil
+import threading
+import calendar
+import numpy as np
+import pandas as pd
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from entity_registry import get_registry
+from metrics_calculator import MetricsCalculator
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+    from data_loader import BaseDataLoader
+
+class ParquetQueryBackend:
+    """Out-of-core mode: raw rows live in year-partitioned Parquet and are queried in-process with DuckDB
+
+    Only query results - a period slice, an entity's series, a group-by or a top-N - become pandas frames,
+    shaped like the in-memory frames so the visualization classes take them unchanged. It is also a loader
+    source like SQLiteSource: attached with loader.attach_source(), the loader reads its rows through it.
+    """
+
+    CHUNK_ROWS = 250_000
+    POINTER_FILE = 'CURRENT'
+    NAME_COLUMNS = ['Date', 'Province', 'District', 'Sector', 'month_name', 'sector_display', 'sector_key']
+
+    def __init__(self, loader: BaseDataLoader):
+        self.loader = loader
+        self.id_col = loader.get_id_column()
+        self.metrics_calculator = MetricsCalculator(
+            'Districts' if self.id_col == 'district_id' else 'Sectors', loader.get_dataset_version()
+        )
+        self._lock = threading.Lock()
+        self._connection = None
+        self._version: Optional[str] = None
+        self._id_maps = {}
+        self._source_columns: List[str] = []
+        self._columns: List[str] = []
+        self._geometry = None
+
+    def get_store_path(self) -> str:
+        """Parquet store next to the CSV it was built from: one directory per build and a pointer to the live one"""
+        return os.path.splitext(self.loader.data_file)[0] + '_parquet'
+
+    def get_current_path(self) -> Optional[str]:
+        """Build directory the pointer names, or None before the first build"""
+        try:
+            with open(os.path.join(self.get_store_path(), self.POINTER_FILE)) as f:
+                name = f.read().strip()
+        except OSError:
+            return None
+        return os.path.join(self.get_store_path(), name) if name else None
+
+    def _read_manifest(self, path: Optional[str] = None) -> dict:
+        path = path or self.get_current_path()
+        if path is None:
+            return {}
+        try:
+            with open(os.path.join(path, '_manifest.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def is_current(self) -> bool:
+        """True when the live Parquet build was made from the current CSV"""
+        return self._read_manifest().get('data_signature') == self.loader.get_file_signature(self.loader.data_file)
+
+    def build(self):
+        """Convert the CSV to Parquet chunk by chunk, so the raw rows never sit in memory at once
+
+        Each build gets its own directory and goes live by atomically replacing the pointer file, so a reader
+        never sees a half-written or deleted dataset. The previous build is kept for connections still on it.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        root = self.get_store_path()
+        signature = self.loader.get_file_signature(self.loader.data_file)
+        name = f"v-{signature}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(root, name)
+        temp_path = path + '.tmp'
+        os.makedirs(root, exist_ok=True)
+        registry = get_registry()
+        source_columns, columns = None, None
+        try:
+            for chunk in pd.read_csv(self.loader.data_file, chunksize=self.CHUNK_ROWS):
+                source_columns = list(chunk.columns)
+                chunk = registry.apply(self.loader.process_data(chunk))
+                chunk = chunk.drop(columns=[col for col in self.NAME_COLUMNS if col in chunk.columns])
+                # Sorted within each year file so month and district filters skip row groups by their statistics
+                chunk = chunk.sort_values(['year', 'month', self.id_col])
+                columns = list(chunk.columns)
+                pq.write_to_dataset(pa.Table.from_pandas(chunk, preserve_index=False), temp_path,
+                                    partition_cols=['year'], row_group_size=64_000)
+
+            with open(os.path.join(temp_path, '_manifest.json'), 'w') as f:
+                json.dump({'data_signature': signature, 'source_columns': source_columns, 'columns': columns,
+                           'entities': registry.export_entities()}, f)
+            os.replace(temp_path, path)
+        except BaseException:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            raise
+
+        previous = self.get_current_path()
+        pointer_path = os.path.join(root, f"{self.POINTER_FILE}.{name}.tmp")
+        with open(pointer_path, 'w') as f:
+            f.write(name)
+        os.replace(pointer_path, os.path.join(root, self.POINTER_FILE))
+        self._remove_old_builds({name, os.path.basename(previous or '')})
+
+    def _remove_old_builds(self, keep: set):
+        """Delete finished builds older than the live and previous ones - never one still being written"""
+        root = self.get_store_path()
+        for entry in os.listdir(root):
+            if entry.startswith('v-') and not entry.endswith('.tmp') and entry not in keep:
+                shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+    def connect(self):
+        """DuckDB connection over the live Parquet build, rebuilding it when the CSV changed"""
+        import duckdb
+
+        version = self.loader.get_file_signature(self.loader.data_file)
+        with self._lock:
+            if self._connection is not None and version == self._version:
+                return self._connection
+            if not self.is_current():
+                self.build()
+            # Resolve the pointer once: this connection stays on its build even if another process swaps in a newer one
+            path = self.get_current_path()
+            connection = duckdb.connect()
+            pattern = os.path.join(path, '*', '*.parquet').replace("'", "''")
+            connection.execute(
+                f"CREATE VIEW source AS SELECT * FROM read_parquet('{pattern}', hive_partitioning = true)"
+            )
+            manifest = self._read_manifest(path)
+            self._id_maps = self._build_id_maps(manifest.get('entities', {'districts': [], 'sectors': []}))
+            self._source_columns = manifest.get('source_columns', [])
+            self._columns = manifest.get('columns', [])
+            self._connection, self._version = connection, version
+            return connection
+
+    def _build_id_maps(self, entities: dict) -> dict:
+        """Stored -> current registry ids, in case this process's registry numbered entities differently"""
+        district_map, sector_map = get_registry().remap_entities(entities)
+        maps = {}
+        for id_col, mapping in (('district_id', district_map), ('sector_id', sector_map)):
+            if not np.array_equal(mapping, np.arange(len(mapping))):
+                maps[id_col] = mapping
+        return maps
+
+    def query(self, sql: str, params: Optional[list] = None) -> pd.DataFrame:
+        """Run a query on a per-call cursor and translate id columns to this process's registry"""
+        result = self.connect().cursor().execute(sql, params or []).df()
+        for id_col, mapping in self._id_maps.items():
+            if id_col in result.columns:
+                result[id_col] = mapping[result[id_col].values]
+        return result
+
+    def _stored_ids(self, id_col: str, ids: Iterable[int]) -> List[int]:
+        """Current registry ids -> ids as written in the Parquet files"""
+        ids = [int(i) for i in ids]
+        mapping = self._id_maps.get(id_col)
+        if mapping is None:
+            return ids
+        inverse = {int(current): stored for stored, current in enumerate(mapping)}
+        return [inverse[i] for i in ids if i in inverse]
+
+    # === QUERY BUILDING ===
+
+    def get_stored_columns(self) -> List[str]:
+        """Columns as stored in Parquet - ids, year and month instead of names and dates"""
+        self.connect()
+        return self._columns
+
+    def metric_expression(self, metric: str) -> str:
+        """SQL for a stored column or a derived metric evaluated inside the query"""
+        if metric in self.get_stored_columns():
+            return self._quote(metric)
+        definition = self.metrics_calculator.get_derived_metrics().get(metric)
+        if definition is None:
+            raise KeyError(f"Unknown metric '{metric}'")
+        numerator, denominator = self._quote(definition.numerator), self._quote(definition.denominator)
+        return f"CASE WHEN {denominator} > 0 THEN {numerator} * {definition.scale} / {denominator} ELSE 0 END"
+
+    @staticmethod
+    def _quote(column: str) -> str:
+        return '"' + column.replace('"', '""') + '"'
+
+    def _where(self, start: Optional[Tuple[int, int]] = None, end: Optional[Tuple[int, int]] = None,
+               entity_ids: Optional[Iterable[int]] = None, districts: Optional[Iterable[int]] = None) -> Tuple[str, list]:
+        """Filters written as plain comparisons on year, month and ids so DuckDB can push them into the scan"""
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("year >= ? AND (year > ? OR month >= ?)")
+            params += [start[0], start[0], start[1]]
+        if end is not None:
+            clauses.append("year <= ? AND (year < ? OR month <= ?)")
+            params += [end[0], end[0], end[1]]
+        for id_col, ids in ((self.id_col, entity_ids), ('district_id', districts)):
+            if ids is None:
+                continue
+            stored = self._stored_ids(id_col, ids) or [-1]
+            clauses.append(f"{id_col} IN ({', '.join('?' * len(stored))})")
+            params += stored
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    # === QUERIES ===
+
+    def get_periods(self) -> pd.DataFrame:
+        """Distinct (year, month) pairs in order"""
+        return self.query("SELECT DISTINCT year, month FROM source ORDER BY year, month")
+
+    def aggregate(self, metric: str, group_columns: List[str], start: Optional[Tuple[int, int]] = None,
+                  end: Optional[Tuple[int, int]] = None, entity_ids: Optional[Iterable[int]] = None) -> pd.DataFrame:
+        """Same result as MetricsCalculator.aggregate_metric, computed in the engine"""
+        count_metrics = self.metrics_calculator.get_count_metrics()
+        cases_column = metric if metric in count_metrics else count_metrics[0]
+        how = 'SUM' if metric in count_metrics else 'AVG'
+        label_columns = {'District': 'district_id', 'Sector': 'sector_id', 'sector_display': 'sector_id',
+                         'Province': 'province_id'}
+        keys = list(dict.fromkeys(label_columns.get(col, col) for col in group_columns))
+
+        where, params = self._where(start, end, entity_ids)
+        select = ', '.join(keys + [
+            f"{how}({self.metric_expression(metric)}) AS value",
+            f"SUM({self._quote(cases_column)}) AS cases",
+            "SUM(Population) AS population"
+        ])
+        group_by = f" GROUP BY {', '.join(keys)} ORDER BY {', '.join(keys)}" if keys else ''
+        result = self.query(f"SELECT {select} FROM source{where}{group_by}", params)
+        # Overall incidence: (total cases / total population) * 1000
+        result['incidence'] = (result['cases'] / result['population'].where(result['population'] > 0) * 1000).fillna(0)
+
+        registry = get_registry()
+        for col in group_columns:
+            if col in label_columns:
+                labels = registry.labels(label_columns[col], result[label_columns[col]].values)
+                if col == 'Sector':
+                    labels = registry.sector_labels(result['sector_id'].values)
+                result[col] = labels
+        return result[group_columns + ['value', 'cases', 'population', 'incidence']]
+
+    def top_entities(self, metric: str, year: int, month: int, top_n: int = 10, bottom: bool = False) -> pd.DataFrame:
+        """Top (or bottom) N entity ids and values of a period - a bounded top-N inside the engine"""
+        where, params = self._where((year, month), (year, month))
+        order = 'ASC' if bottom else 'DESC'
+        return self.query(
+            f"SELECT {self.id_col}, {self.metric_expression(metric)} AS value FROM source{where} "
+            f"ORDER BY value {order} NULLS LAST, {self.id_col} LIMIT ?", params + [int(top_n)]
+        )
+
+    def load_period(self, year: int, month: int, districts: Optional[Iterable[int]] = None,
+                    metrics: Iterable[str] = ()) -> gpd.GeoDataFrame:
+        """One period's rows with names and geometry, like data[(year == y) & (month == m)] in memory mode"""
+        where, params = self._where((year, month), (year, month), districts=districts)
+        frame = self.query(f"SELECT {self._select_all(metrics)} FROM source{where}", params)
+        return self._attach_geometry(self._finish(frame))
+
+    def load_entities(self, entity_ids: Iterable[int], metrics: Iterable[str] = ()) -> pd.DataFrame:
+        """Every period of some entities - what create_trend_chart needs, without geometry"""
+        where, params = self._where(entity_ids=entity_ids)
+        frame = self.query(f"SELECT {self._select_all(metrics)} FROM source{where} ORDER BY year, month", params)
+        return self._finish(frame)
+
+    def _select_all(self, metrics: Iterable[str]) -> str:
+        """All stored columns plus any derived metrics that were asked for"""
+        derived = [f"{self.metric_expression(m)} AS {self._quote(m)}" for m in metrics if m not in self.get_stored_columns()]
+        return ', '.join(['*'] + derived)
+
+    def _finish(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Rebuild the name columns the in-memory loaders provide"""
+        frame = get_registry().attach_labels(frame)
+        if 'month' in frame.columns:
+            frame['year'] = frame['year'].astype('int32')
+            frame['month_name'] = np.array(calendar.month_name, dtype=object)[frame['month'].values]
+        return frame
+
+    def _attach_geometry(self, frame: pd.DataFrame) -> gpd.GeoDataFrame:
+        """Join the entity polygons, read from the geometry store once per backend"""
+        import geopandas as gpd
+        if self._geometry is None:
+            gdf = self.loader.read_geometry_files()
+            gdf = get_registry().apply(gdf[self.loader.get_join_columns() + ['geometry']])
+            self._geometry = gdf[[self.id_col, 'geometry']].drop_duplicates(subset=self.id_col)
+        merged = frame.merge(self._geometry, on=self.id_col, how='left')
+        return gpd.GeoDataFrame(merged, geometry='geometry', crs=self._geometry.crs)
+
+    # === LOADER SOURCE ===
+    # The SQLiteSource interface; one backend serves one level, so the table names are ignored
+
+    def get_signature_files(self) -> Tuple[str, ...]:
+        """Files whose change makes a new dataset version - the Parquet build follows the CSV"""
+        return self.loader.data_file, self.loader.geometry_file
+
+    def get_columns(self, table: Optional[str] = None) -> List[str]:
+        """Columns of the CSV the store was built from"""
+        self.connect()
+        return self._source_columns
+
+    def read_records(self, table: Optional[str] = None, start: Optional[Tuple[int, int]] = None,
+                     end: Optional[Tuple[int, int]] = None, districts: Optional[Iterable[str]] = None,
+                     columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Raw rows shaped like the CSV, with the period and district filters pushed into the scan
+
+        Dates come back as the first of their month - the store keeps only year and month.
+        """
+        self.connect()
+        district_ids = None
+        if districts is not None:
+            registry = get_registry()
+            district_ids = [i for name in districts for i in registry.find_ids('district_id', name)]
+        where, params = self._where(start, end, districts=district_ids)
+        source_columns = self.get_columns() if columns is None else list(columns)
+        stored = self.get_stored_columns()
+        keys = [col for col in ('year', 'month', 'province_id', 'district_id', 'sector_id') if col in stored]
+        select = ', '.join(self._quote(col) for col in dict.fromkeys(keys + [c for c in source_columns if c in stored]))
+        frame = self._finish(self.query(f"SELECT {select} FROM source{where} ORDER BY year, month, {self.id_col}", params))
+        frame['Date'] = pd.to_datetime(pd.DataFrame({'year': frame['year'], 'month': frame['month'], 'day': 1}))
+        return frame[[col for col in source_columns if col in frame.columns]]
+
+    def read_geometry(self, table: Optional[str] = None, districts: Optional[Iterable[str]] = None,
+                      bbox: Optional[Tuple[float, float, float, float]] = None) -> gpd.GeoDataFrame:
+        """Boundaries from the loader's GeoParquet store - the backend converts only the attribute rows"""
+        return self.loader.read_geometry_files(districts, bbox)
+
+_backends: Dict[Tuple[type, str], ParquetQueryBackend] = {}
+_backends_lock = threading.Lock()
+
+def get_parquet_backend(loader: BaseDataLoader) -> ParquetQueryBackend:
+    """Process-wide backend per level, so every session and rebuild shares one DuckDB connection"""
+    key = (type(loader), os.path.abspath(loader.data_file))
+    with _backends_lock:
+        if key not in _backends:
+            _backends[key] = ParquetQueryBackend(loader)
+        return _backends[key]
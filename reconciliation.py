@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from typing import Dict, Tuple
+
+from entity_registry import get_registry
+
+class HierarchyReconciler:
+    """Roll sector figures up to districts and provinces and reconcile them against the district file"""
+
+    # District 'all cases' = sector 'Simple malaria cases' + district 'Severe cases/Deaths'
+    CASE_TOLERANCE = 0.5
+    POPULATION_TOLERANCE = 0.001  # relative
+
+    def __init__(self, district_loader, sector_loader):
+        self.district_loader = district_loader
+        self.sector_loader = sector_loader
+
+    def get_dataset_version(self) -> str:
+        """Combined version of both levels"""
+        return self.district_loader.get_dataset_version() + self.sector_loader.get_dataset_version()
+
+    def build(self, district_data: pd.DataFrame, sector_data: pd.DataFrame) -> Dict[str, object]:
+        """Build membership matrices and the period cubes once per dataset version"""
+        return self._build(district_data, sector_data, self.get_dataset_version())
+
+    @st.cache_resource(max_entries=2)  # current and previous version
+    def _build(_self, _district_data, _sector_data, dataset_version: str) -> Dict[str, object]:
+        """Cached per dataset version"""
+        from scipy import sparse
+        periods = pd.MultiIndex.from_frame(
+            pd.concat([_district_data[['year', 'month']], _sector_data[['year', 'month']]])
+            .drop_duplicates().sort_values(['year', 'month'])
+        )
+        registry = get_registry()
+        districts = pd.Index(np.union1d(_district_data['district_id'].unique(), _sector_data['district_id'].unique()),
+                             name='district_id')
+        sector_rows = _sector_data.drop_duplicates('sector_id').sort_values('sector_id')
+        sectors = pd.Index(sector_rows['sector_id'].values, name='sector_id')
+        province_of = np.asarray(registry.district_province, dtype='int32')[districts.values]
+        provinces = pd.Index(np.unique(province_of[province_of >= 0]), name='province_id')
+
+        # Sparse membership on integer ids: districts x sectors and provinces x districts
+        sector_district = districts.get_indexer(sector_rows['district_id'].values)
+        known = sector_district >= 0
+        sector_membership = sparse.csr_matrix(
+            (np.ones(known.sum()), (sector_district[known], np.nonzero(known)[0])),
+            shape=(len(districts), len(sectors))
+        )
+        district_province = provinces.get_indexer(province_of)
+        known = district_province >= 0
+        district_membership = sparse.csr_matrix(
+            (np.ones(known.sum()), (district_province[known], np.nonzero(known)[0])),
+            shape=(len(provinces), len(districts))
+        )
+
+        sector_cube = {
+            col: _self._pivot(_sector_data, 'sector_id', col, sectors, periods)
+            for col in ['Simple malaria cases', 'Population']
+        }
+        district_cube = {
+            col: _self._pivot(_district_data, 'district_id', col, districts, periods)
+            for col in ['all cases', 'Severe cases/Deaths', 'Population']
+        }
+        return {
+            'periods': periods, 'districts': districts, 'sectors': sectors, 'provinces': provinces,
+            'sector_membership': sector_membership, 'district_membership': district_membership,
+            'sector_cube': sector_cube, 'district_cube': district_cube
+        }
+
+    @staticmethod
+    def _pivot(data: pd.DataFrame, keys: str, column: str, index, periods: pd.MultiIndex) -> np.ndarray:
+        """Entity x period matrix of a column, NaN where the entity did not report"""
+        matrix = data.pivot_table(index=keys, columns=['year', 'month'], values=column, aggfunc='sum')
+        matrix = matrix.reindex(index=index, columns=periods)
+        return matrix.to_numpy(dtype=float)
+
+    def roll_up_sectors(self, cube: Dict[str, object]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sector cases, populations and reporting counts summed to districts for all periods in one product"""
+        cases = cube['sector_cube']['Simple malaria cases']
+        population = cube['sector_cube']['Population']
+        stacked = np.hstack([np.nan_to_num(cases), np.nan_to_num(population), (~np.isnan(cases)).astype(float)])
+        rolled = cube['sector_membership'] @ stacked
+        n_periods = len(cube['periods'])
+        return rolled[:, :n_periods], rolled[:, n_periods:2 * n_periods], rolled[:, 2 * n_periods:]
+
+    def get_reconciliation_report(self, district_data: pd.DataFrame, sector_data: pd.DataFrame) -> pd.DataFrame:
+        """Mismatched district-months between the sector roll-up and the district file"""
+        return self._reconcile(district_data, sector_data, self.get_dataset_version())
+
+    @st.cache_data(max_entries=2)  # current and previous version
+    def _reconcile(_self, _district_data, _sector_data, dataset_version: str) -> pd.DataFrame:
+        """Cached per dataset version"""
+        cube = _self.build(_district_data, _sector_data)
+        sector_cases, sector_population, sectors_reporting = _self.roll_up_sectors(cube)
+        district = cube['district_cube']
+        district_reported = ~np.isnan(district['all cases'])
+        sectors_expected = np.asarray(cube['sector_membership'].sum(axis=1)).ravel()
+
+        expected_cases = np.nan_to_num(district['all cases']) - np.nan_to_num(district['Severe cases/Deaths'])
+        district_population = np.nan_to_num(district['Population'])
+        case_gap = sector_cases - expected_cases
+        population_gap = sector_population - district_population
+        relative_population_gap = np.divide(np.abs(population_gap), district_population,
+                                            out=np.zeros_like(population_gap), where=district_population > 0)
+
+        checks = [
+            ('Simple cases vs all cases - severe', sector_cases, expected_cases, case_gap,
+             district_reported & (np.abs(case_gap) > _self.CASE_TOLERANCE)),
+            ('Population', sector_population, district_population, population_gap,
+             district_reported & (relative_population_gap > _self.POPULATION_TOLERANCE)),
+            ('Sector coverage', sectors_reporting, np.broadcast_to(sectors_expected[:, None], sectors_reporting.shape),
+             sectors_reporting - sectors_expected[:, None],
+             (district_reported | (sectors_reporting > 0)) & (sectors_reporting < sectors_expected[:, None]))
+        ]
+
+        frames = []
+        registry = get_registry()
+        for check, rolled, reference, gap, mismatch in checks:
+            rows, cols = np.nonzero(mismatch)
+            if len(rows) == 0:
+                continue
+            frames.append(pd.DataFrame({
+                'district_id': cube['districts'].values[rows],
+                'year': cube['periods'].get_level_values('year')[cols],
+                'month': cube['periods'].get_level_values('month')[cols],
+                'check': check,
+                'sector_roll_up': rolled[rows, cols],
+                'district_value': reference[rows, cols],
+                'difference': gap[rows, cols],
+                'sectors_reporting': sectors_reporting[rows, cols].astype(int),
+                'sectors_expected': sectors_expected[rows].astype(int)
+            }))
+
+        columns = ['Province', 'District', 'year', 'month', 'check', 'sector_roll_up', 'district_value',
+                   'difference', 'sectors_reporting', 'sectors_expected']
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        report = pd.concat(frames, ignore_index=True)
+        report['District'] = registry.district_labels(report['district_id'].values)
+        report['Province'] = registry.province_labels(
+            np.asarray(registry.district_province, dtype='int32')[report['district_id'].values]
+        )
+        return report[columns].sort_values(['year', 'month', 'District', 'check']).reset_index(drop=True)
+
+    def get_province_data(self, district_data: pd.DataFrame, sector_data: pd.DataFrame) -> pd.DataFrame:
+        """Province totals for every period, rolled up from the cube"""
+        return self._province_data(district_data, sector_data, self.get_dataset_version())
+
+    @st.cache_data(max_entries=2)  # current and previous version
+    def _province_data(_self, _district_data, _sector_data, dataset_version: str) -> pd.DataFrame:
+        """Cached per dataset version"""
+        cube = _self.build(_district_data, _sector_data)
+        sector_cases, _, _ = _self.roll_up_sectors(cube)
+        district = cube['district_cube']
+        stacked = np.hstack([
+            np.nan_to_num(district['all cases']), np.nan_to_num(district['Severe cases/Deaths']),
+            np.nan_to_num(district['Population']), sector_cases
+        ])
+        rolled = cube['district_membership'] @ stacked
+        all_cases, severe, population, simple = np.hsplit(rolled, 4)
+
+        periods = cube['periods']
+        provinces = cube['provinces']
+        province_data = pd.DataFrame({
+            'Province': np.repeat(get_registry().province_labels(provinces.values), len(periods)),
+            'year': np.tile(periods.get_level_values('year'), len(provinces)),
+            'month': np.tile(periods.get_level_values('month'), len(provinces)),
+            'Population': population.ravel(),
+            'all cases': all_cases.ravel(),
+            'Severe cases/Deaths': severe.ravel(),
+            'Simple malaria cases': simple.ravel()
+        })
+        with np.errstate(divide='ignore', invalid='ignore'):
+            province_data['all cases incidence'] = np.where(
+                province_data['Population'] > 0, province_data['all cases'] / province_data['Population'] * 1000, 0
+            )
+        return province_data
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, NamedTuple, Optional, Tuple
+
+from data_loader import BaseDataLoader, load_levels
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+class DatasetSnapshot(NamedTuple):
+    """One fully built dataset version of every level"""
+    versions: Dict[str, Tuple[str, str]]
+    datasets: Dict[str, Tuple[gpd.GeoDataFrame, list]]
+
+class SourceWatcher:
+    """Poll the loaders' source files and rebuild the dataset on a background thread when they change
+
+    Sessions only read the published snapshot. The first snapshot is published as soon as its frames load,
+    and its caches are warmed on the watcher thread while sessions already use it; a session that needs an
+    artifact first simply builds it. A rebuild is loaded and warmed off the request path, then swapped in
+    with one reference assignment, so nobody waits on it or sees a half-built version.
+    """
+
+    def __init__(self, loader_factories: Dict[str, Callable[[], BaseDataLoader]],
+                 warm: Optional[Callable[[DatasetSnapshot, Dict[str, BaseDataLoader]], None]] = None,
+                 interval: float = 30.0,
+                 on_publish: Optional[Callable[[DatasetSnapshot, Optional[DatasetSnapshot]], None]] = None):
+        self.loader_factories = loader_factories
+        self.warm = warm
+        self.on_publish = on_publish
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._failed_versions = None
+        self.snapshot: Optional[DatasetSnapshot] = None
+        self.rebuilds = 0
+
+    def get_source_versions(self) -> Dict[str, Tuple[str, str]]:
+        """Current (dataset version, geometry signature) of every level's files"""
+        return {name: factory().get_source_signatures() for name, factory in self.loader_factories.items()}
+
+    def start(self) -> SourceWatcher:
+        """Load the first snapshot in the caller's thread and publish it, then warm it and watch in the background"""
+        snapshot, loaders = self.load(self.get_source_versions())
+        self.snapshot = snapshot
+        self._published(snapshot, None)
+        if self._thread is None and (self.warm is not None or self.interval > 0):
+            self._thread = threading.Thread(target=self._watch, args=(snapshot, loaders), name='source-watcher',
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def load(self, versions: Dict[str, Tuple[str, str]]) -> Tuple[DatasetSnapshot, Dict[str, BaseDataLoader]]:
+        """Load every level with its loader pinned to the versions seen before reading"""
+        loaders = {name: factory() for name, factory in self.loader_factories.items()}
+        for name, loader in loaders.items():
+            loader.pin_sources(versions[name])
+        return DatasetSnapshot(versions, load_levels(loaders)), loaders
+
+    def build(self, versions: Dict[str, Tuple[str, str]]) -> DatasetSnapshot:
+        """Load every level, then warm its caches"""
+        snapshot, loaders = self.load(versions)
+        if self.warm is not None and all(data is not None for data, _ in snapshot.datasets.values()):
+            self.warm(snapshot, loaders)
+        return snapshot
+
+    def rebuild(self, versions: Dict[str, Tuple[str, str]]) -> bool:
+        """Build a new snapshot and publish it only if it is complete and the files did not move meanwhile"""
+        start = time.perf_counter()
+        try:
+            snapshot = self.build(versions)
+        except Exception as e:
+            print(f"Source watcher: rebuild failed, still serving the previous version ({e})")
+            self._failed_versions = versions
+            return False
+        if any(data is None for data, _ in snapshot.datasets.values()):
+            print("Source watcher: rebuild produced no data, still serving the previous version")
+            self._failed_versions = versions
+            return False
+        if self.get_source_versions() != versions:
+            # Changed again while building - the next poll picks up the newer files
+            return False
+        with self._lock:
+            previous, self.snapshot = self.snapshot, snapshot
+            self.rebuilds += 1
+        print(f"Source watcher: published new dataset version in {time.perf_counter() - start:.1f}s")
+        self._published(snapshot, previous)
+        return True
+
+    def _published(self, snapshot: DatasetSnapshot, previous: Optional[DatasetSnapshot]):
+        """Hand the new and previous snapshots to on_publish, e.g. to drop files kept for older versions"""
+        if self.on_publish is None:
+            return
+        try:
+            self.on_publish(snapshot, previous)
+        except Exception as e:
+            print(f"Source watcher: on_publish failed ({e})")
+
+    def _warm_published(self, snapshot: DatasetSnapshot, loaders: Dict[str, BaseDataLoader]):
+        """Warm the first snapshot after it is published - sessions build what they need before this gets to it"""
+        if self.warm is None or any(data is None for data, _ in snapshot.datasets.values()):
+            return
+        start = time.perf_counter()
+        try:
+            self.warm(snapshot, loaders)
+            print(f"Source watcher: warmed the first dataset version in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            print(f"Source watcher: warming failed, artifacts are built on first use instead ({e})")
+
+    def _watch(self, snapshot: DatasetSnapshot, loaders: Dict[str, BaseDataLoader]):
+        self._warm_published(snapshot, loaders)
+        if self.interval <= 0:
+            return
+        pending = None
+        while not self._stop.wait(self.interval):
+            try:
+                versions = self.get_source_versions()
+                if versions == self.snapshot.versions or versions == self._failed_versions:
+                    pending = None
+                    continue
+                # Wait for one unchanged poll, so files still being copied are not read half-written
+                if versions != pending:
+                    pending = versions
+                    continue
+                pending = None
+                self.rebuild(versions)
+            except Exception as e:
+                print(f"Source watcher: poll failed ({e})")
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import os
+import numpy as np
+import pandas as pd
+import streamlit as st
+from typing import TYPE_CHECKING, Tuple
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+    from scipy import sparse
+
+class SpatialStatistics:
+    """Global Moran's I and local LISA hot/cold-spot classes over sparse contiguity weights"""
+
+    LISA_LABELS = {
+        0: 'Not Significant',
+        1: 'High-High (Hotspot)',
+        2: 'Low-Low (Coldspot)',
+        3: 'Low-High (Outlier)',
+        4: 'High-Low (Outlier)'
+    }
+
+    def __init__(self, data_loader, permutations: int = 99, significance: float = 0.05, seed: int = 12345):
+        self.data_loader = data_loader
+        self.key_columns = data_loader.get_join_columns()
+        self.permutations = permutations
+        self.significance = significance
+        self.seed = seed
+
+    def get_weights_path(self) -> str:
+        """Weights are cached next to the geometry file they were built from"""
+        return os.path.splitext(self.data_loader.geometry_file)[0] + '.weights.npz'
+
+    def get_weights(self, data: gpd.GeoDataFrame) -> Tuple[sparse.csr_matrix, pd.MultiIndex]:
+        """Get the row-standardised contiguity weights, building and caching them on first use"""
+        signature = self.data_loader.get_geometry_signature()
+        return self._get_cached_weights(data, signature)
+
+    @st.cache_resource(max_entries=4)  # both levels, current and previous geometry
+    def _get_cached_weights(_self, _data, signature: str) -> Tuple[sparse.csr_matrix, pd.MultiIndex]:
+        """Load weights from disk when the geometry signature matches, otherwise rebuild them"""
+        path = _self.get_weights_path()
+        weights = _self._read_weights(path, signature)
+        if weights is None:
+            weights = _self._build_weights(_data)
+            _self._write_weights(path, signature, *weights)
+        return weights
+
+    def _build_weights(self, data: gpd.GeoDataFrame) -> Tuple[sparse.csr_matrix, pd.MultiIndex]:
+        """Build queen contiguity (shared vertex or edge) weights from the entity geometries"""
+        from scipy import sparse
+        from shapely.strtree import STRtree
+        entities = data[self.key_columns + ['geometry']].drop_duplicates(subset=self.key_columns)
+        entities = entities[entities.geometry.notna()].sort_values(self.key_columns)
+        keys = pd.MultiIndex.from_frame(entities[self.key_columns])
+        geometries = entities.geometry.values
+
+        tree = STRtree(geometries)
+        rows, cols = tree.query(geometries, predicate='intersects')
+        off_diagonal = rows != cols
+        rows, cols = rows[off_diagonal], cols[off_diagonal]
+
+        n = len(geometries)
+        weights = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+        return self._row_standardise(weights), keys
+
+    @staticmethod
+    def _row_standardise(weights: sparse.csr_matrix) -> sparse.csr_matrix:
+        """Scale every row to sum to one, leaving islands (no neighbours) as empty rows"""
+        from scipy import sparse
+        row_sums = np.asarray(weights.sum(axis=1)).ravel()
+        scale = np.divide(1.0, row_sums, out=np.zeros_like(row_sums), where=row_sums > 0)
+        return sparse.diags(scale) @ weights
+
+    def _read_weights(self, path: str, signature: str):
+        """Read cached weights, returning None if missing or built from another geometry file"""
+        from scipy import sparse
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as cached:
+                if str(cached['signature']) != signature:
+                    return None
+                n = len(cached['keys'])
+                weights = sparse.csr_matrix((cached['data'], cached['indices'], cached['indptr']), shape=(n, n))
+                keys = pd.MultiIndex.from_arrays(cached['keys'].T.tolist(), names=self.key_columns)
+            return weights, keys
+        except Exception:
+            return None
+
+    def _write_weights(self, path: str, signature: str, weights: sparse.csr_matrix, keys: pd.MultiIndex):
+        """Persist weights; failures only cost a rebuild next time"""
+        try:
+            key_array = np.array([list(key) if isinstance(key, tuple) else [key] for key in keys], dtype=str)
+            np.savez_compressed(path, signature=np.array(signature), keys=key_array,
+                                data=weights.data, indices=weights.indices, indptr=weights.indptr)
+        except OSError:
+            pass
+
+    def build_value_matrix(self, data: pd.DataFrame, metric: str, keys: pd.MultiIndex) -> Tuple[np.ndarray, pd.MultiIndex]:
+        """Pivot a metric into an entity x period matrix aligned with the weights rows"""
+        matrix = data.pivot_table(index=self.key_columns, columns=['year', 'month'], values=metric, aggfunc='sum')
+        matrix = matrix.reindex(keys.get_level_values(0) if keys.nlevels == 1 else keys)
+        values = matrix.to_numpy(dtype=float)
+
+        # Missing entity-months are replaced by the period mean so they contribute nothing
+        column_means = np.nanmean(values, axis=0)
+        missing = np.isnan(values)
+        values[missing] = np.take(column_means, np.nonzero(missing)[1])
+        return values, matrix.columns
+
+    def compute_global_morans_i(self, data: gpd.GeoDataFrame, metric: str) -> pd.DataFrame:
+        """Global Moran's I with permutation p-values for every period"""
+        return self._compute_global(data, metric, self.data_loader.get_dataset_version(), self.permutations, self.seed)
+
+    @st.cache_data(max_entries=32)  # every metric of both levels, current and previous version
+    def _compute_global(_self, _data, metric: str, dataset_version: str, permutations: int, seed: int) -> pd.DataFrame:
+        """Cached per (metric, dataset version, permutations, seed)"""
+        weights, keys = _self.get_weights(_data)
+        values, periods = _self.build_value_matrix(_data, metric, keys)
+        z = values - values.mean(axis=0)
+
+        observed = _self._morans_i(weights, z)
+        rng = np.random.default_rng(seed)
+        simulated = np.vstack([
+            _self._morans_i(weights, z[rng.permutation(len(z))]) for _ in range(permutations)
+        ])
+
+        expected = -1.0 / (len(z) - 1)
+        extreme = np.where(observed >= simulated.mean(axis=0), simulated >= observed, simulated <= observed)
+        p_values = (extreme.sum(axis=0) + 1) / (permutations + 1)
+        std = simulated.std(axis=0)
+        z_scores = np.divide(observed - simulated.mean(axis=0), std, out=np.zeros_like(std), where=std > 0)
+
+        return pd.DataFrame({
+            'year': periods.get_level_values('year'),
+            'month': periods.get_level_values('month'),
+            'morans_i': observed,
+            'expected_i': expected,
+            'z_score': z_scores,
+            'p_value': p_values
+        })
+
+    @staticmethod
+    def _morans_i(weights: sparse.csr_matrix, z: np.ndarray) -> np.ndarray:
+        """Moran's I for every column of centred values z with a single sparse product"""
+        lag = weights @ z
+        s0 = weights.sum()
+        denominator = (z ** 2).sum(axis=0)
+        numerator = (z * lag).sum(axis=0)
+        ratio = np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+        return (len(z) / s0) * ratio if s0 > 0 else np.zeros(z.shape[1])
+
+    def compute_local_classes(self, data: gpd.GeoDataFrame, metric: str) -> pd.DataFrame:
+        """LISA hot/cold-spot classes for every entity and period"""
+        return self._compute_local(data, metric, self.data_loader.get_dataset_version(),
+                                   self.permutations, self.seed, self.significance)
+
+    @st.cache_data(max_entries=32)  # every metric of both levels, current and previous version
+    def _compute_local(_self, _data, metric: str, dataset_version: str, permutations: int, seed: int,
+                       significance: float) -> pd.DataFrame:
+        """Cached per (metric, dataset version, permutations, seed, significance)"""
+        weights, keys = _self.get_weights(_data)
+        values, periods = _self.build_value_matrix(_data, metric, keys)
+        z = values - values.mean(axis=0)
+        m2 = (z ** 2).mean(axis=0)
+        m2 = np.where(m2 > 0, m2, 1.0)
+
+        lag = weights @ z
+        local_i = z * lag / m2
+
+        # Conditional randomisation: each entity keeps its value and draws its neighbours from the others
+        rng = np.random.default_rng(seed)
+        extreme_count = np.zeros_like(local_i)
+        for simulated_lag in _self._conditional_lags(weights, z, rng, permutations):
+            simulated = z * simulated_lag / m2
+            extreme_count += np.where(local_i >= 0, simulated >= local_i, simulated <= local_i)
+        p_values = (extreme_count + 1) / (permutations + 1)
+
+        classes = np.zeros(local_i.shape, dtype='int8')
+        significant = p_values <= significance
+        classes[significant & (z > 0) & (lag > 0)] = 1
+        classes[significant & (z < 0) & (lag < 0)] = 2
+        classes[significant & (z < 0) & (lag > 0)] = 3
+        classes[significant & (z > 0) & (lag < 0)] = 4
+
+        result = keys.to_frame(index=False).loc[np.repeat(np.arange(len(keys)), len(periods))].reset_index(drop=True)
+        result['year'] = np.tile(periods.get_level_values('year'), len(keys))
+        result['month'] = np.tile(periods.get_level_values('month'), len(keys))
+        result['local_i'] = local_i.ravel()
+        result['p_value'] = p_values.ravel()
+        result['lisa_class'] = pd.Categorical.from_codes(classes.ravel(), categories=list(_self.LISA_LABELS.values()))
+        return result
+
+    @staticmethod
+    def _conditional_lags(weights: sparse.csr_matrix, z: np.ndarray, rng: np.random.Generator, permutations: int):
+        """Yield one spatial lag per permutation, each entity's neighbours drawn without replacement from the others
+
+        Every row's weights are padded to the largest neighbour count, so one draw serves all entities and periods.
+        """
+        n = len(z)
+        counts = np.diff(weights.indptr)
+        k = int(counts.max()) if n > 1 else 0
+        if k == 0:
+            for _ in range(permutations):
+                yield np.zeros_like(z)
+            return
+        row_weights = np.zeros((n, k))
+        row_weights[np.arange(k) < counts[:, None]] = weights.data
+        rows = np.arange(n)[:, None]
+        for _ in range(permutations):
+            # k distinct random positions among the n - 1 others, shifted past the entity itself
+            drawn = np.argpartition(rng.random((n, n - 1)), k - 1, axis=1)[:, :k]
+            drawn += drawn >= rows
+            yield np.einsum('ik,ikt->it', row_weights, z[drawn])
+
+    def get_period_classes(self, data: gpd.GeoDataFrame, metric: str, year: int, month: int) -> pd.DataFrame:
+        """Hotspot classes for one period, ready to merge onto the period slice"""
+        local = self.compute_local_classes(data, metric)
+        return local[(local['year'] == year) & (local['month'] == month)]
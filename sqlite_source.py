@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import os
+import queue
+import sqlite3
+import threading
+import pandas as pd
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+class SQLiteSource:
+    """Attribute rows and WKB boundaries of every level in one SQLite file, read through a shared connection pool
+
+    Each level has a records table indexed on (District, Date) and Date, and a geometry table with a bounding
+    box per feature, so period, district and bounding-box filters run as indexed queries.
+    """
+
+    GEOMETRY_SUFFIX = '_geometry'
+
+    def __init__(self, path: str, pool_size: int = 4):
+        self.path = path
+        self.pool_size = pool_size
+        self._pool: queue.Queue = queue.Queue(maxsize=pool_size)
+        self._created = 0
+        self._lock = threading.Lock()
+
+    # === CONNECTION POOL ===
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a pooled connection, opening one while the pool is below its size, else waiting for one"""
+        try:
+            connection = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._created < self.pool_size
+                if can_open:
+                    self._created += 1
+            connection = self._open() if can_open else self._pool.get()
+        try:
+            yield connection
+        finally:
+            self._pool.put(connection)
+
+    def _open(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute('PRAGMA query_only=ON')
+        return connection
+
+    # === WRITING (HMIS export or CSV import) ===
+
+    def write_level(self, table: str, records: pd.DataFrame, geometry: gpd.GeoDataFrame):
+        """Replace a level's records and geometry tables and index them for the pushed-down filters"""
+        connection = sqlite3.connect(self.path)
+        try:
+            # WAL lets pooled readers keep reading while an export rewrites the file
+            connection.execute('PRAGMA journal_mode=WAL')
+            with connection:
+                records.to_sql(table, connection, if_exists='replace', index=False)
+                connection.execute(f'CREATE INDEX IF NOT EXISTS "{table}_district_date" ON "{table}" (District, Date)')
+                connection.execute(f'CREATE INDEX IF NOT EXISTS "{table}_date" ON "{table}" (Date)')
+
+                bounds = geometry.geometry.bounds
+                features = pd.DataFrame(geometry.drop(columns='geometry'))
+                features[['xmin', 'ymin', 'xmax', 'ymax']] = bounds.to_numpy()
+                features['geometry'] = list(geometry.geometry.to_wkb().values)
+                geometry_table = table + self.GEOMETRY_SUFFIX
+                features.to_sql(geometry_table, connection, if_exists='replace', index=False)
+                connection.execute(f'CREATE INDEX IF NOT EXISTS "{geometry_table}_district" ON "{geometry_table}" (District)')
+                connection.execute('CREATE TABLE IF NOT EXISTS source_metadata (name TEXT PRIMARY KEY, value TEXT)')
+                if geometry.crs is not None:
+                    connection.execute('INSERT OR REPLACE INTO source_metadata VALUES (?, ?)',
+                                       (f'{geometry_table}_crs', geometry.crs.to_wkt()))
+        finally:
+            connection.close()
+
+    def import_files(self, table: str, data_file: str, geometry_file: str):
+        """Load a level from its CSV and GeoJSON files"""
+        import geopandas as gpd
+        self.write_level(table, pd.read_csv(data_file), gpd.read_file(geometry_file))
+
+    def get_signature_files(self) -> Tuple[str, ...]:
+        """Files whose change makes a new dataset version"""
+        # Committed writes can sit in the write-ahead log until a checkpoint, so it counts too
+        return self.path, self.path + '-wal'
+
+    # === READING ===
+
+    def read_records(self, table: str, start: Optional[Tuple[int, int]] = None, end: Optional[Tuple[int, int]] = None,
+                     districts: Optional[Iterable[str]] = None, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Raw rows of a level - the same columns as its CSV - filtered on the indexed Date and District columns"""
+        clauses, params = [], []
+        if start is not None:
+            clauses.append('Date >= ?')
+            params.append(f'{start[0]:04d}-{start[1]:02d}-01')
+        if end is not None:
+            # ISO dates compare as strings; anything before the first day of the following month is in range
+            following = (end[0] + 1, 1) if end[1] == 12 else (end[0], end[1] + 1)
+            clauses.append('Date < ?')
+            params.append(f'{following[0]:04d}-{following[1]:02d}-01')
+        if districts is not None:
+            districts = list(districts)
+            clauses.append(f"District IN ({', '.join('?' * len(districts))})" if districts else '0')
+            params += districts
+
+        select = '*' if columns is None else ', '.join(f'"{column}"' for column in columns)
+        where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+        with self.connection() as connection:
+            return pd.read_sql_query(f'SELECT {select} FROM "{table}"{where}', connection, params=params)
+
+    def get_columns(self, table: str) -> List[str]:
+        with self.connection() as connection:
+            return [row[1] for row in connection.execute(f'PRAGMA table_info("{table}")')]
+
+    def read_geometry(self, table: str, districts: Optional[Iterable[str]] = None,
+                      bbox: Optional[Tuple[float, float, float, float]] = None) -> gpd.GeoDataFrame:
+        """Boundaries of a level, decoding only the features that pass the district and bounding-box filters"""
+        import geopandas as gpd
+
+        geometry_table = table + self.GEOMETRY_SUFFIX
+        clauses, params = [], []
+        if districts is not None:
+            districts = list(districts)
+            clauses.append(f"District IN ({', '.join('?' * len(districts))})" if districts else '0')
+            params += districts
+        if bbox is not None:
+            clauses.append('xmin <= ? AND xmax >= ? AND ymin <= ? AND ymax >= ?')
+            params += [bbox[2], bbox[0], bbox[3], bbox[1]]
+        where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+
+        with self.connection() as connection:
+            frame = pd.read_sql_query(f'SELECT * FROM "{geometry_table}"{where}', connection, params=params)
+            crs = connection.execute('SELECT value FROM source_metadata WHERE name = ?',
+                                     (f'{geometry_table}_crs',)).fetchone()
+        geometry = gpd.GeoSeries.from_wkb(frame.pop('geometry').values, index=frame.index, crs=crs[0] if crs else None)
+        return gpd.GeoDataFrame(frame.drop(columns=['xmin', 'ymin', 'xmax', 'ymax']), geometry=geometry)
+
+_sources: Dict[str, SQLiteSource] = {}
+_sources_lock = threading.Lock()
+
+def get_sqlite_source(path: str) -> SQLiteSource:
+    """Process-wide source per database file, so every session shares one connection pool"""
+    path = os.path.abspath(path)
+    with _sources_lock:
+        if path not in _sources:
+            _sources[path] = SQLiteSource(path)
+        return _sources[path]
+
+if __name__ == "__main__":
+    import sys
+    from data_loader import MalariaDataLoader, SectorDataLoader
+
+    # python sqlite_source.py data/malaria.sqlite - import both levels' CSV and GeoJSON files
+    source = SQLiteSource(sys.argv[1] if len(sys.argv) > 1 else 'data/malaria.sqlite')
+    for loader in (MalariaDataLoader(), SectorDataLoader()):
+        source.import_files(loader.get_source_table(), loader.data_file, loader.geometry_file)
+        print(f"{loader.get_source_table():<24} imported into {source.path}")
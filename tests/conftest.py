@@ -0,0 +1,43 @@
+import os
+import sys
+
+# The app's modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def dashboard_data(tmp_path, monkeypatch):
+    """Both levels' CSV and GeoJSON files for two districts over three months, in a working directory of their own"""
+    import geopandas as gpd
+    import pandas as pd
+    from shapely.geometry import box
+
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    dates = ['2023-01-01', '2023-02-01', '2023-03-01']
+    districts = [('Kigali City', 'Gasabo', 0.0), ('Southern', 'Huye', 1.0)]
+    sectors = [('Gasabo', 'Remera', 0.0), ('Gasabo', 'Kimironko', 0.5), ('Huye', 'Ngoma', 1.0), ('Huye', 'Tumba', 1.5)]
+    provinces = dict((district, province) for province, district, _ in districts)
+
+    pd.DataFrame([
+        {'Date': date, 'Province': province, 'District': district, 'Population': 1000 * (i + 1),
+         'all cases': 10 * (i + 1) + month, 'Severe cases/Deaths': month, 'all cases incidence': 0.0,
+         'Severe cases/Deaths incidence': 0.0}
+        for i, (province, district, _) in enumerate(districts) for month, date in enumerate(dates)
+    ]).to_csv(data_dir / 'district_malaria_data.csv', index=False)
+    pd.DataFrame([
+        {'Date': date, 'Province': provinces[district], 'District': district, 'Sector': sector, 'Population': 500,
+         'Simple malaria cases': 5 * (i + 1) + month, 'incidence': 0.0}
+        for i, (district, sector, _) in enumerate(sectors) for month, date in enumerate(dates)
+    ]).to_csv(data_dir / 'sector_malaria_data.csv', index=False)
+
+    gpd.GeoDataFrame({'Province': [p for p, _, _ in districts], 'District': [d for _, d, _ in districts]},
+                     geometry=[box(x, 0, x + 1, 1) for _, _, x in districts], crs=4326
+                     ).to_file(data_dir / 'district_geometries.geojson', driver='GeoJSON')
+    gpd.GeoDataFrame({'District': [d for d, _, _ in sectors], 'Sector': [s for _, s, _ in sectors]},
+                     geometry=[box(x, 0, x + 0.5, 1) for _, _, x in sectors], crs=4326
+                     ).to_file(data_dir / 'sector_geometries.geojson', driver='GeoJSON')
+    monkeypatch.chdir(tmp_path)
+    return data_dir
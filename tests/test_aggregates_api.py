@@ -0,0 +1,77 @@
+import gzip
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from aggregates_api import create_server
+
+
+@pytest.fixture
+def api(dashboard_data):
+    server = create_server(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def get(url, headers=None):
+    """(status, headers, body) of a GET, with HTTP errors and 304 returned rather than raised"""
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers or {})) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+QUERY = '/api/aggregates?level=districts&metric=all%20cases&by=entity_period'
+
+
+def test_matching_etag_gets_304_without_a_body(api):
+    status, headers, body = get(api + QUERY)
+    assert status == 200
+    assert json.loads(body)['rows']
+    etag = headers['ETag']
+
+    status, headers, body = get(api + QUERY, {'If-None-Match': etag})
+    assert status == 304
+    assert body == b''
+    assert headers['ETag'] == etag
+
+    assert get(api + QUERY, {'If-None-Match': '"stale", ' + etag})[0] == 304
+    assert get(api + QUERY, {'If-None-Match': '"stale"'})[0] == 200
+
+
+def test_etag_differs_per_query(api):
+    first = get(api + QUERY)[1]['ETag']
+    other = get(api + QUERY.replace('all%20cases', 'Severe%20cases%2FDeaths'))[1]['ETag']
+    assert first != other
+
+
+def test_etag_changes_with_the_dataset_version(api, dashboard_data):
+    etag = get(api + QUERY)[1]['ETag']
+    data_file = dashboard_data / 'district_malaria_data.csv'
+    with open(data_file, 'a') as f:
+        f.write('2023-04-01,Southern,Huye,2000,99,1,0,0\n')
+    stat = os.stat(data_file)
+    os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    status, headers, body = get(api + QUERY, {'If-None-Match': etag})
+    assert status == 200
+    assert headers['ETag'] != etag
+    assert (2023, 4) in {(row['year'], row['month']) for row in json.loads(body)['rows']}
+
+
+def test_gzip_only_when_accepted(api):
+    plain = get(api + QUERY)
+    zipped = get(api + QUERY, {'Accept-Encoding': 'gzip'})
+    assert plain[1]['Content-Encoding'] is None
+    assert zipped[1]['ETag'] == plain[1]['ETag']
+    if len(plain[2]) >= 512:
+        assert zipped[1]['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(zipped[2]) == plain[2]
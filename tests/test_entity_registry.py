@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from entity_registry import EntityRegistry
+
+
+def test_aliases_resolve_to_one_canonical_id():
+    registry = EntityRegistry()
+    frame = registry.apply(pd.DataFrame({'District': ['Gasabo', ' gasabo ', 'Butare', 'Huye'],
+                                         'Sector': ['Remera', 'remera', 'Ngoma', 'NGOMA']}))
+    assert frame['district_id'].tolist() == [0, 0, 9, 9]
+    assert frame['District'].tolist() == ['Gasabo', 'Gasabo', 'Huye', 'Huye']
+    assert frame['Province'].tolist() == ['Kigali City', 'Kigali City', 'Southern', 'Southern']
+    assert frame['sector_id'].nunique() == 2
+    assert registry.sector_display_labels(frame['sector_id'].values).tolist()[:2] == ['Remera (Gasabo)'] * 2
+
+
+def test_same_sector_name_in_two_districts_gets_two_ids():
+    registry = EntityRegistry()
+    frame = registry.apply(pd.DataFrame({'District': ['Nyagatare', 'Huye'], 'Sector': ['Ngoma', 'Ngoma']}))
+    assert frame['sector_id'].nunique() == 2
+    assert [registry.sector_district[i] for i in frame['sector_id']] == frame['district_id'].tolist()
+
+
+def test_missing_names_get_unknown_and_are_not_registered():
+    registry = EntityRegistry()
+    districts = len(registry.district_names)
+    frame = registry.apply(pd.DataFrame({'District': ['Gasabo', 'Gasabo', None, '  '],
+                                         'Sector': ['Remera', None, 'X', 'Y']}))
+    assert frame['district_id'].tolist() == [0, 0, -1, -1]
+    assert frame['sector_id'].tolist() == [0, -1, -1, -1]
+    assert frame['District'].tolist() == ['Gasabo', 'Gasabo', 'Unknown', 'Unknown']
+    assert frame['Sector'].tolist() == ['Remera', 'Unknown', 'Unknown', 'Unknown']
+    assert frame['Province'].tolist() == ['Kigali City', 'Kigali City', 'Unknown', 'Unknown']
+    assert len(registry.district_names) == districts
+    assert registry.sector_names == ['Remera']
+
+
+def test_ids_are_stable_across_calls():
+    registry = EntityRegistry()
+    first = registry.resolve_sectors(np.array([0, 1]), pd.Series(['Remera', 'Gikondo']))
+    second = registry.resolve_sectors(np.array([1, 0, 0]), pd.Series(['Gikondo', 'Remera', 'Kimironko']))
+    assert second[:2].tolist() == first[::-1].tolist()
+    assert registry.find_ids('sector_id', 'Remera (Gasabo)') == [first[0]]
+
+
+def test_remap_entities_translates_ids_between_registries():
+    source = EntityRegistry()
+    source.apply(pd.DataFrame({'District': ['Newdistrict', 'Huye'], 'Sector': ['A', 'B']}))
+    target = EntityRegistry()
+    target.apply(pd.DataFrame({'District': ['Huye'], 'Sector': ['B']}))
+    district_map, sector_map = target.remap_entities(source.export_entities())
+    assert target.district_labels(district_map).tolist() == source.district_names
+    assert target.sector_labels(sector_map).tolist() == source.sector_names
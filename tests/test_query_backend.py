@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+pytest.importorskip('duckdb')
+
+from data_loader import SectorDataLoader
+
+
+@pytest.fixture
+def backend(dashboard_data):
+    loader = SectorDataLoader()
+    backend = loader.get_query_backend()
+    loader.attach_source(backend)
+    return backend
+
+
+def test_loader_reads_the_same_frame_through_the_backend(backend):
+    from query_backend import ParquetQueryBackend
+
+    csv_loader = SectorDataLoader()
+    expected = csv_loader.build_data(csv_loader.read_csv(), None).sort_values(['year', 'month', 'sector_id'])
+    loader = backend.loader
+    loaded = loader.build_data(loader.read_records(), None)
+    assert isinstance(loader.source, ParquetQueryBackend)
+    assert list(loaded.columns) == list(expected.columns)
+    assert loaded.reset_index(drop=True).equals(expected.reset_index(drop=True))
+
+    view = loader.load_view((2023, 2), (2023, 3), ['Huye'], ['Simple malaria cases'], include_geometry=False)
+    assert sorted(set(view['Sector'])) == ['Ngoma', 'Tumba']
+    assert sorted(set(view['month'])) == [2, 3]
+
+
+def test_builds_go_live_by_pointer_and_only_older_builds_are_removed(backend):
+    backend.connect()
+    first = backend.get_current_path()
+    backend.build()
+    second = backend.get_current_path()
+    backend.build()
+    third = backend.get_current_path()
+
+    assert len({first, second, third}) == 3
+    with open(os.path.join(backend.get_store_path(), backend.POINTER_FILE)) as f:
+        assert f.read() == os.path.basename(third)
+    assert sorted(os.listdir(backend.get_store_path())) == sorted(
+        [backend.POINTER_FILE, os.path.basename(second), os.path.basename(third)]
+    )
+    assert not os.path.exists(first)
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics_calculator import MetricsCalculator
+
+
+@pytest.fixture
+def district_months():
+    """Three districts over 2022-11 .. 2023-04; district 2 skips January and district 1 starts late"""
+    rng = np.random.default_rng(7)
+    rows = [(district_id, year, month) for district_id in range(3)
+            for year, month in [(2022, 11), (2022, 12), (2023, 1), (2023, 2), (2023, 3), (2023, 4)]
+            if not (district_id == 2 and (year, month) == (2023, 1)) and not (district_id == 1 and year == 2022)]
+    frame = pd.DataFrame(rows, columns=['district_id', 'year', 'month'])
+    frame['all cases'] = rng.integers(0, 500, len(frame)).astype(float)
+    frame['Severe cases/Deaths'] = rng.integers(0, 10, len(frame)).astype(float)
+    frame['Population'] = rng.integers(1000, 5000, len(frame)).astype(float)
+    return frame
+
+
+def _brute_force(frame, start, end):
+    keys = frame['year'] * 12 + frame['month']
+    in_range = frame[(keys >= start[0] * 12 + start[1]) & (keys <= end[0] * 12 + end[1])]
+    return in_range.groupby('district_id').agg(cases=('all cases', 'sum'), population=('Population', 'mean'),
+                                               months=('month', 'size'))
+
+
+@pytest.mark.parametrize('start, end', [((2022, 11), (2023, 4)), ((2023, 1), (2023, 1)), ((2022, 12), (2023, 2)),
+                                        ((2023, 3), (2024, 6)), ((2020, 1), (2022, 11))])
+def test_range_matches_a_groupby_over_the_rows(district_months, start, end):
+    calculator = MetricsCalculator('Districts')
+    result = calculator.aggregate_range(district_months, start, end, ['all cases', 'Population', 'all cases per 10,000'])
+    expected = _brute_force(district_months, start, end)
+
+    assert result['district_id'].tolist() == expected.index.tolist()
+    assert result['months'].tolist() == expected['months'].tolist()
+    np.testing.assert_allclose(result['all cases'], expected['cases'])
+    np.testing.assert_allclose(result['Population'], expected['population'])
+    # Derived metrics divide the range totals, so incidence is weighted by population rather than averaged
+    np.testing.assert_allclose(result['all cases per 10,000'], expected['cases'] * 10000 / expected['population'])
+
+
+def test_range_without_rows_is_empty(district_months):
+    result = MetricsCalculator('Districts').aggregate_range(district_months, (2019, 1), (2019, 12), ['all cases'])
+    assert result.empty
@@ -0,0 +1,68 @@
+import uuid
+
+import pandas as pd
+
+from entity_registry import get_registry
+from reconciliation import HierarchyReconciler
+
+
+class _Loader:
+    """Stands in for a data loader - the reconciler only needs a version to key its caches"""
+
+    def __init__(self):
+        self.version = uuid.uuid4().hex
+
+    def get_dataset_version(self):
+        return self.version
+
+
+def _frames():
+    periods = [(2023, 1), (2023, 2)]
+    sectors = pd.DataFrame([
+        {'District': district, 'Sector': sector, 'year': year, 'month': month, 'Population': 500,
+         'Simple malaria cases': cases}
+        for district, sector, cases in [('Gasabo', 'Remera', 10), ('Gasabo', 'Kimironko', 20), ('Huye', 'Ngoma', 5)]
+        for year, month in periods
+    ])
+    districts = pd.DataFrame([
+        {'District': district, 'year': year, 'month': month, 'Population': population,
+         'all cases': simple + 2, 'Severe cases/Deaths': 2}
+        for district, population, simple in [('Gasabo', 1000, 30), ('Huye', 500, 5)]
+        for year, month in periods
+    ])
+    registry = get_registry()
+    return registry.apply(districts), registry.apply(sectors)
+
+
+def test_consistent_levels_reconcile_cleanly():
+    district_data, sector_data = _frames()
+    report = HierarchyReconciler(_Loader(), _Loader()).get_reconciliation_report(district_data, sector_data)
+    assert report.empty
+
+
+def test_each_kind_of_mismatch_is_reported_once():
+    district_data, sector_data = _frames()
+    huye_february = (district_data['District'] == 'Huye') & (district_data['month'] == 2)
+    district_data.loc[huye_february, 'all cases'] += 4
+    district_data.loc[(district_data['District'] == 'Gasabo') & (district_data['month'] == 1), 'Population'] = 1200
+    sector_data = sector_data[~((sector_data['Sector'] == 'Kimironko') & (sector_data['month'] == 2))]
+
+    report = HierarchyReconciler(_Loader(), _Loader()).get_reconciliation_report(district_data, sector_data)
+    found = {(row.District, row.month, row.check): row for row in report.itertuples()}
+    assert found[('Huye', 2, 'Simple cases vs all cases - severe')].difference == -4
+    assert found[('Gasabo', 1, 'Population')].difference == -200
+    coverage = found[('Gasabo', 2, 'Sector coverage')]
+    assert (coverage.sectors_reporting, coverage.sectors_expected) == (1, 2)
+    # The missing sector also leaves Gasabo's February cases and population short
+    assert set(found) == {('Huye', 2, 'Simple cases vs all cases - severe'), ('Gasabo', 1, 'Population'),
+                          ('Gasabo', 2, 'Sector coverage'), ('Gasabo', 2, 'Simple cases vs all cases - severe'),
+                          ('Gasabo', 2, 'Population')}
+
+
+def test_provinces_total_their_districts():
+    district_data, sector_data = _frames()
+    provinces = HierarchyReconciler(_Loader(), _Loader()).get_province_data(district_data, sector_data)
+    january = provinces[provinces['month'] == 1].set_index('Province')
+    assert january.loc['Kigali City', 'all cases'] == 32
+    assert january.loc['Kigali City', 'Simple malaria cases'] == 30
+    assert january.loc['Southern', 'Population'] == 500
@@ -0,0 +1,85 @@
+import os
+import time
+
+import pytest
+
+from data_loader import MalariaDataLoader, SectorDataLoader
+from source_watcher import SourceWatcher
+
+
+def _append_month(data_file, row):
+    """Add a row and move the modification time on, so the file signature changes even within one clock tick"""
+    with open(data_file, 'a') as f:
+        f.write(row + '\n')
+    stat = os.stat(data_file)
+    os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+@pytest.fixture
+def published():
+    return []
+
+
+@pytest.fixture
+def watcher_factory(dashboard_data, published):
+    watchers = []
+
+    def create(**kwargs):
+        watcher = SourceWatcher({'Districts': MalariaDataLoader, 'Sectors': SectorDataLoader},
+                                on_publish=lambda snapshot, previous: published.append((snapshot, previous)), **kwargs)
+        watchers.append(watcher)
+        return watcher.start()
+
+    yield create
+    for watcher in watchers:
+        watcher.stop()
+
+
+def test_rebuild_swaps_in_a_new_snapshot_and_leaves_the_old_one_intact(watcher_factory, dashboard_data, published):
+    watcher = watcher_factory(interval=0)
+    first = watcher.snapshot
+    assert published == [(first, None)]
+    rows = len(first.datasets['Districts'][0])
+
+    _append_month(dashboard_data / 'district_malaria_data.csv', '2023-04-01,Southern,Huye,2000,99,1,0,0')
+    assert watcher.rebuild(watcher.get_source_versions())
+
+    assert watcher.snapshot is not first
+    assert watcher.snapshot.versions['Districts'] != first.versions['Districts']
+    assert watcher.snapshot.versions['Sectors'] == first.versions['Sectors']
+    assert len(watcher.snapshot.datasets['Districts'][0]) == rows + 1
+    assert len(first.datasets['Districts'][0]) == rows
+    assert published[-1] == (watcher.snapshot, first)
+
+
+def test_rebuild_is_dropped_when_the_files_move_while_building(watcher_factory, dashboard_data):
+    data_file = dashboard_data / 'sector_malaria_data.csv'
+    watcher = watcher_factory(interval=0)
+    first = watcher.snapshot
+    watcher.warm = lambda snapshot, loaders: _append_month(data_file, '2023-05-01,Southern,Huye,Tumba,500,1,0')
+
+    _append_month(data_file, '2023-04-01,Southern,Huye,Tumba,500,1,0')
+    assert not watcher.rebuild(watcher.get_source_versions())
+    assert watcher.snapshot is first
+
+
+def test_failed_rebuild_keeps_serving_the_previous_version(watcher_factory, dashboard_data, published):
+    watcher = watcher_factory(interval=0)
+    first = watcher.snapshot
+    (dashboard_data / 'district_geometries.geojson').write_text('not geojson')
+
+    assert not watcher.rebuild(watcher.get_source_versions())
+    assert watcher.snapshot is first
+    assert len(published) == 1
+
+
+def test_polling_rebuilds_after_one_unchanged_poll(watcher_factory, dashboard_data):
+    watcher = watcher_factory(interval=0.05)
+    first = watcher.snapshot
+    _append_month(dashboard_data / 'district_malaria_data.csv', '2023-04-01,Southern,Huye,2000,99,1,0,0')
+
+    deadline = time.monotonic() + 10
+    while watcher.rebuilds == 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert watcher.rebuilds == 1
+    assert watcher.snapshot is not first
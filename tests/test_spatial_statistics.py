@@ -0,0 +1,31 @@
+import numpy as np
+from scipy import sparse
+
+from spatial_statistics import SpatialStatistics
+
+
+def _ring_weights(n):
+    """Each entity borders the next and the previous one, row-standardised"""
+    rows = np.repeat(np.arange(n), 2)
+    cols = np.stack([(np.arange(n) - 1) % n, (np.arange(n) + 1) % n], axis=1).ravel()
+    return SpatialStatistics._row_standardise(sparse.csr_matrix((np.ones(2 * n), (rows, cols)), shape=(n, n)))
+
+
+def test_conditional_lags_never_draw_the_entity_itself():
+    n = 8
+    weights = _ring_weights(n)
+    z = np.eye(n)  # period t holds a value only at entity t
+    lags = list(SpatialStatistics._conditional_lags(weights, z, np.random.default_rng(0), 200))
+    assert len(lags) == 200
+    for lag in lags:
+        assert lag.shape == z.shape
+        assert np.all(np.diag(lag) == 0)
+        # Two distinct neighbours at weight 0.5 each: the lone value appears at most once
+        assert set(np.unique(lag)) <= {0.0, 0.5}
+
+
+def test_islands_get_no_simulated_lag():
+    weights = sparse.csr_matrix((3, 3))
+    lags = list(SpatialStatistics._conditional_lags(weights, np.ones((3, 2)), np.random.default_rng(0), 5))
+    assert len(lags) == 5
+    assert all(not lag.any() for lag in lags)
@@ -0,0 +1,49 @@
+import geopandas as gpd
+from shapely.geometry import MultiPolygon, Polygon, box, shape
+
+from topology import TopologyStore, decode_topology, encode_topology
+
+
+def _round_trip(geometries, **kwargs):
+    topology = encode_topology(geometries, list(range(len(geometries))), **kwargs)
+    return topology, decode_topology(topology)
+
+
+def test_polygons_round_trip_within_the_quantization_grid():
+    holed = Polygon(box(2, 0, 5, 3).exterior.coords, [box(3, 1, 4, 2).exterior.coords])
+    pair = MultiPolygon([box(6, 0, 7, 1), box(8, 0, 9, 1)])
+    geometries = [box(0, 0, 1, 1), holed, pair]
+    _, collection = _round_trip(geometries)
+    assert [feature['id'] for feature in collection['features']] == [0, 1, 2]
+    assert [feature['geometry']['type'] for feature in collection['features']] == ['Polygon', 'Polygon', 'MultiPolygon']
+    for original, feature in zip(geometries, collection['features']):
+        decoded = shape(feature['geometry'])
+        assert decoded.is_valid
+        assert original.symmetric_difference(decoded).area < 1e-6
+
+
+def test_shared_boundary_is_stored_once():
+    topology, _ = _round_trip([box(0, 0, 1, 1), box(1, 0, 2, 1)])
+    rings = [geometry['arcs'][0] for geometry in topology['objects']['entities']['geometries']]
+    shared = {index if index >= 0 else ~index for index in rings[0]} & {index if index >= 0 else ~index for index in rings[1]}
+    assert len(shared) == 1
+    # The shared edge is walked forwards by one square and backwards by the other
+    forward, backward = (index for ring in rings for index in ring if (index if index >= 0 else ~index) in shared)
+    assert forward == ~backward
+
+
+def test_missing_geometry_and_properties_survive():
+    topology, collection = _round_trip([box(0, 0, 1, 1), None], properties=[{'District': 'Gasabo'}, {'District': 'Huye'}])
+    assert collection['features'][1]['geometry'] is None
+    assert [feature['properties'] for feature in collection['features']] == [{'District': 'Gasabo'}, {'District': 'Huye'}]
+
+
+def test_store_is_current_only_for_its_signature(tmp_path):
+    geometry_file = str(tmp_path / 'districts.geojson')
+    gdf = gpd.GeoDataFrame({'District': ['Gasabo', 'Huye']}, geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1)])
+    store = TopologyStore(geometry_file, 'v1', ['District'])
+    assert not store.is_current()
+    built = store.build(gdf)
+    assert store.is_current()
+    assert store.read() == built
+    assert not TopologyStore(geometry_file, 'v2', ['District']).is_current()
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import json
+import os
+import numpy as np
+from typing import TYPE_CHECKING, Dict, Hashable, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+QUANTIZATION = 100_000  # grid steps across each axis of the bounding box - about 2 m over Rwanda
+
+Point = Tuple[int, int]
+
+def encode_topology(geometries: Sequence, ids: Sequence[Hashable], properties: Optional[Sequence[dict]] = None,
+                    quantization: int = QUANTIZATION, name: str = 'entities') -> dict:
+    """TopoJSON-style topology of polygon features: every shared boundary is stored once as an arc
+
+    Coordinates are quantized to an integer grid over the bounding box and arcs are delta-encoded, so
+    shared edges are written once and each vertex costs a couple of small integers.
+    """
+    bounds = np.array([geometry.bounds for geometry in geometries if geometry is not None and not geometry.is_empty])
+    x0, y0 = (bounds[:, 0].min(), bounds[:, 1].min()) if len(bounds) else (0.0, 0.0)
+    x1, y1 = (bounds[:, 2].max(), bounds[:, 3].max()) if len(bounds) else (1.0, 1.0)
+    kx = (x1 - x0) / (quantization - 1) or 1.0
+    ky = (y1 - y0) / (quantization - 1) or 1.0
+
+    # Quantized closed rings per polygon per feature
+    features: List[List[List[List[Point]]]] = []
+    for geometry in geometries:
+        polygons = []
+        for polygon in _polygons(geometry):
+            rings = [_quantize_ring(ring.coords, x0, y0, kx, ky) for ring in [polygon.exterior, *polygon.interiors]]
+            if rings and rings[0] is not None:
+                polygons.append([ring for ring in rings if ring is not None])
+        features.append(polygons)
+
+    junctions = _find_junctions(ring for polygons in features for rings in polygons for ring in rings)
+    arcs: List[Tuple[Point, ...]] = []
+    arc_index: Dict[Tuple[Point, ...], int] = {}
+
+    def ring_arcs(ring: List[Point]) -> List[int]:
+        indices = []
+        for arc in _cut_ring(ring, junctions):
+            if arc in arc_index:
+                indices.append(arc_index[arc])
+            elif arc[::-1] in arc_index:
+                indices.append(~arc_index[arc[::-1]])
+            else:
+                arc_index[arc] = len(arcs)
+                indices.append(len(arcs))
+                arcs.append(arc)
+        return indices
+
+    objects = []
+    for i, polygons in enumerate(features):
+        encoded = [[ring_arcs(ring) for ring in rings] for rings in polygons]
+        if not encoded:
+            geometry = {'type': None}
+        elif len(encoded) == 1:
+            geometry = {'type': 'Polygon', 'arcs': encoded[0]}
+        else:
+            geometry = {'type': 'MultiPolygon', 'arcs': encoded}
+        geometry['id'] = ids[i]
+        if properties is not None:
+            geometry['properties'] = properties[i]
+        objects.append(geometry)
+
+    return {
+        'type': 'Topology',
+        'transform': {'scale': [kx, ky], 'translate': [x0, y0]},
+        'arcs': [_delta_encode(arc) for arc in arcs],
+        'objects': {name: {'type': 'GeometryCollection', 'geometries': objects}}
+    }
+
+def decode_topology(topology: dict, name: Optional[str] = None) -> dict:
+    """GeoJSON FeatureCollection of one topology object, coordinates rounded to the quantization grid"""
+    scale, translate = topology['transform']['scale'], topology['transform']['translate']
+    # Enough decimals to tell neighbouring grid points apart, and no more - keeps the JSON short
+    decimals = max(0, int(np.ceil(-np.log10(min(scale)))) + 1)
+    arcs = []
+    for arc in topology['arcs']:
+        points = np.cumsum(np.asarray(arc, dtype=np.int64).reshape(-1, 2), axis=0)
+        coords = np.round(points * np.asarray(scale) + np.asarray(translate), decimals)
+        arcs.append(coords.tolist())
+
+    def ring(indices: List[int]) -> List[List[float]]:
+        coords: List[List[float]] = []
+        for index in indices:
+            points = arcs[index] if index >= 0 else arcs[~index][::-1]
+            coords.extend(points[1:] if coords else points)
+        return coords
+
+    collection = topology['objects'][name or next(iter(topology['objects']))]
+    features = []
+    for geometry in collection['geometries']:
+        if geometry.get('type') == 'Polygon':
+            decoded = {'type': 'Polygon', 'coordinates': [ring(r) for r in geometry['arcs']]}
+        elif geometry.get('type') == 'MultiPolygon':
+            decoded = {'type': 'MultiPolygon', 'coordinates': [[ring(r) for r in p] for p in geometry['arcs']]}
+        else:
+            decoded = None
+        features.append({'type': 'Feature', 'id': geometry.get('id'), 'properties': geometry.get('properties', {}),
+                         'geometry': decoded})
+    return {'type': 'FeatureCollection', 'features': features}
+
+def _polygons(geometry) -> list:
+    if geometry is None or geometry.is_empty:
+        return []
+    if geometry.geom_type == 'Polygon':
+        return [geometry]
+    if geometry.geom_type in ('MultiPolygon', 'GeometryCollection'):
+        return [part for member in geometry.geoms for part in _polygons(member)]
+    return []
+
+def _quantize_ring(coords, x0: float, y0: float, kx: float, ky: float) -> Optional[List[Point]]:
+    """Closed ring on the integer grid without repeated points, or None when it collapses"""
+    xy = np.asarray(coords, dtype=float)[:, :2]
+    q = np.column_stack([np.round((xy[:, 0] - x0) / kx), np.round((xy[:, 1] - y0) / ky)]).astype(np.int64)
+    keep = np.r_[True, np.any(q[1:] != q[:-1], axis=1)]
+    q = q[keep]
+    if len(q) and tuple(q[0]) != tuple(q[-1]):
+        q = np.vstack([q, q[:1]])
+    if len(q) < 4:
+        return None
+    return [tuple(point) for point in q.tolist()]
+
+def _find_junctions(rings) -> set:
+    """Points where boundaries meet or part: their neighbours differ between the rings passing through them"""
+    neighbours: Dict[Point, Tuple[Point, Point]] = {}
+    junctions = set()
+    for ring in rings:
+        points = ring[:-1]
+        n = len(points)
+        for i, point in enumerate(points):
+            pair = tuple(sorted((points[i - 1], points[(i + 1) % n])))
+            seen = neighbours.setdefault(point, pair)
+            if seen != pair:
+                junctions.add(point)
+    return junctions
+
+def _cut_ring(ring: List[Point], junctions: set) -> List[Tuple[Point, ...]]:
+    """Split a closed ring into arcs at its junctions"""
+    points = ring[:-1]
+    cuts = [i for i, point in enumerate(points) if point in junctions]
+    if not cuts:
+        # A ring touching no other boundary: start it at its smallest point, so a neighbour
+        # tracing the same ring the other way produces the reversed arc
+        start = points.index(min(points))
+        rotated = points[start:] + points[:start]
+        return [tuple(rotated + rotated[:1])]
+    rotated = points[cuts[0]:] + points[:cuts[0]] + [points[cuts[0]]]
+    offsets = [i - cuts[0] for i in cuts] + [len(points)]
+    return [tuple(rotated[a:b + 1]) for a, b in zip(offsets[:-1], offsets[1:])]
+
+def _delta_encode(arc: Tuple[Point, ...]) -> List[List[int]]:
+    points = np.asarray(arc, dtype=np.int64)
+    return np.vstack([points[:1], np.diff(points, axis=0)]).tolist()
+
+class TopologyStore:
+    """Shared-boundary topology of a geometry file, written beside it and keyed on its signature"""
+
+    def __init__(self, geometry_file: str, signature: str, property_columns: Sequence[str] = ()):
+        self.geometry_file = geometry_file
+        self.signature = signature
+        self.property_columns = list(property_columns)
+
+    def get_store_path(self) -> str:
+        return os.path.splitext(self.geometry_file)[0] + '.topojson'
+
+    def _get_header(self) -> bytes:
+        """Opening bytes of a topology built from the current geometry file - the signature is its first key"""
+        return b'{"source_signature":' + json.dumps(self.signature).encode() + b','
+
+    def is_current(self) -> bool:
+        """True when the topology exists and was built from the current geometry file
+
+        Only the fixed-position header is read, so the check costs no parse of the arcs.
+        """
+        header = self._get_header()
+        try:
+            with open(self.get_store_path(), 'rb') as f:
+                return f.read(len(header)) == header
+        except OSError:
+            return False
+
+    def build(self, gdf: Optional[gpd.GeoDataFrame] = None) -> dict:
+        """Encode the geometry file (or an already read frame of it) and write it atomically"""
+        if gdf is None:
+            import geopandas as gpd
+            gdf = gpd.read_file(self.geometry_file)
+        columns = [col for col in self.property_columns if col in gdf.columns]
+        properties = gdf[columns].astype(object).where(gdf[columns].notna(), None).to_dict(orient='records')
+        topology = {'source_signature': self.signature,
+                    **encode_topology(list(gdf.geometry.values), list(range(len(gdf))), properties)}
+
+        path = self.get_store_path()
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                # Compact separators keep the header byte-for-byte what is_current() expects
+                json.dump(topology, f, separators=(',', ':'))
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return topology
+
+    def read(self) -> dict:
+        with open(self.get_store_path()) as f:
+            return json.load(f)
+
+if __name__ == "__main__":
+    from data_loader import MalariaDataLoader, SectorDataLoader
+
+    # python topology.py - encode both levels' boundaries and compare with their GeoJSON
+    for loader in (MalariaDataLoader(), SectorDataLoader()):
+        store = loader.get_topology_store()
+        topology = store.build()
+        geojson_bytes = os.path.getsize(loader.geometry_file)
+        topology_bytes = os.path.getsize(store.get_store_path())
+        decoded_bytes = len(json.dumps(decode_topology(topology), separators=(',', ':')))
+        print(f"{os.path.basename(loader.geometry_file):<32} GeoJSON {geojson_bytes / 1024:8.1f} KiB  "
+              f"topology {topology_bytes / 1024:8.1f} KiB ({len(topology['arcs'])} arcs)  "
+              f"decoded {decoded_bytes / 1024:8.1f} KiB")